@@ -0,0 +1,140 @@
+from __future__ import annotations
+
+import atexit
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from google.cloud.firestore import Client
+
+from config.settings import settings
+from models.schema import COL_ALERTS, COL_DELIVERY_LOGS
+from storage.firestore_client import get_firestore_client
+from utils.batching import FIRESTORE_BATCH_LIMIT, chunked
+
+log = logging.getLogger("glitch.alerts.audit_writer")
+
+# The parts of a Telegram sendMessage response worth keeping in delivery_logs;
+# the echoed message (chat, text, entities) is dropped.
+_RESP_FIELDS = ("ok", "error_code", "status_code", "description")
+
+Write = Tuple[str, str, Dict[str, Any]]  # (collection, doc_id, data)
+
+
+def trim_response(resp: Dict[str, Any]) -> Dict[str, Any]:
+    out = {k: resp[k] for k in _RESP_FIELDS if resp.get(k) is not None}
+    result = resp.get("result")
+    if isinstance(result, dict) and result.get("message_id") is not None:
+        out["message_id"] = result["message_id"]
+    retry_after = (resp.get("parameters") or {}).get("retry_after")
+    if retry_after is not None:
+        out["retry_after"] = retry_after
+    return out
+
+
+class AuditWriter:
+    """Buffers alerts + delivery_logs docs and commits them in WriteBatches.
+
+    A flush happens when ALERT_AUDIT_FLUSH_RECORDS records are buffered, when
+    the oldest buffered record is ALERT_AUDIT_FLUSH_SECONDS old (a timer armed
+    by the first buffered record, so an idle writer still flushes), and on
+    flush()/close() - the outbox worker flushes after every batch and the
+    shared writer is closed at interpreter exit. Thread-safe.
+
+    Audit docs are best effort: a failed commit is logged and counted in
+    stats["dropped"], never raised into delivery (the outbox holds the
+    authoritative delivery state).
+    """
+
+    def __init__(
+        self,
+        db: Optional[Client] = None,
+        max_records: Optional[int] = None,
+        max_age_seconds: Optional[float] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.db = db or get_firestore_client()
+        self.max_records = max(1, max_records or settings.ALERT_AUDIT_FLUSH_RECORDS)
+        self.max_age_seconds = settings.ALERT_AUDIT_FLUSH_SECONDS if max_age_seconds is None else max_age_seconds
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._buffer: List[Write] = []
+        self._records = 0
+        self._oldest: Optional[float] = None
+        self._timer: Optional[threading.Timer] = None
+        self.stats = {"records": 0, "writes": 0, "commits": 0, "dropped": 0}
+
+    def add(self, writes: List[Write]) -> None:
+        """Buffer one record (the docs of one delivery attempt)."""
+        now = self._clock()
+        with self._lock:
+            self._buffer.extend(writes)
+            self._records += 1
+            self.stats["records"] += 1
+            if self._oldest is None:
+                self._oldest = now
+                self._arm_timer()
+            due = self._records >= self.max_records or now - self._oldest >= self.max_age_seconds
+        if due:
+            self.flush()
+
+    def _arm_timer(self) -> None:
+        # Caller holds the lock.
+        if self._timer is None and self.max_age_seconds > 0:
+            self._timer = threading.Timer(self.max_age_seconds, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def flush(self) -> int:
+        """Commit everything buffered; returns docs written."""
+        with self._lock:
+            writes, self._buffer = self._buffer, []
+            self._records, self._oldest = 0, None
+            timer, self._timer = self._timer, None
+        if timer is not None:
+            timer.cancel()
+        written = 0
+        for chunk in chunked(writes, FIRESTORE_BATCH_LIMIT):
+            batch = self.db.batch()
+            for collection, doc_id, data in chunk:
+                batch.set(self.db.collection(collection).document(doc_id), data)
+            try:
+                batch.commit()
+            except Exception as e:
+                log.warning("audit batch dropped", extra={"extra": {"docs": len(chunk), "error": f"{type(e).__name__}: {e}"}})
+                with self._lock:
+                    self.stats["dropped"] += len(chunk)
+                continue
+            written += len(chunk)
+            with self._lock:
+                self.stats["writes"] += len(chunk)
+                self.stats["commits"] += 1
+        return written
+
+    close = flush
+
+
+def alert_writes(alert_id: str, alert: Dict[str, Any], log_id: str, delivery_log: Dict[str, Any]) -> List[Write]:
+    return [(COL_ALERTS, alert_id, alert), (COL_DELIVERY_LOGS, log_id, delivery_log)]
+
+
+_shared: Optional[AuditWriter] = None
+_shared_lock = threading.Lock()
+
+
+def get_audit_writer() -> AuditWriter:
+    """Process-wide writer; flushed at interpreter exit."""
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = AuditWriter()
+            atexit.register(_shared.close)
+        return _shared
+
+
+def flush_shared_audit_writer() -> int:
+    """Service shutdown hook: flush the shared writer if this process ever created it."""
+    with _shared_lock:
+        writer = _shared
+    return writer.flush() if writer is not None else 0
@@ -0,0 +1,177 @@
+from __future__ import annotations
+
+import abc
+import json
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+from alerts.outbox import BACKEND_FIRESTORE, BACKEND_MEMORY, BACKEND_SQLITE, outbox_item_id
+from config.settings import settings
+
+# Delivery claims: one record per (user, ndc, snapshot_hash), keyed by the same
+# hash as the outbox item. A sender claims the key with a create-if-absent before
+# it sends and records the outcome afterwards, so a re-run sweep, a lease that
+# expired mid-send or two overlapping workers never deliver a transition twice.
+#
+# Claim states:
+#   sending  claimed, outcome not recorded yet. After
+#            ALERT_DELIVERY_CLAIM_STALE_SECONDS the claimer is presumed dead and
+#            the key can be claimed again (at-least-once for that narrow case).
+#   sent     delivered; later claims get CLAIM_ALREADY_SENT
+#   failed   the send failed; the key can be claimed again by the retry
+#
+# Backends mirror the outbox (ALERT_OUTBOX_BACKEND): Firestore
+# (repos/alert_delivery_repo.py), SQLite and in-memory.
+
+STATE_SENDING = "sending"
+STATE_SENT = "sent"
+STATE_FAILED = "failed"
+
+CLAIM_OK = "claimed"
+CLAIM_ALREADY_SENT = "already_sent"
+CLAIM_IN_FLIGHT = "in_flight"
+
+
+def delivery_key(user_id: str, ndc_digits: str, snapshot_hash: str) -> str:
+    return outbox_item_id(user_id, ndc_digits, snapshot_hash)
+
+
+def claim_verdict(existing: Optional[Dict[str, Any]], now: float, stale_seconds: float) -> str:
+    """What a new claim on a key with this record gets (CLAIM_OK means take it)."""
+    if existing is None or existing.get("state") == STATE_FAILED:
+        return CLAIM_OK
+    if existing.get("state") == STATE_SENT:
+        return CLAIM_ALREADY_SENT
+    if now - float(existing.get("claimed_at") or 0) >= stale_seconds:
+        return CLAIM_OK
+    return CLAIM_IN_FLIGHT
+
+
+def claim_record(key: str, user_id: str, ndc_digits: str, owner: str, now: float, attempts: int = 1) -> Dict[str, Any]:
+    return {"key": key, "user_id": user_id, "ndc_digits": ndc_digits, "state": STATE_SENDING,
+            "owner": owner, "claimed_at": now, "attempts": attempts, "finished_at": None}
+
+
+class BaseDeliveryClaims(abc.ABC):
+    """claim_many before sending, finish_many after; backends implement the abstract methods."""
+
+    @abc.abstractmethod
+    def claim_many(self, claims: Iterable[Dict[str, str]], owner: str, now: Optional[float] = None) -> Dict[str, str]:
+        """[{key, user_id, ndc_digits}] -> {key: CLAIM_*}."""
+
+    @abc.abstractmethod
+    def finish_many(self, outcomes: Dict[str, bool], now: Optional[float] = None) -> None:
+        """{key: delivered?} -> state sent / failed."""
+
+    @abc.abstractmethod
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """The claim record for `key`, or None."""
+
+
+class MemoryDeliveryClaims(BaseDeliveryClaims):
+    def __init__(self, stale_seconds: Optional[float] = None):
+        self.stale_seconds = settings.ALERT_DELIVERY_CLAIM_STALE_SECONDS if stale_seconds is None else stale_seconds
+        self._records: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def claim_many(self, claims: Iterable[Dict[str, str]], owner: str, now: Optional[float] = None) -> Dict[str, str]:
+        now = time.time() if now is None else now
+        out: Dict[str, str] = {}
+        with self._lock:
+            for c in claims:
+                existing = self._records.get(c["key"])
+                out[c["key"]] = verdict = claim_verdict(existing, now, self.stale_seconds)
+                if verdict == CLAIM_OK:
+                    attempts = int((existing or {}).get("attempts", 0)) + 1
+                    self._records[c["key"]] = claim_record(c["key"], c["user_id"], c["ndc_digits"], owner, now, attempts)
+        return out
+
+    def finish_many(self, outcomes: Dict[str, bool], now: Optional[float] = None) -> None:
+        now = time.time() if now is None else now
+        with self._lock:
+            for key, ok in outcomes.items():
+                if key in self._records:
+                    self._records[key].update(state=STATE_SENT if ok else STATE_FAILED, finished_at=now)
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            record = self._records.get(key)
+            return dict(record) if record else None
+
+
+class SQLiteDeliveryClaims(BaseDeliveryClaims):
+    """Table next to the SQLite outbox; BEGIN IMMEDIATE makes each claim_many atomic across processes."""
+
+    def __init__(self, path: str = ":memory:", stale_seconds: Optional[float] = None):
+        self.stale_seconds = settings.ALERT_DELIVERY_CLAIM_STALE_SECONDS if stale_seconds is None else stale_seconds
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30.0)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("CREATE TABLE IF NOT EXISTS alert_deliveries (key TEXT PRIMARY KEY, doc TEXT NOT NULL)")
+
+    def _get(self, key: str) -> Optional[Dict[str, Any]]:
+        row = self._conn.execute("SELECT doc FROM alert_deliveries WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _put(self, record: Dict[str, Any]) -> None:
+        self._conn.execute("INSERT OR REPLACE INTO alert_deliveries VALUES (?, ?)", (record["key"], json.dumps(record)))
+
+    def claim_many(self, claims: Iterable[Dict[str, str]], owner: str, now: Optional[float] = None) -> Dict[str, str]:
+        now = time.time() if now is None else now
+        out: Dict[str, str] = {}
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                for c in claims:
+                    existing = self._get(c["key"])
+                    out[c["key"]] = verdict = claim_verdict(existing, now, self.stale_seconds)
+                    if verdict == CLAIM_OK:
+                        attempts = int((existing or {}).get("attempts", 0)) + 1
+                        self._put(claim_record(c["key"], c["user_id"], c["ndc_digits"], owner, now, attempts))
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return out
+
+    def finish_many(self, outcomes: Dict[str, bool], now: Optional[float] = None) -> None:
+        now = time.time() if now is None else now
+        with self._lock:
+            for key, ok in outcomes.items():
+                record = self._get(key)
+                if record:
+                    record.update(state=STATE_SENT if ok else STATE_FAILED, finished_at=now)
+                    self._put(record)
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            return self._get(key)
+
+
+_shared: Optional[BaseDeliveryClaims] = None
+_shared_lock = threading.Lock()
+
+
+def get_delivery_claims() -> BaseDeliveryClaims:
+    """Process-wide claims store on the same backend as the outbox (ALERT_OUTBOX_BACKEND)."""
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            backend = settings.ALERT_OUTBOX_BACKEND
+            if backend == BACKEND_FIRESTORE:
+                from repos.alert_delivery_repo import AlertDeliveryRepository
+                _shared = AlertDeliveryRepository()
+            elif backend == BACKEND_SQLITE:
+                _shared = SQLiteDeliveryClaims(settings.ALERT_OUTBOX_SQLITE_PATH)
+            elif backend == BACKEND_MEMORY:
+                _shared = MemoryDeliveryClaims()
+            else:
+                raise RuntimeError(f"unknown ALERT_OUTBOX_BACKEND: {backend!r}")
+        return _shared
+
+
+def claims_for(items: List[Dict[str, Any]]) -> List[Dict[str, str]]:
+    """Claim requests for outbox items (their item_id is the delivery key)."""
+    return [{"key": i["item_id"], "user_id": i["user_id"], "ndc_digits": i["ndc_digits"]} for i in items]
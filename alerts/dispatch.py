@@ -1,31 +1,55 @@
 from __future__ import annotations
 
 import logging
+import os
 import uuid
 from datetime import datetime, timezone
 from typing import Any, Dict, Optional
 
+from alerts.audit_writer import AuditWriter, alert_writes, get_audit_writer, trim_response
+from alerts.delivery_claims import CLAIM_ALREADY_SENT, CLAIM_OK, BaseDeliveryClaims, delivery_key, get_delivery_claims
 from alerts.formatter import format_shortage_change_alert
 from messaging.dispatcher import MessageDispatcher
-from repos.alerts_repo import AlertsRepository
-from repos.delivery_log_repo import DeliveryLogRepository
 
 log = logging.getLogger("glitch.alerts")
 
 
 class AlertDispatcher:
-    def __init__(self, dispatcher: Optional[MessageDispatcher] = None):
+    def __init__(self, dispatcher: Optional[MessageDispatcher] = None, audit: Optional[AuditWriter] = None,
+                 deliveries: Optional[BaseDeliveryClaims] = None):
         self.dispatcher = dispatcher or MessageDispatcher()
-        self.alerts = AlertsRepository()
-        self.delivery = DeliveryLogRepository()
+        self.audit = audit or get_audit_writer()
+        self._deliveries = deliveries
 
-    def dispatch_telegram(self, user_id: str, chat_id: str, payload: Dict[str, Any]) -> Dict[str, Any]:
-        msg = format_shortage_change_alert(payload)
+    def dispatch_telegram(self, user_id: str, chat_id: str, payload: Dict[str, Any], text: Optional[str] = None,
+                          snapshot_hash: Optional[str] = None) -> Dict[str, Any]:
+        """Send one alert. With snapshot_hash the send claims its delivery key first
+        (alerts/delivery_claims.py), so repeating the call never sends twice."""
+        key = delivery_key(user_id, payload.get("ndc_digits") or "", snapshot_hash) if snapshot_hash is not None else None
+        if key is not None:
+            self._deliveries = self._deliveries or get_delivery_claims()
+            claim = {"key": key, "user_id": user_id, "ndc_digits": payload.get("ndc_digits") or ""}
+            verdict = self._deliveries.claim_many([claim], owner=f"dispatch:{os.getpid()}")[key]
+            if verdict != CLAIM_OK:
+                return {"ok": verdict == CLAIM_ALREADY_SENT, "skipped": verdict}
+        msg = text if text is not None else format_shortage_change_alert(payload)
         resp = self.dispatcher.send_telegram(chat_id=chat_id, text=msg)
-        alert_id = str(uuid.uuid4())
+        if key is not None:
+            self._deliveries.finish_many({key: bool(resp.get("ok"))})
+        self.record(user_id, payload, resp, alert_id=key)
+        return resp
+
+    def record(self, user_id: str, payload: Dict[str, Any], resp: Dict[str, Any], alert_id: Optional[str] = None) -> None:
+        """alerts + delivery_logs entries for one delivery attempt (buffered; see flush).
+
+        alert_id is the delivery key when there is one, so a repeated attempt
+        overwrites its alert row instead of adding another.
+        """
+        alert_id = alert_id or str(uuid.uuid4())
         now = datetime.now(timezone.utc).isoformat()
+        ok = bool(resp.get("ok"))
 
-        self.alerts.create(alert_id, {
+        self.audit.add(alert_writes(alert_id, {
             "alert_id": alert_id,
             "user_id": user_id,
             "channel": "telegram",
@@ -33,15 +57,15 @@ class AlertDispatcher:
             "old_status": payload.get("old_status"),
             "new_status": payload.get("new_status"),
             "created_at": now,
-            "ok": bool(resp.get("ok")),
-        })
-
-        self.delivery.write(str(uuid.uuid4()), {
+            "ok": ok,
+        }, str(uuid.uuid4()), {
             "user_id": user_id,
             "channel": "telegram",
             "ndc_digits": payload.get("ndc_digits"),
             "created_at": now,
-            "ok": bool(resp.get("ok")),
-            "resp": resp,
-        })
-        return resp
+            "ok": ok,
+            "resp": trim_response(resp),
+        }))
+
+    def flush(self) -> int:
+        return self.audit.flush()
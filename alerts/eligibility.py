@@ -0,0 +1,60 @@
+from __future__ import annotations
+
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+from config.settings import settings
+from repos.ndc_watchers_repo import NDCWatchersRepository
+from repos.subscription_repo import SubscriptionRepository
+from repos.user_repo import UserRepository
+from repos.watchlist_repo import WatchlistRepository
+
+# Alert eligibility, denormalized onto ndc_watchers/{ndc}/watchers/{user_id} so
+# fan-out for an NDC is one streamed query instead of a user + subscription read
+# per watcher. Source of truth stays users/{id} and subscriptions/{id}; every
+# write path that changes an input (Telegram welcome, SMS activation, Stripe
+# checkout and subscription updates, watchlist add) re-syncs the user's entries, and
+# ops/watcher_eligibility_repair.py fixes any drift.
+
+ELIGIBILITY_FIELDS = ("chat_id", "activated", "subscription_status")
+
+
+def eligibility_fields(user: Dict[str, Any], sub: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "chat_id": user.get("telegram_chat_id") or "",
+        "activated": bool(user.get("activated_at")),
+        "subscription_status": sub.get("status") or "",
+        "eligibility_synced_at": datetime.now(timezone.utc).isoformat(),
+    }
+
+
+def has_eligibility(entry: Dict[str, Any]) -> bool:
+    # Entries written before denormalization carry only user_id.
+    return "activated" in entry
+
+
+def is_eligible(entry: Dict[str, Any]) -> bool:
+    """Fail-closed: active subscription (when payments are on), activated, Telegram chat known."""
+    if settings.PAYMENTS_ENABLED and entry.get("subscription_status") != "active":
+        return False
+    return bool(entry.get("activated")) and bool(entry.get("chat_id"))
+
+
+def current_eligibility(user_id: str, users: Optional[UserRepository] = None,
+                        subs: Optional[SubscriptionRepository] = None) -> Dict[str, Any]:
+    user = (users or UserRepository()).get(user_id) or {}
+    sub = (subs or SubscriptionRepository()).get_by_user(user_id) or {}
+    return eligibility_fields(user, sub)
+
+
+def sync_user_eligibility(
+    user_id: str,
+    users: Optional[UserRepository] = None,
+    subs: Optional[SubscriptionRepository] = None,
+    watchlists: Optional[WatchlistRepository] = None,
+    watchers: Optional[NDCWatchersRepository] = None,
+) -> int:
+    """Copy the user's current eligibility onto each of their watcher entries; returns entries written."""
+    fields = current_eligibility(user_id, users, subs)
+    ndcs = [item["ndc_digits"] for item in (watchlists or WatchlistRepository()).iter_ndcs(user_id)]
+    return (watchers or NDCWatchersRepository()).set_eligibility_many(user_id, ndcs, fields)
@@ -0,0 +1,134 @@
+from __future__ import annotations
+
+import itertools
+import logging
+import threading
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from alerts.eligibility import current_eligibility, has_eligibility, is_eligible
+from alerts.outbox import BaseOutbox, get_outbox, new_outbox_item
+from config.settings import settings
+from repos.ndc_watchers_repo import NDCWatchersRepository
+from repos.subscription_repo import SubscriptionRepository
+from repos.user_repo import UserRepository
+
+log = logging.getLogger("glitch.alerts.fanout")
+
+WatcherPage = List[Tuple[str, Dict[str, Any]]]
+
+
+def transition_payload(ndc11: str, existing: Optional[Dict[str, Any]], doc: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "ndc_digits": ndc11,
+        "brand_name": doc.get("brand_name"),
+        "generic_name": doc.get("generic_name"),
+        "manufacturer": doc.get("manufacturer"),
+        "old_status": (existing or {}).get("status") if existing else None,
+        "new_status": doc.get("status"),
+        "last_updated": doc.get("last_updated"),
+    }
+
+
+class AlertFanout:
+    """Changed shortage doc -> one outbox item per eligible watcher.
+
+    Watchers are streamed in cursor pages (no cap), and for hot NDCs the pages
+    are evaluated and enqueued on a bounded thread pool while the next page is
+    read. Eligibility comes from the watcher entries themselves
+    (alerts/eligibility.py); only entries that predate denormalization cost a
+    user + subscription read. Rate limits and delivery belong to the outbox worker.
+    """
+
+    def __init__(
+        self,
+        watchers_repo: Optional[NDCWatchersRepository] = None,
+        users_repo: Optional[UserRepository] = None,
+        subs_repo: Optional[SubscriptionRepository] = None,
+        outbox: Optional[BaseOutbox] = None,
+        page_size: Optional[int] = None,
+        workers: Optional[int] = None,
+    ):
+        self.watchers = watchers_repo or NDCWatchersRepository()
+        self._users = users_repo
+        self._subs = subs_repo
+        self.outbox = outbox or get_outbox()
+        self.page_size = max(1, page_size or settings.ALERT_FANOUT_PAGE_SIZE)
+        self.workers = max(1, workers or settings.ALERT_FANOUT_WORKERS)
+        self.legacy_lookups = 0
+        self._lock = threading.Lock()
+
+    def _legacy_eligibility(self, user_id: str) -> Dict[str, Any]:
+        with self._lock:
+            self._users = self._users or UserRepository()
+            self._subs = self._subs or SubscriptionRepository()
+            self.legacy_lookups += 1
+        return current_eligibility(user_id, self._users, self._subs)
+
+    def _plan_page(self, page: WatcherPage, payload: Dict[str, Any], snapshot_hash: str,
+                   now: Optional[float] = None) -> List[Dict[str, Any]]:
+        items: List[Dict[str, Any]] = []
+        for watcher_user_id, entry in page:
+            if not has_eligibility(entry):
+                entry = self._legacy_eligibility(watcher_user_id)
+            if is_eligible(entry):
+                items.append(new_outbox_item(watcher_user_id, entry["chat_id"], payload, snapshot_hash, now=now))
+        return items
+
+    def plan(self, ndc11: str, existing: Optional[Dict[str, Any]], doc: Dict[str, Any]) -> List[Dict[str, Any]]:
+        payload = transition_payload(ndc11, existing, doc)
+        items: List[Dict[str, Any]] = []
+        for page in self.watchers.iter_watcher_pages(ndc11, self.page_size):
+            items += self._plan_page(page, payload, doc.get("snapshot_hash") or "")
+        return items
+
+    def enqueue(self, ndc11: str, existing: Optional[Dict[str, Any]], doc: Dict[str, Any],
+                now: Optional[float] = None) -> Dict[str, int]:
+        """Fan out one transition; returns {"pages", "processed", "skipped", "enqueued"}.
+
+        now: available_at for the items. The sweeper passes its start time, so a
+        user's items from one sweep sort together in the lease order and the
+        worker can fold them into one message.
+
+        skipped = ineligible watchers; enqueued counts new outbox items only, so a
+        repeated (user, ndc, hash) from a re-run sweep is neither skipped nor enqueued.
+        """
+        payload = transition_payload(ndc11, existing, doc)
+        snapshot_hash = doc.get("snapshot_hash") or ""
+        stats = {"pages": 0, "processed": 0, "skipped": 0, "enqueued": 0}
+
+        def _page(page: WatcherPage) -> Tuple[int, int, int]:
+            items = self._plan_page(page, payload, snapshot_hash, now)
+            return len(page), len(items), self.outbox.enqueue_many(items) if items else 0
+
+        def _add(result: Tuple[int, int, int]) -> None:
+            processed, eligible, created = result
+            stats["pages"] += 1
+            stats["processed"] += processed
+            stats["skipped"] += processed - eligible
+            stats["enqueued"] += created
+
+        pages = iter(self.watchers.iter_watcher_pages(ndc11, self.page_size))
+        head = list(itertools.islice(pages, 2))
+        if len(head) < 2 or self.workers == 1:
+            # Nearly every NDC fits in one page: no pool.
+            for page in itertools.chain(head, pages):
+                _add(_page(page))
+        else:
+            # Reading stays sequential (the cursor needs the previous page); the
+            # per-page eligibility lookups and outbox commits overlap. At most
+            # 2 * workers pages are in flight, so memory is bounded however hot the NDC.
+            with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                in_flight: Set[Future] = set()
+                for page in itertools.chain(head, pages):
+                    if len(in_flight) >= 2 * self.workers:
+                        finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                        for fut in finished:
+                            _add(fut.result())
+                    in_flight.add(pool.submit(_page, page))
+                for fut in in_flight:
+                    _add(fut.result())
+
+        if stats["processed"]:
+            log.info("alerts enqueued", extra={"extra": {"ndc": ndc11, **stats}})
+        return stats
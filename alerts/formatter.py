@@ -1,6 +1,25 @@
 from __future__ import annotations
 
-from typing import Any, Dict
+import html
+from typing import Any, Dict, List, Optional, Tuple
+
+
+def _clip(text: Any, max_chars: Optional[int] = None) -> str:
+    """`text` HTML-escaped for parse_mode=HTML, cut to `max_chars` between characters
+    (never inside an entity) with an ellipsis when it doesn't fit."""
+    text = str(text)
+    escaped = html.escape(text, quote=False)
+    if max_chars is None or len(escaped) <= max_chars:
+        return escaped
+    out: List[str] = []
+    used = 1  # the ellipsis
+    for ch in text:
+        e = html.escape(ch, quote=False)
+        if used + len(e) > max_chars:
+            break
+        out.append(e)
+        used += len(e)
+    return "".join(out) + "…" if max_chars > 0 else ""
 
 
 def format_shortage_change_alert(payload: Dict[str, Any]) -> str:
@@ -16,16 +35,74 @@ def format_shortage_change_alert(payload: Dict[str, Any]) -> str:
     name = brand or generic or "Unknown drug"
     extra = []
     if generic and brand and generic.lower() != brand.lower():
-        extra.append(f"Generic: {generic}")
+        extra.append(f"Generic: {_clip(generic)}")
     if mfg:
-        extra.append(f"Manufacturer: {mfg}")
+        extra.append(f"Manufacturer: {_clip(mfg)}")
     extra_txt = "\n".join(extra)
 
     return (
         f"<b>Glitch Alert</b>\n"
-        f"<b>{name}</b>\n"
-        f"NDC: <code>{ndc}</code>\n"
-        f"Status: <b>{old_s}</b> → <b>{new_s}</b>\n"
-        f"{('Last Updated: ' + str(last) + '\n') if last else ''}"
+        f"<b>{_clip(name)}</b>\n"
+        f"NDC: <code>{_clip(ndc)}</code>\n"
+        f"Status: <b>{_clip(old_s)}</b> → <b>{_clip(new_s)}</b>\n"
+        f"{('Last Updated: ' + _clip(last) + '\n') if last else ''}"
         f"{extra_txt}"
     ).strip()
+
+
+# Telegram rejects sendMessage text over 4096 characters. Tags are counted too,
+# which only errs on the short side.
+TELEGRAM_MAX_MESSAGE_CHARS = 4096
+
+
+def _digest_section(payload: Dict[str, Any], max_chars: Optional[int] = None) -> str:
+    """One NDC's digest lines. Over `max_chars`, the free-text fields are cut (as
+    escaped text, before the tags go around them) so the markup stays intact."""
+    brand = payload.get("brand_name") or ""
+    generic = payload.get("generic_name") or ""
+    mfg = payload.get("manufacturer") or ""
+
+    def build(cap: Optional[int]) -> str:
+        lines = [
+            f"<b>{_clip(brand or generic or 'Unknown drug', cap)}</b> (<code>{_clip(payload.get('ndc_digits') or '')}</code>)",
+            f"Status: <b>{_clip(payload.get('old_status') or 'unknown', cap)}</b> → <b>{_clip(payload.get('new_status') or 'unknown', cap)}</b>",
+        ]
+        if mfg:
+            lines.append(f"Manufacturer: {_clip(mfg, cap)}")
+        return "\n".join(lines)
+
+    section = build(None)
+    if max_chars is None or len(section) <= max_chars:
+        return section
+    # Markup and the NDC are fixed; the rest is shared by the four free-text fields.
+    return build(max(0, (max_chars - len(build(0))) // 4))
+
+
+def format_shortage_change_digest(payloads: List[Dict[str, Any]], limit: int = TELEGRAM_MAX_MESSAGE_CHARS) -> List[Tuple[str, List[int]]]:
+    """Several changes for one user -> [(message text, indexes of the payloads it covers)].
+
+    One change keeps the single-alert format. More are packed into as few
+    messages as fit in `limit`, split only between NDC sections; a section too
+    long for a message on its own has its field text shortened instead of the
+    message being cut (a cut tag or entity makes Telegram reject it).
+    """
+    if len(payloads) == 1:
+        alert = format_shortage_change_alert(payloads[0])
+        if len(alert) > limit:
+            header = "<b>Glitch Alert</b>"
+            alert = f"{header}\n{_digest_section(payloads[0], limit - len(header) - 1)}"
+        return [(alert, [0])]
+    first = f"<b>Glitch Alert</b>: {len(payloads)} watched NDCs changed"
+    more = "<b>Glitch Alert</b> (continued)"
+    room = limit - max(len(first), len(more)) - 2
+    out: List[Tuple[str, List[int]]] = []
+    text, covered = first, []
+    for i, payload in enumerate(payloads):
+        section = _digest_section(payload, room)
+        if covered and len(text) + 2 + len(section) > limit:
+            out.append((text, covered))
+            text, covered = more, []
+        text = f"{text}\n\n{section}"
+        covered.append(i)
+    out.append((text, covered))
+    return out
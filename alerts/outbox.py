@@ -0,0 +1,246 @@
+from __future__ import annotations
+
+import abc
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional
+
+from config.settings import settings
+
+# Alert outbox. The sweeper enqueues one item per (user, ndc, transition);
+# alerts/outbox_worker.py leases, delivers and acknowledges them.
+#
+# Item lifecycle (same for every backend):
+#   pending  leasable once available_at (epoch seconds) has passed. Leasing bumps
+#            `attempts` and pushes available_at out by the lease, so the item of a
+#            worker that died comes back by itself when the lease runs out.
+#   done     delivered, or deliberately skipped (rate limited, or already
+#            delivered by another sender: duplicate); see `outcome`
+#   dead     permanent failure or attempts exhausted; kept for inspection
+#
+# Item ids hash (user, ndc, snapshot_hash): enqueueing the same transition twice
+# (a sweep that died before its shortage writes landed and re-detected the
+# change) is a no-op.
+#
+# Backends: Firestore (repos/alert_outbox_repo.py) in production, SQLite and
+# in-memory for local runs and tests; pick one with ALERT_OUTBOX_BACKEND.
+
+STATUS_PENDING = "pending"
+STATUS_DONE = "done"
+STATUS_DEAD = "dead"
+
+BACKEND_FIRESTORE = "firestore"
+BACKEND_SQLITE = "sqlite"
+BACKEND_MEMORY = "memory"
+
+
+def outbox_item_id(user_id: str, ndc_digits: str, snapshot_hash: str) -> str:
+    return hashlib.sha256(f"{user_id}|{ndc_digits}|{snapshot_hash}".encode("utf-8")).hexdigest()[:32]
+
+
+def new_outbox_item(user_id: str, chat_id: str, payload: Dict[str, Any], snapshot_hash: str,
+                    now: Optional[float] = None) -> Dict[str, Any]:
+    ndc = payload.get("ndc_digits") or ""
+    return {
+        "item_id": outbox_item_id(user_id, ndc, snapshot_hash),
+        "user_id": user_id,
+        "channel": "telegram",
+        "chat_id": chat_id,
+        "ndc_digits": ndc,
+        "snapshot_hash": snapshot_hash,
+        "payload": payload,
+        "status": STATUS_PENDING,
+        "attempts": 0,
+        "available_at": time.time() if now is None else now,
+        "lease_owner": None,
+        "quota_reserved": False,
+        "outcome": None,
+        "last_error": None,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+    }
+
+
+class BaseOutbox(abc.ABC):
+    """Shared state transitions; backends implement the abstract methods."""
+
+    @abc.abstractmethod
+    def enqueue_many(self, items: Iterable[Dict[str, Any]]) -> int:
+        """Create items that don't exist yet; returns how many were new."""
+
+    @abc.abstractmethod
+    def lease(self, owner: str, limit: int, lease_seconds: float, now: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Claim up to `limit` due pending items, oldest first; ties (one sweep's items) grouped by user.
+
+        The last user's group (same available_at and user_id) is completed with
+        up to `limit` more items, so one sweep's alerts for a user are leased,
+        and coalesced, together.
+        """
+
+    @abc.abstractmethod
+    def get(self, item_id: str) -> Optional[Dict[str, Any]]:
+        """One item (with item_id), or None."""
+
+    @abc.abstractmethod
+    def counts(self) -> Dict[str, int]:
+        """Items per status."""
+
+    @abc.abstractmethod
+    def _update(self, item_id: str, fields: Dict[str, Any]) -> None:
+        """Merge `fields` into an existing item."""
+
+    def ack(self, item_id: str, outcome: str) -> None:
+        self._update(item_id, {"status": STATUS_DONE, "outcome": outcome, "lease_owner": None,
+                               "finished_at": datetime.now(timezone.utc).isoformat()})
+
+    def retry(self, item_id: str, available_at: float, error: str, quota_reserved: bool = False) -> None:
+        self._update(item_id, {"available_at": available_at, "last_error": error, "lease_owner": None,
+                               "quota_reserved": quota_reserved})
+
+    def dead_letter(self, item_id: str, error: str) -> None:
+        self._update(item_id, {"status": STATUS_DEAD, "outcome": "dead", "last_error": error, "lease_owner": None,
+                               "finished_at": datetime.now(timezone.utc).isoformat()})
+
+
+class MemoryOutbox(BaseOutbox):
+    def __init__(self):
+        self._items: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def enqueue_many(self, items: Iterable[Dict[str, Any]]) -> int:
+        created = 0
+        with self._lock:
+            for item in items:
+                if item["item_id"] not in self._items:
+                    self._items[item["item_id"]] = dict(item)
+                    created += 1
+        return created
+
+    def lease(self, owner: str, limit: int, lease_seconds: float, now: Optional[float] = None) -> List[Dict[str, Any]]:
+        now = time.time() if now is None else now
+        with self._lock:
+            due = [i for i in self._items.values() if i["status"] == STATUS_PENDING and i["available_at"] <= now]
+            due.sort(key=lambda i: (i["available_at"], i["user_id"]))
+            taken = due[:limit]
+            if taken:
+                group = (taken[-1]["available_at"], taken[-1]["user_id"])
+                taken += [i for i in due[limit: 2 * limit] if (i["available_at"], i["user_id"]) == group]
+            for item in taken:
+                item.update(attempts=item["attempts"] + 1, lease_owner=owner, available_at=now + lease_seconds)
+            return [dict(i) for i in taken]
+
+    def get(self, item_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            item = self._items.get(item_id)
+            return dict(item) if item else None
+
+    def counts(self) -> Dict[str, int]:
+        out = {STATUS_PENDING: 0, STATUS_DONE: 0, STATUS_DEAD: 0}
+        with self._lock:
+            for item in self._items.values():
+                out[item["status"]] += 1
+        return out
+
+    def _update(self, item_id: str, fields: Dict[str, Any]) -> None:
+        with self._lock:
+            if item_id in self._items:
+                self._items[item_id].update(fields)
+
+
+class SQLiteOutbox(BaseOutbox):
+    """One table; BEGIN IMMEDIATE around leases so several local worker processes can share a file."""
+
+    def __init__(self, path: str = ":memory:"):
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30.0)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS alert_outbox ("
+                " item_id TEXT PRIMARY KEY, status TEXT NOT NULL, available_at REAL NOT NULL, doc TEXT NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS alert_outbox_due ON alert_outbox (status, available_at)")
+
+    def enqueue_many(self, items: Iterable[Dict[str, Any]]) -> int:
+        rows = [(i["item_id"], i["status"], i["available_at"], json.dumps(i)) for i in items]
+        with self._lock:
+            before = self._conn.total_changes
+            self._conn.executemany("INSERT OR IGNORE INTO alert_outbox VALUES (?, ?, ?, ?)", rows)
+            return self._conn.total_changes - before
+
+    def lease(self, owner: str, limit: int, lease_seconds: float, now: Optional[float] = None) -> List[Dict[str, Any]]:
+        now = time.time() if now is None else now
+        out: List[Dict[str, Any]] = []
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self._conn.execute(
+                    "SELECT doc FROM alert_outbox WHERE status = ? AND available_at <= ? ORDER BY available_at, json_extract(doc, '$.user_id') LIMIT ?",
+                    (STATUS_PENDING, now, limit),
+                ).fetchall()
+                if rows:
+                    last = json.loads(rows[-1][0])
+                    rows += self._conn.execute(
+                        "SELECT doc FROM alert_outbox WHERE status = ? AND available_at = ? AND json_extract(doc, '$.user_id') = ?"
+                        " AND item_id NOT IN (SELECT value FROM json_each(?)) LIMIT ?",
+                        (STATUS_PENDING, last["available_at"], last["user_id"],
+                         json.dumps([json.loads(raw)["item_id"] for (raw,) in rows]), limit),
+                    ).fetchall()
+                for (raw,) in rows:
+                    item = json.loads(raw)
+                    item.update(attempts=item["attempts"] + 1, lease_owner=owner, available_at=now + lease_seconds)
+                    self._write(item)
+                    out.append(item)
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return out
+
+    def get(self, item_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute("SELECT doc FROM alert_outbox WHERE item_id = ?", (item_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def counts(self) -> Dict[str, int]:
+        out = {STATUS_PENDING: 0, STATUS_DONE: 0, STATUS_DEAD: 0}
+        with self._lock:
+            for status, n in self._conn.execute("SELECT status, COUNT(*) FROM alert_outbox GROUP BY status"):
+                out[status] = n
+        return out
+
+    def _write(self, item: Dict[str, Any]) -> None:
+        self._conn.execute(
+            "UPDATE alert_outbox SET status = ?, available_at = ?, doc = ? WHERE item_id = ?",
+            (item["status"], item["available_at"], json.dumps(item), item["item_id"]),
+        )
+
+    def _update(self, item_id: str, fields: Dict[str, Any]) -> None:
+        with self._lock:
+            row = self._conn.execute("SELECT doc FROM alert_outbox WHERE item_id = ?", (item_id,)).fetchone()
+            if row:
+                self._write({**json.loads(row[0]), **fields})
+
+
+_shared: Optional[BaseOutbox] = None
+_shared_lock = threading.Lock()
+
+
+def get_outbox() -> BaseOutbox:
+    """Process-wide outbox for ALERT_OUTBOX_BACKEND (firestore | sqlite | memory)."""
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            backend = settings.ALERT_OUTBOX_BACKEND
+            if backend == BACKEND_FIRESTORE:
+                from repos.alert_outbox_repo import AlertOutboxRepository
+                _shared = AlertOutboxRepository()
+            elif backend == BACKEND_SQLITE:
+                _shared = SQLiteOutbox(settings.ALERT_OUTBOX_SQLITE_PATH)
+            elif backend == BACKEND_MEMORY:
+                _shared = MemoryOutbox()
+            else:
+                raise RuntimeError(f"unknown ALERT_OUTBOX_BACKEND: {backend!r}")
+        return _shared
@@ -0,0 +1,330 @@
+"""Alert outbox worker: lease due items, deliver, ack / retry / dead-letter.
+
+Run: python -m alerts.outbox_worker [--budget-seconds N] [--loop]
+
+The ingest service drains the outbox through POST /alert_outbox_drain (one
+time-boxed slice per call); this CLI does the same locally or as a long-running
+worker. Any number of workers can run side by side: leases keep them apart.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import socket
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from alerts.delivery_claims import (
+    CLAIM_ALREADY_SENT,
+    CLAIM_OK,
+    BaseDeliveryClaims,
+    claims_for,
+    get_delivery_claims,
+)
+from alerts.dispatch import AlertDispatcher
+from alerts.formatter import format_shortage_change_alert, format_shortage_change_digest
+from alerts.outbox import BaseOutbox, get_outbox
+from config.settings import settings
+from alerts.rate_ledger import REASON_CONTENTION, REASON_OK, RateLimitLedger
+from messaging.telegram_engine import TelegramDeliveryEngine
+from repos.rate_limit_repo import RateLimitRepository
+
+log = logging.getLogger("glitch.alerts.outbox_worker")
+
+OUTCOME_SENT = "sent"
+OUTCOME_RATE_LIMITED = "rate_limited"
+OUTCOME_RETRY = "retry"
+OUTCOME_DEAD = "dead"
+# Another sender already delivered this (user, ndc, transition); acked without a send.
+OUTCOME_DUPLICATE = "duplicate"
+
+# Telegram answers these for chats we can never reach (blocked bot, deleted chat,
+# bad chat id); retrying won't help.
+PERMANENT_ERROR_CODES = {400, 403}
+
+
+def retry_delay(attempts: int, resp: Optional[Dict[str, Any]] = None) -> float:
+    """Telegram's retry_after when given, else exponential backoff from ALERT_OUTBOX_RETRY_BASE_SECONDS."""
+    retry_after = ((resp or {}).get("parameters") or {}).get("retry_after")
+    if retry_after:
+        return float(retry_after)
+    base = settings.ALERT_OUTBOX_RETRY_BASE_SECONDS
+    return min(base * (2 ** max(0, attempts - 1)), settings.ALERT_OUTBOX_RETRY_MAX_SECONDS)
+
+
+class OutboxWorker:
+    """Leases a batch (a user's items from one sweep are leased together), folds
+    each user's items into one message (ALERT_COALESCE_ENABLED; split at
+    Telegram's 4096-character limit), reserves quota for the whole batch at once
+    (the daily cap per message, the per-NDC cap per item), sends through the
+    async Telegram engine, then records and acks/retries every item on its own.
+
+    Firestore calls (lease, quota, audit, ack) run in a thread pool of
+    ALERT_WORKER_CONCURRENCY; sends are concurrent on the engine's pooled client.
+    Quota counters are cached in a RateLimitLedger for the length of one run;
+    audit docs are buffered by the dispatcher and flushed after every batch.
+    """
+
+    RENDER_CACHE_MAX = 1024
+
+    def __init__(
+        self,
+        outbox: Optional[BaseOutbox] = None,
+        alert_dispatcher: Optional[AlertDispatcher] = None,
+        rate_repo: Optional[RateLimitRepository] = None,
+        concurrency: Optional[int] = None,
+        owner: Optional[str] = None,
+        clock: Callable[[], float] = time.time,
+        engine_factory: Callable[[], Any] = TelegramDeliveryEngine,
+        coalesce: Optional[bool] = None,
+        deliveries: Optional[BaseDeliveryClaims] = None,
+    ):
+        self.outbox = outbox or get_outbox()
+        self.alert_dispatcher = alert_dispatcher or AlertDispatcher()
+        self.rate_repo = rate_repo or RateLimitRepository()
+        self.concurrency = max(1, concurrency or settings.ALERT_WORKER_CONCURRENCY)
+        self.owner = owner or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self._clock = clock
+        self._engine_factory = engine_factory
+        self._rendered: Dict[Tuple[str, str], str] = {}
+        self.coalesce = settings.ALERT_COALESCE_ENABLED if coalesce is None else coalesce
+        self.deliveries = deliveries or get_delivery_claims()
+
+    def _render(self, item: Dict[str, Any]) -> str:
+        # Every watcher of one transition gets the same text: render it once.
+        key = (item["ndc_digits"], item.get("snapshot_hash") or "")
+        text = self._rendered.get(key)
+        if text is None:
+            if len(self._rendered) >= self.RENDER_CACHE_MAX:
+                self._rendered.clear()
+            text = self._rendered[key] = format_shortage_change_alert(item["payload"])
+        return text
+
+    def _messages(self, items: List[Dict[str, Any]]) -> List[Tuple[str, str, List[Dict[str, Any]]]]:
+        """(chat_id, text, items covered): one message per user, split at Telegram's size limit."""
+        if not self.coalesce:
+            return [(item["chat_id"], self._render(item), [item]) for item in items]
+        by_chat: Dict[str, List[Dict[str, Any]]] = {}
+        for item in items:
+            by_chat.setdefault(item["chat_id"], []).append(item)
+        out: List[Tuple[str, str, List[Dict[str, Any]]]] = []
+        for chat_id, group in by_chat.items():
+            if len(group) == 1:
+                out.append((chat_id, self._render(group[0]), group))
+                continue
+            for text, covered in format_shortage_change_digest([item["payload"] for item in group]):
+                out.append((chat_id, text, [group[i] for i in covered]))
+        return out
+
+    def _admitted(self, planned: List[Tuple[str, str, List[Dict[str, Any]]]],
+                  admitted: Set[str]) -> List[Tuple[str, str, List[Dict[str, Any]]]]:
+        """The planned messages without the items quota turned away (re-rendered where any were)."""
+        out: List[Tuple[str, str, List[Dict[str, Any]]]] = []
+        for chat_id, text, covered in planned:
+            kept = [item for item in covered if item["item_id"] in admitted]
+            if len(kept) == len(covered):
+                out.append((chat_id, text, covered))
+            elif kept:
+                out.extend(self._messages(kept))
+        return out
+
+    def _claim(self, items: List[Dict[str, Any]]) -> List[Optional[str]]:
+        """Claim each item's delivery key; an outcome means the item is finished here."""
+        try:
+            verdicts = self.deliveries.claim_many(claims_for(items), self.owner, self._clock())
+        except Exception as e:
+            # Fail closed: an unclaimed key is never sent.
+            return [self._finish(item, None, f"claim: {type(e).__name__}: {e}") for item in items]
+        outcomes: List[Optional[str]] = []
+        for item in items:
+            verdict = verdicts.get(item["item_id"])
+            if verdict == CLAIM_OK:
+                outcomes.append(None)
+            elif verdict == CLAIM_ALREADY_SENT:
+                log.info("alert already delivered", extra={"extra": {"item_id": item["item_id"], "user_id": item["user_id"]}})
+                self.outbox.ack(item["item_id"], OUTCOME_DUPLICATE)
+                outcomes.append(OUTCOME_DUPLICATE)
+            else:
+                # Another worker is mid-send; look again once its claim settles or goes stale.
+                self.outbox.retry(item["item_id"], self._clock() + settings.ALERT_OUTBOX_LEASE_SECONDS,
+                                  "claim: in flight elsewhere", quota_reserved=bool(item.get("quota_reserved")))
+                outcomes.append(OUTCOME_RETRY)
+        return outcomes
+
+    def _settle(self, delivered: Dict[str, bool]) -> None:
+        """Record claim outcomes: sent keys are never sent again, failed ones can be re-claimed."""
+        if not delivered:
+            return
+        try:
+            self.deliveries.finish_many(delivered, self._clock())
+        except Exception as e:
+            # The claims stay "sending" and become re-claimable after ALERT_DELIVERY_CLAIM_STALE_SECONDS.
+            log.warning("delivery claims not settled", extra={"extra": {"keys": len(delivered), "error": f"{type(e).__name__}: {e}"}})
+
+    def _admit(self, ledger: RateLimitLedger, items: List[Dict[str, Any]], groups: List[int]) -> List[Optional[str]]:
+        """Quota check before each item's first send; an outcome means the item is finished here.
+
+        groups[i] is the planned message of items[i]: the daily cap is charged per message.
+        """
+        fresh = [(item, group) for item, group in zip(items, groups) if not item.get("quota_reserved")]
+        try:
+            decisions = ledger.reserve_many([(item["user_id"], item["ndc_digits"]) for item, _ in fresh],
+                                            groups=[group for _, group in fresh])
+        except Exception as e:
+            # Fail closed: nothing is sent without a reservation; the items retry later.
+            error = f"quota: {type(e).__name__}: {e}"
+            return [None if item.get("quota_reserved") else self._finish(item, None, error) for item in items]
+        by_id = {item["item_id"]: decision for (item, _), decision in zip(fresh, decisions)}
+
+        outcomes: List[Optional[str]] = []
+        for item in items:
+            ok, reason = by_id.get(item["item_id"], (True, REASON_OK))
+            if ok:
+                # A retry must not count against the user's quota a second time.
+                item["quota_reserved"] = True
+                outcomes.append(None)
+            elif reason == REASON_CONTENTION:
+                outcomes.append(self._finish(item, None, f"quota: {reason}"))
+            else:
+                log.info("rate_limit_skip", extra={"extra": {"user_id": item["user_id"], "ndc": item["ndc_digits"], "reason": reason}})
+                self.outbox.ack(item["item_id"], OUTCOME_RATE_LIMITED)
+                outcomes.append(OUTCOME_RATE_LIMITED)
+        return outcomes
+
+    def _finish(self, item: Dict[str, Any], resp: Optional[Dict[str, Any]], error: Optional[str] = None) -> str:
+        """Record the attempt and ack / retry / dead-letter the item."""
+        item_id = item["item_id"]
+        attempts = int(item.get("attempts", 1))
+        if resp is not None:
+            self.alert_dispatcher.record(item["user_id"], item["payload"], resp, alert_id=item_id)
+            if resp.get("ok"):
+                self.outbox.ack(item_id, OUTCOME_SENT)
+                return OUTCOME_SENT
+            code = resp.get("error_code") or resp.get("status_code")
+            error = f"telegram {code}: {resp.get('description') or resp.get('text') or ''}"
+            permanent = code in PERMANENT_ERROR_CODES
+        else:
+            permanent = False
+
+        if permanent or attempts >= settings.ALERT_OUTBOX_MAX_ATTEMPTS:
+            log.warning("alert dead-lettered", extra={"extra": {"item_id": item_id, "attempts": attempts, "error": error}})
+            self.outbox.dead_letter(item_id, error or "")
+            return OUTCOME_DEAD
+        self.outbox.retry(item_id, self._clock() + retry_delay(attempts, resp), error or "",
+                          quota_reserved=bool(item.get("quota_reserved")))
+        return OUTCOME_RETRY
+
+    async def _run_batch(self, engine: Any, pool: ThreadPoolExecutor, ledger: RateLimitLedger,
+                         limit: Optional[int] = None) -> Dict[str, int]:
+        loop = asyncio.get_running_loop()
+
+        def _in_pool(fn: Callable[..., Any], *columns: List[Any]) -> Any:
+            return asyncio.gather(*(loop.run_in_executor(pool, fn, *args) for args in zip(*columns)))
+
+        items = await loop.run_in_executor(pool, self.outbox.lease, self.owner, limit or settings.ALERT_OUTBOX_LEASE_BATCH,
+                                           settings.ALERT_OUTBOX_LEASE_SECONDS, self._clock())
+        counts = {"leased": len(items), "messages": 0, "audit_docs": 0, OUTCOME_SENT: 0, OUTCOME_DUPLICATE: 0, OUTCOME_RATE_LIMITED: 0,
+                  OUTCOME_RETRY: 0, OUTCOME_DEAD: 0}
+        if not items:
+            return counts
+
+        outcomes: List[str] = []
+        claimed: List[Dict[str, Any]] = []
+        for item, outcome in zip(items, await loop.run_in_executor(pool, self._claim, items)):
+            if outcome is None:
+                claimed.append(item)
+            else:
+                outcomes.append(outcome)
+
+        # Messages are planned before the quota check so the daily cap is charged per message sent.
+        planned = self._messages(claimed)
+        group_of = {item["item_id"]: n for n, (_, _, covered) in enumerate(planned) for item in covered}
+        admitted: Set[str] = set()
+        released: Dict[str, bool] = {}
+        admit = await loop.run_in_executor(pool, self._admit, ledger, claimed, [group_of[i["item_id"]] for i in claimed])
+        for item, outcome in zip(claimed, admit):
+            if outcome is None:
+                admitted.add(item["item_id"])
+            else:
+                released[item["item_id"]] = False  # not sent: the key stays claimable
+                outcomes.append(outcome)
+
+        delivered = dict(released)
+        finished: List[Tuple[Dict[str, Any], Dict[str, Any]]] = []
+        messages = self._admitted(planned, admitted)
+        if messages:
+            counts["messages"] = len(messages)
+            resps = await engine.send_many([(chat_id, text) for chat_id, text, _ in messages])
+            # Every NDC in a combined message gets its own alert row and outbox outcome.
+            finished = [(item, resp) for (_, _, covered), resp in zip(messages, resps) for item in covered]
+            delivered.update((item["item_id"], bool(resp.get("ok"))) for item, resp in finished)
+        # Claims settle before the outbox acks: a crash in between re-leases the
+        # item, and the settled claim stops it from being sent twice.
+        await loop.run_in_executor(pool, self._settle, delivered)
+        if finished:
+            outcomes += await _in_pool(self._finish, *zip(*finished))
+        counts["audit_docs"] = await loop.run_in_executor(pool, self.alert_dispatcher.flush)
+        for outcome in outcomes:
+            counts[outcome] += 1
+        return counts
+
+    async def _run_async(self, budget_seconds: Optional[float], max_batches: Optional[int]) -> Dict[str, Any]:
+        t0 = time.monotonic()
+        totals = {"batches": 0, "leased": 0, "messages": 0, "audit_docs": 0, OUTCOME_SENT: 0, OUTCOME_DUPLICATE: 0, OUTCOME_RATE_LIMITED: 0,
+                  OUTCOME_RETRY: 0, OUTCOME_DEAD: 0}
+        loop = asyncio.get_running_loop()
+        ledger = RateLimitLedger(self.rate_repo)
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            try:
+                async with self._engine_factory() as engine:
+                    while budget_seconds is None or time.monotonic() - t0 < budget_seconds:
+                        counts = await self._run_batch(engine, pool, ledger)
+                        if not counts["leased"]:
+                            break
+                        totals["batches"] += 1
+                        for k, v in counts.items():
+                            totals[k] += v
+                        if max_batches is not None and totals["batches"] >= max_batches:
+                            break
+                    stats = getattr(engine, "stats", None)
+            finally:
+                # A batch that failed part-way can leave alerts / delivery_logs docs buffered.
+                totals["audit_docs"] += await loop.run_in_executor(pool, self.alert_dispatcher.flush)
+        totals["seconds"] = round(time.monotonic() - t0, 3)
+        totals["quota"] = dict(ledger.stats)
+        if stats:
+            totals["telegram"] = dict(stats)
+        return totals
+
+    def run_once(self) -> Dict[str, Any]:
+        """One lease-and-deliver batch."""
+        return asyncio.run(self._run_async(budget_seconds=None, max_batches=1))
+
+    def run(self, budget_seconds: Optional[float] = None) -> Dict[str, Any]:
+        """Lease-and-deliver batches until the outbox has nothing due or the budget is spent."""
+        totals = asyncio.run(self._run_async(budget_seconds=budget_seconds, max_batches=None))
+        log.info("alert outbox drained", extra={"extra": totals})
+        return totals
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--budget-seconds", type=float, default=None, help="stop after this long (default: until nothing is due)")
+    parser.add_argument("--loop", action="store_true", help="keep polling for new items")
+    parser.add_argument("--poll-seconds", type=float, default=5.0)
+    args = parser.parse_args()
+    worker = OutboxWorker()
+    while True:
+        print(json.dumps(worker.run(budget_seconds=args.budget_seconds)))
+        if not args.loop:
+            break
+        time.sleep(args.poll_seconds)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+from __future__ import annotations
+
+import copy
+import logging
+from typing import Dict, Hashable, List, Optional, Sequence, Set, Tuple
+
+from config.settings import settings
+from repos.rate_limit_repo import RateCounter, RateLimitRepository, utc_day_key
+
+log = logging.getLogger("glitch.alerts.rate_ledger")
+
+REASON_OK = "ok"
+REASON_DAILY_LIMIT = "daily_limit"
+REASON_NDC_LIMIT = "ndc_limit"
+# The counters kept changing under us: not sent now, decided again on retry.
+REASON_CONTENTION = "contention"
+
+
+class RateLimitLedger:
+    """Per-run cache of users' daily alert counters, enforced in memory.
+
+    reserve_many decides a whole batch of (user_id, ndc) reservations against
+    counters preloaded with one get_all, then commits the increments in bulk.
+    Every write is compare-and-set on the doc's update_time (create when the
+    doc did not exist), so overlapping runs cannot push a user past
+    MAX_ALERTS_PER_DAY / MAX_ALERTS_PER_NDC_PER_DAY: a run that loses the race
+    re-reads that user and decides again. Counters that stay contended after
+    max_attempts are denied with REASON_CONTENTION (fail-closed).
+
+    Counters only grow within a day, so a denial decided on a stale cache is
+    still correct and never needs a write.
+    """
+
+    def __init__(
+        self,
+        repo: Optional[RateLimitRepository] = None,
+        max_total: Optional[int] = None,
+        max_per_ndc: Optional[int] = None,
+        max_attempts: int = 5,
+    ):
+        self.repo = repo or RateLimitRepository()
+        self.max_total = settings.MAX_ALERTS_PER_DAY if max_total is None else max_total
+        self.max_per_ndc = settings.MAX_ALERTS_PER_NDC_PER_DAY if max_per_ndc is None else max_per_ndc
+        self.max_attempts = max(1, max_attempts)
+        self._counters: Dict[Tuple[str, str], RateCounter] = {}
+        self.stats = {"loads": 0, "commits": 0, "conflicts": 0}
+
+    def _check(self, counter: RateCounter, ndc: str, charge_total: bool = True) -> str:
+        if charge_total and counter.total >= self.max_total:
+            return REASON_DAILY_LIMIT
+        if counter.by_ndc.get(ndc, 0) >= self.max_per_ndc:
+            return REASON_NDC_LIMIT
+        return REASON_OK
+
+    def reserve_many(self, requests: Sequence[Tuple[str, str]], day_key: Optional[str] = None,
+                     groups: Optional[Sequence[Hashable]] = None) -> List[Tuple[bool, str]]:
+        """[(user_id, ndc)] -> [(reserved, reason)] in the same order.
+
+        groups: requests[i] goes out in message groups[i] (one user per group).
+        MAX_ALERTS_PER_DAY is charged once per message with a granted request;
+        the per-NDC limit is still charged per request. Default: one message
+        per request.
+        """
+        day_key = day_key or utc_day_key()
+        results: List[Optional[Tuple[bool, str]]] = [None] * len(requests)
+        pending = list(range(len(requests)))
+        for _ in range(self.max_attempts):
+            missing = {requests[i][0] for i in pending} - {u for u, d in self._counters if d == day_key}
+            if missing:
+                self.stats["loads"] += len(missing)
+                self._counters.update(((u, day_key), c) for u, c in self.repo.load_many(missing, day_key).items())
+
+            staged: Dict[str, RateCounter] = {}
+            charged: Set[Hashable] = set()
+            decided: Dict[int, Tuple[bool, str]] = {}
+            for i in pending:
+                user_id, ndc = requests[i]
+                counter = staged.get(user_id) or self._counters[(user_id, day_key)]
+                group = groups[i] if groups is not None else i
+                charge_total = group not in charged
+                reason = self._check(counter, ndc, charge_total)
+                if reason == REASON_OK:
+                    if user_id not in staged:
+                        counter = staged[user_id] = copy.deepcopy(counter)
+                    counter.total += int(charge_total)
+                    counter.by_ndc[ndc] = counter.by_ndc.get(ndc, 0) + 1
+                    charged.add(group)
+                decided[i] = (reason == REASON_OK, reason)
+
+            committed = self.repo.commit_many(day_key, staged) if staged else {}
+            self.stats["commits"] += len(committed)
+            lost = set(staged) - set(committed)
+            self.stats["conflicts"] += len(lost)
+            for user_id, version in committed.items():
+                staged[user_id].version = version
+                self._counters[(user_id, day_key)] = staged[user_id]
+            for user_id in lost:
+                del self._counters[(user_id, day_key)]  # re-read on the next attempt
+
+            still_pending = []
+            for i in pending:
+                if requests[i][0] in lost:
+                    still_pending.append(i)
+                else:
+                    results[i] = decided[i]
+            pending = still_pending
+            if not pending:
+                break
+
+        if pending:
+            log.warning("rate limit counters contended", extra={"extra": {"day": day_key, "denied": len(pending)}})
+            for i in pending:
+                results[i] = (False, REASON_CONTENTION)
+        return results  # type: ignore[return-value]
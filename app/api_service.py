@@ -8,10 +8,12 @@ from app.routers.health import router as health_router
 from app.routers.users import router as users_router
 from app.routers.billing import router as billing_router
 from app.routers.watchlist import router as watchlist_router
+from app.routers.ndc_search import router as ndc_search_router
 from app.routers.messaging import router as messaging_router
 from app.routers.admin import router as admin_router
 from app.routers.ui import router as ui_router
 from app.routers.twilio_root import router as twilio_root_router
+from ndc.search_index import get_search_service
 
 setup_logging()
 
@@ -30,7 +32,14 @@ app.include_router(health_router, tags=["health"])
 app.include_router(users_router, prefix="/api", tags=["users"])
 app.include_router(billing_router, prefix="/api", tags=["billing"])
 app.include_router(watchlist_router, prefix="/api", tags=["watchlist"])
+app.include_router(ndc_search_router, prefix="/api", tags=["ndc"])
 app.include_router(messaging_router, prefix="/api", tags=["messaging"])
 app.include_router(admin_router, prefix="/admin", tags=["admin"])
 app.include_router(ui_router, tags=["ui"])
 app.include_router(twilio_root_router, tags=["twilio"])
+
+
+@app.on_event("startup")
+def warm_ndc_search():
+    # Starts the first search index build in the background; requests never wait for it.
+    get_search_service()
@@ -5,13 +5,24 @@ from ops.structured_logger import setup_logging
 from security.operator_auth import verify_operator_request
 from config.settings import settings
 from ingest.shortage_sweeper import sweep_all_shortages, upsert_and_detect_changes
-from ingest.dailymed_bulk import build_ndc_index_from_bulk_zip
+from ingest.poll_scheduler import run_scheduled_poll
+from ingest.dailymed_job import abandon_job, job_progress, run_job, start_job
+from repos.dailymed_job_repo import DailyMedJobRepository
+from alerts.audit_writer import flush_shared_audit_writer
+from alerts.outbox import get_outbox
+from alerts.outbox_worker import OutboxWorker
 
 setup_logging()
 
 app = FastAPI(title="Glitch Ingest", version="3.0.0")
 
 
+@app.on_event("shutdown")
+def flush_audit_docs():
+    # Buffered alerts / delivery_logs docs (alerts/audit_writer.py) must not die with the instance.
+    flush_shared_audit_writer()
+
+
 @app.get("/healthz")
 def healthz():
     return {"ok": True, "service": "glitch-ingest"}
@@ -26,15 +37,50 @@ def shortage_baseline_run(request: Request):
 
 
 @app.post("/shortage_poll_run")
-def shortage_poll_run(request: Request):
+def shortage_poll_run(request: Request, force: bool = False):
     verify_operator_request(request)
-    recs, meta = sweep_all_shortages()
-    result = upsert_and_detect_changes(recs, mode=settings.INGEST_MODE)
-    return {"ok": True, "mode": settings.INGEST_MODE, "meta": meta, "result": result}
+    # Probe-gated: may skip the sweep when the feed hasn't moved (see ingest/poll_scheduler.py).
+    return run_scheduled_poll(mode=settings.INGEST_MODE, force=force)
 
 
 @app.post("/dailymed_bulk_ingest")
-def dailymed_bulk_ingest(request: Request, url: str):
+def dailymed_bulk_ingest(request: Request, url: str, full: bool = False):
+    verify_operator_request(request)
+    # Starts a checkpointed job and works on it for one time slice; the rest is
+    # picked up by /dailymed_ingest_resume (or `python -m ingest.dailymed_job`).
+    started = start_job(url=url, gcs_bucket=settings.GCS_DAILYMED_BUCKET, full=full)
+    if not started.get("started"):
+        return {"ok": True, "job": started}
+    return {"ok": True, "job": run_job(budget_seconds=settings.DAILYMED_JOB_SLICE_SECONDS)}
+
+
+@app.post("/dailymed_ingest_resume")
+def dailymed_ingest_resume(request: Request):
+    verify_operator_request(request)
+    return {"ok": True, "job": run_job(budget_seconds=settings.DAILYMED_JOB_SLICE_SECONDS)}
+
+
+@app.post("/dailymed_ingest_abandon")
+def dailymed_ingest_abandon(request: Request, reason: str = "abandoned by operator"):
+    verify_operator_request(request)
+    # Gives up on the running job (status=failed) so /dailymed_bulk_ingest can start a new one.
+    return {"ok": True, "job": abandon_job(reason)}
+
+
+@app.get("/dailymed_ingest_status")
+def dailymed_ingest_status(request: Request):
+    verify_operator_request(request)
+    return {"ok": True, "job": job_progress(DailyMedJobRepository().get())}
+
+
+@app.post("/alert_outbox_drain")
+def alert_outbox_drain(request: Request):
+    verify_operator_request(request)
+    # Delivers due outbox items for one time slice; Scheduler calls this every minute.
+    return {"ok": True, "result": OutboxWorker().run(budget_seconds=settings.ALERT_WORKER_SLICE_SECONDS)}
+
+
+@app.get("/alert_outbox_status")
+def alert_outbox_status(request: Request):
     verify_operator_request(request)
-    stats = build_ndc_index_from_bulk_zip(url=url, gcs_bucket=settings.GCS_DAILYMED_BUCKET)
-    return {"ok": True, "stats": stats}
+    return {"ok": True, "counts": get_outbox().counts()}
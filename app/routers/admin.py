@@ -2,7 +2,7 @@ from __future__ import annotations
 
 from fastapi import APIRouter, Request
 from security.operator_auth import verify_operator_request, OperatorClaims
-from ingest.shortage_sweeper import sweep_all_shortages, upsert_and_detect_changes
+from ingest.shortage_sweeper import sweep_all_shortages, sweep_and_upsert_streaming, upsert_and_detect_changes
 from config.settings import settings
 
 router = APIRouter()
@@ -10,6 +10,7 @@ router = APIRouter()
 from digest.weekly import run_weekly_digest_for_user
 from repos.user_repo import UserRepository
 from repos.subscription_repo import SubscriptionRepository
+from ops.watcher_eligibility_repair import run_repair as run_watcher_eligibility_repair
 from config.settings import settings
 
 
@@ -23,8 +24,7 @@ def whoami(request: Request):
 @router.post("/run_delta_now")
 def run_delta_now(request: Request):
     verify_operator_request(request)
-    recs, meta = sweep_all_shortages()
-    result = upsert_and_detect_changes(recs, mode="delta")
+    meta, result = sweep_and_upsert_streaming(mode="delta")
     return {"ok": True, "meta": meta, "result": result}
 
 
@@ -43,6 +43,13 @@ def set_ingest_mode(request: Request, mode: str):
     return {"ok": True, "current_ingest_mode": settings.INGEST_MODE, "requested": mode, "note": "Set via env var at deploy time."}
 
 
+@router.post("/watcher_eligibility_repair")
+def watcher_eligibility_repair(request: Request, apply: bool = False):
+    verify_operator_request(request)
+    # Dry run unless apply=true; see ops/watcher_eligibility_repair.py.
+    return {"ok": True, "result": run_watcher_eligibility_repair(apply=apply)}
+
+
 @router.post("/weekly_recap_run")
 def weekly_recap_run(request: Request):
     verify_operator_request(request)
@@ -4,6 +4,7 @@ import logging
 from fastapi import APIRouter, HTTPException, Request
 from pydantic import BaseModel
 
+from alerts.eligibility import sync_user_eligibility
 from messaging.dispatcher import MessageDispatcher
 from utils.ids import user_id_from_phone_e164
 from datetime import datetime, timezone
@@ -29,6 +30,7 @@ def telegram_welcome(req: WelcomeRequest):
     if not user:
         raise HTTPException(status_code=404, detail="user_not_found")
     UserRepository().update(req.user_id, {"telegram_chat_id": req.telegram_chat_id})
+    sync_user_eligibility(req.user_id)
     resp = MessageDispatcher().send_telegram(chat_id=req.telegram_chat_id, text="<b>Welcome to Glitch</b>\nYou're set up. We'll stay silent unless something changes.")
     return {"ok": True, "resp": resp}
 
@@ -65,6 +67,7 @@ async def twilio_inbound(request: Request):
 
     if body == "YES":
         repo.update(user_id, {"activated_at": datetime.now(timezone.utc).isoformat(), "phone": from_phone})
+        sync_user_eligibility(user_id, users=repo)
         twiml.message("✅ Glitch activated. You'll receive alerts only when FDA shortage status changes.")
     else:
         twiml.message("OK")
@@ -0,0 +1,21 @@
+from __future__ import annotations
+
+from fastapi import APIRouter, Query
+
+from ndc.search_index import get_search_service
+
+router = APIRouter()
+
+
+@router.get("/ndc/search")
+def ndc_search(
+    q: str = Query(..., min_length=1, max_length=64),
+    limit: int = Query(default=20, ge=1, le=100),
+    cursor: str | None = Query(default=None, max_length=11),
+):
+    # q: NDC / labeler prefix ("12345", "1234-56") or drug name words ("humalog mi").
+    # Pass next_cursor back as `cursor` for the next page.
+    # warming: the index is still being built in the background (no results yet).
+    svc = get_search_service()
+    result = svc.search(q, limit=limit, cursor=cursor)
+    return {"ok": True, "warming": svc.snapshot is None, **result}
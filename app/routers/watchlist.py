@@ -3,6 +3,7 @@ from __future__ import annotations
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel, Field
 
+from alerts.eligibility import current_eligibility
 from billing.entitlements import EntitlementService
 from config.settings import settings
 from ndc.normalizer import normalize_ndc_to_11
@@ -10,6 +11,7 @@ from repos.watchlist_repo import WatchlistRepository
 from repos.ndc_watchers_repo import NDCWatchersRepository
 from utils.ids import user_id_from_phone_e164
 from repos.shortage_repo import ShortageRepository
+from ndc.resolver import NDCResolver
 
 router = APIRouter()
 
@@ -43,10 +45,11 @@ def add_watch(req: WatchAddRequest):
     if not ndc11:
         raise HTTPException(status_code=400, detail="invalid_ndc")
 
-    # enrich from shortages if available
+    # enrich: override / DailyMed index names, falling back to the shortage doc if available
     s = ShortageRepository().get(ndc11) or {}
-    wl.add(user_id, ndc11, {"added_at": "now", "brand_name": s.get("brand_name",""), "generic_name": s.get("generic_name","")})
-    NDCWatchersRepository().add_watcher(ndc11, user_id)
+    names = NDCResolver().resolve_many([ndc11], [s])[0]
+    wl.add(user_id, ndc11, {"added_at": "now", "brand_name": names.get("brand_name",""), "generic_name": names.get("generic_name","")})
+    NDCWatchersRepository().add_watcher(ndc11, user_id, current_eligibility(user_id))
     return {"ok": True, "user_id": user_id, "ndc_digits": ndc11}
 
 
@@ -55,4 +58,5 @@ def remove_watch(user_id: str, ndc: str):
     EntitlementService().require_active(user_id)
     ndc11 = normalize_ndc_to_11(ndc)
     WatchlistRepository().remove(user_id, ndc11)
+    NDCWatchersRepository().remove_watcher(ndc11, user_id)
     return {"ok": True, "removed": ndc11}
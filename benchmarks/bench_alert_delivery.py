@@ -0,0 +1,99 @@
+"""Per-alert blocking sends vs the async delivery engine, against a local stub Telegram API.
+
+Run: python -m benchmarks.bench_alert_delivery [--alerts 300] [--latency-ms 50] [--global-rate 30]
+
+Every alert goes to a different chat (one popular NDC changing status). The
+stub adds a fixed latency per sendMessage. "legacy" is the old path: a new
+connection and a fresh render per alert, one at a time. The engine runs once at
+--global-rate (Telegram's default bot limit) and once effectively unthrottled,
+to separate the rate limit from the transport cost.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+
+from alerts.formatter import format_shortage_change_alert
+from messaging.telegram_engine import TelegramDeliveryEngine
+
+PAYLOAD = {"ndc_digits": "00002143480", "brand_name": "Humalog", "generic_name": "insulin lispro",
+           "manufacturer": "Eli Lilly", "old_status": "Current", "new_status": "Resolved", "last_updated": "2026-01-01"}
+
+
+def make_handler(latency_s: float):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length") or 0))
+            time.sleep(latency_s)
+            body = json.dumps({"ok": True, "result": {"message_id": 1}}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+def legacy(base_url: str, n: int) -> float:
+    t0 = time.perf_counter()
+    for i in range(n):
+        text = format_shortage_change_alert(PAYLOAD)
+        httpx.post(f"{base_url}/botTOKEN/sendMessage", json={"chat_id": str(i), "text": text}, timeout=20.0)
+    return time.perf_counter() - t0
+
+
+def engine(base_url: str, n: int, global_rate: float) -> float:
+    async def go() -> None:
+        text = format_shortage_change_alert(PAYLOAD)
+        async with TelegramDeliveryEngine(token="TOKEN", base_url=base_url, global_rate=global_rate) as eng:
+            resps = await eng.send_many([(str(i), text) for i in range(n)])
+        assert all(r.get("ok") for r in resps)
+
+    t0 = time.perf_counter()
+    asyncio.run(go())
+    return time.perf_counter() - t0
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--alerts", type=int, default=300)
+    ap.add_argument("--latency-ms", type=float, default=50.0)
+    ap.add_argument("--global-rate", type=float, default=30.0)
+    args = ap.parse_args()
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(args.latency_ms / 1000.0))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_port}"
+    try:
+        legacy_s = legacy(base_url, args.alerts)
+        engine_s = engine(base_url, args.alerts, args.global_rate)
+        unthrottled_s = engine(base_url, args.alerts, 1e6)
+    finally:
+        server.shutdown()
+
+    print(json.dumps({
+        "alerts": args.alerts,
+        "latency_ms": args.latency_ms,
+        "legacy_s": round(legacy_s, 3),
+        "engine_s": round(engine_s, 3),
+        "engine_global_rate": args.global_rate,
+        "engine_unthrottled_s": round(unthrottled_s, 3),
+        "legacy_alerts_per_s": round(args.alerts / legacy_s, 1),
+        "engine_alerts_per_s": round(args.alerts / engine_s, 1),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""Fan-out for one hot NDC: serial vs pooled page processing, with simulated Firestore latency.
+
+Run: python -m benchmarks.bench_alert_fanout [--watchers 100000] [--page-size 1000] [--read-ms 40] [--commit-ms 60]
+
+The fake watcher repo sleeps --read-ms per cursor page; the fake outbox sleeps
+--commit-ms per 500-item chunk (the get_all + batch.create round trips of the
+Firestore outbox). Every watcher is eligible, so every page produces work.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import time
+
+from alerts.fanout import AlertFanout
+from alerts.outbox import MemoryOutbox
+from config.settings import settings
+from utils.batching import FIRESTORE_BATCH_LIMIT
+
+
+class SlowWatchers:
+    def __init__(self, n: int, read_s: float):
+        self.entries = [(f"u{i:07d}", {"user_id": f"u{i:07d}", "chat_id": str(i), "activated": True}) for i in range(n)]
+        self.read_s = read_s
+
+    def iter_watcher_pages(self, ndc: str, page_size: int):
+        for i in range(0, len(self.entries), page_size):
+            time.sleep(self.read_s)
+            yield self.entries[i:i + page_size]
+
+
+class SlowOutbox(MemoryOutbox):
+    def __init__(self, commit_s: float):
+        super().__init__()
+        self.commit_s = commit_s
+
+    def enqueue_many(self, items):
+        items = list(items)
+        time.sleep(self.commit_s * -(-len(items) // FIRESTORE_BATCH_LIMIT))
+        return super().enqueue_many(items)
+
+
+def run(args, workers: int) -> dict:
+    fanout = AlertFanout(SlowWatchers(args.watchers, args.read_ms / 1000.0), outbox=SlowOutbox(args.commit_ms / 1000.0),
+                         page_size=args.page_size, workers=workers)
+    t0 = time.perf_counter()
+    stats = fanout.enqueue("00002143480", {"status": "Current"}, {"status": "Resolved", "snapshot_hash": "h"})
+    return {"workers": workers, "seconds": round(time.perf_counter() - t0, 3), **stats}
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--watchers", type=int, default=100_000)
+    ap.add_argument("--page-size", type=int, default=1000)
+    ap.add_argument("--read-ms", type=float, default=40.0)
+    ap.add_argument("--commit-ms", type=float, default=60.0)
+    args = ap.parse_args()
+    settings.PAYMENTS_ENABLED = False
+
+    print(json.dumps([run(args, w) for w in (1, 4, 8)], indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""SPL extraction throughput vs. parse worker count on a synthetic DailyMed zip.
+
+Run: python -m benchmarks.bench_dailymed_parse [--docs 3000] [--workers 1,2,4,8]
+
+Each synthetic SPL document has a few products with package NDC codes plus
+filler narrative sections, roughly the shape (and text volume) of real labels.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+import zipfile
+
+from ingest.dailymed_bulk import iter_extracted_records
+
+SPL_NS = "urn:hl7-org:v3"
+NDC_SYSTEM = "2.16.840.1.113883.6.69"
+
+FILLER = (
+    "Take one tablet by mouth daily. Do not exceed the recommended dose. "
+    "Store at 20 to 25 C (68 to 77 F). Keep out of reach of children. "
+) * 6
+
+
+def synthetic_spl(i: int, rng: random.Random) -> bytes:
+    labeler = f"{rng.randint(1000, 99999):05d}"
+    products = []
+    for p in range(rng.randint(1, 4)):
+        product = f"{labeler}-{rng.randint(100, 9999):04d}"
+        packages = "".join(
+            f'<containerPackagedProduct><code code="{product}-{k:02d}" codeSystem="{NDC_SYSTEM}"/>'
+            f'<formCode code="C43169" displayName="BOTTLE"/></containerPackagedProduct>'
+            for k in range(1, rng.randint(2, 5))
+        )
+        products.append(
+            f"<manufacturedProduct><manufacturedProduct>"
+            f'<code code="{product}" codeSystem="{NDC_SYSTEM}"/>'
+            f"<name>Brand{i}x{p}</name>"
+            f"<asEntityWithGeneric><genericMedicine><name>generic{i}</name></genericMedicine></asEntityWithGeneric>"
+            f"<asContent>{packages}</asContent>"
+            f"</manufacturedProduct></manufacturedProduct>"
+        )
+    sections = "".join(f"<section><title>Section {s}</title><text><paragraph>{FILLER}</paragraph></text></section>" for s in range(12))
+    # Package label panel: real SPLs repeat the NDCs as text ("NDC 12345-678-90").
+    sections += f"<section><title>PACKAGE LABEL</title><text><paragraph>NDC {labeler}-{rng.randint(100, 9999):04d}-01</paragraph></text></section>"
+    doc = (
+        f'<?xml version="1.0" encoding="UTF-8"?><document xmlns="{SPL_NS}">'
+        f"<author><assignedEntity><representedOrganization><name>Labeler {labeler} Inc</name>"
+        f"</representedOrganization></assignedEntity></author>"
+        f"<component><structuredBody><component><section><subject>{''.join(products)}</subject></section></component>"
+        f"<component>{sections}</component></structuredBody></component></document>"
+    )
+    return doc.encode("utf-8")
+
+
+def build_zip(path: str, docs: int) -> None:
+    rng = random.Random(42)
+    with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED) as z:
+        for i in range(docs):
+            z.writestr(f"spl/{i:06d}.xml", synthetic_spl(i, rng))
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--docs", type=int, default=3000)
+    ap.add_argument("--workers", default=",".join(str(w) for w in sorted({1, 2, 4, os.cpu_count() or 1})))
+    ap.add_argument("--batch-size", type=int, default=200)
+    args = ap.parse_args()
+
+    fd, path = tempfile.mkstemp(suffix=".zip")
+    os.close(fd)
+    try:
+        build_zip(path, args.docs)
+        runs = []
+        for w in [int(x) for x in args.workers.split(",") if x]:
+            t0 = time.perf_counter()
+            members = ndcs = 0
+            for _, found in iter_extracted_records(path, workers=w, batch_size=args.batch_size):
+                members += 1
+                ndcs += len(found)
+            elapsed = time.perf_counter() - t0
+            runs.append({"workers": w, "seconds": round(elapsed, 3), "docs_per_s": round(members / elapsed, 1), "ndcs": ndcs})
+        base = runs[0]["seconds"] if runs else 0
+        for r in runs:
+            r["speedup_vs_first"] = round(base / r["seconds"], 2) if r["seconds"] else None
+        print(json.dumps({"docs": args.docs, "cpu_count": os.cpu_count(), "zip_bytes": os.path.getsize(path), "runs": runs}, indent=2))
+    finally:
+        os.unlink(path)
+
+
+if __name__ == "__main__":
+    main()
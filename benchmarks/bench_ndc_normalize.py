@@ -0,0 +1,66 @@
+"""Batch NDC normalization vs. the old per-call regex path.
+
+Run: python -m benchmarks.bench_ndc_normalize [--n 200000] [--distinct 20000]
+
+Inputs mimic a sweep: hyphenated package NDCs in all three 10-digit shapes plus
+11-digit forms, with repeats (the same NDC appears across pages and sweeps).
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import re
+import time
+
+from ndc.normalizer import normalize_many, normalize_ndc_to_11
+
+
+def legacy_per_call(ndc: str) -> str:
+    # The pre-batch implementation: re.sub on every call, left-pad.
+    digits = re.sub(r"\D", "", ndc or "")
+    if not digits:
+        return ""
+    if len(digits) > 11:
+        digits = digits[-11:]
+    return digits.zfill(11)
+
+
+def synthetic_ndcs(n: int, distinct: int, seed: int = 7) -> list:
+    rng = random.Random(seed)
+    shapes = ((4, 4, 2), (5, 3, 2), (5, 4, 1), (5, 4, 2))
+    pool = []
+    for _ in range(distinct):
+        shape = rng.choice(shapes)
+        pool.append("-".join(str(rng.randrange(10 ** w)).zfill(w) for w in shape))
+    return [rng.choice(pool) for _ in range(n)]
+
+
+def _time(fn) -> float:
+    t0 = time.perf_counter()
+    fn()
+    return time.perf_counter() - t0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--n", type=int, default=200000)
+    parser.add_argument("--distinct", type=int, default=20000)
+    args = parser.parse_args()
+    ndcs = synthetic_ndcs(args.n, args.distinct)
+
+    normalize_ndc_to_11.cache_clear()
+    results = {
+        "n": args.n,
+        "distinct": args.distinct,
+        "legacy_per_call_s": round(_time(lambda: [legacy_per_call(x) for x in ndcs]), 4),
+        "memoized_per_call_s": round(_time(lambda: [normalize_ndc_to_11(x) for x in ndcs]), 4),
+    }
+    normalize_ndc_to_11.cache_clear()
+    results["normalize_many_cold_s"] = round(_time(lambda: normalize_many(ndcs)), 4)
+    results["normalize_many_warm_s"] = round(_time(lambda: normalize_many(ndcs)), 4)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""NDC search index: build time and query latency at catalog size.
+
+Run: python -m benchmarks.bench_ndc_search [--n 300000] [--queries 5000]
+
+Synthetic catalog: ~3k labelers, brand/generic names drawn from a fixed word
+pool. Queries mix NDC/labeler prefixes, whole names and partially typed names,
+each fetching one page of 20 (plus a second page via the cursor for a share).
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import time
+
+from ndc.search_index import NDCSearchService
+
+_SYLLABLES = ("ab", "ac", "al", "am", "ar", "cy", "da", "do", "el", "en", "fa", "gli", "hu", "ix", "lo",
+              "ma", "met", "na", "ol", "pa", "pro", "ra", "sa", "ta", "tri", "va", "xa", "zo")
+_FORMS = ("tablet", "capsule", "injection", "solution", "cream", "suspension")
+
+
+def _word(rng: random.Random) -> str:
+    return "".join(rng.choice(_SYLLABLES) for _ in range(rng.randint(2, 4)))
+
+
+def synthetic_catalog(n: int, seed: int = 11) -> dict:
+    rng = random.Random(seed)
+    generics = [_word(rng) for _ in range(4000)]
+    brands = [_word(rng).capitalize() for _ in range(12000)]
+    labelers = [f"{rng.randrange(100000):05d}" for _ in range(3000)]
+    docs = {}
+    while len(docs) < n:
+        ndc = f"{rng.choice(labelers)}{rng.randrange(10000):04d}{rng.randrange(100):02d}"
+        docs[ndc] = {
+            "brand_name": rng.choice(brands),
+            "generic_name": f"{rng.choice(generics)} {rng.choice(_FORMS)}",
+            "manufacturer": f"Labeler {ndc[:5]}",
+            "updated_at": "2026-01-01T00:00:00+00:00",
+        }
+    return docs
+
+
+def synthetic_queries(docs: dict, count: int, seed: int = 13) -> list:
+    rng = random.Random(seed)
+    ndcs = list(docs)
+    out = []
+    for _ in range(count):
+        doc_ndc = rng.choice(ndcs)
+        doc = docs[doc_ndc]
+        kind = rng.randrange(4)
+        if kind == 0:
+            out.append(doc_ndc[: rng.randint(3, 9)])
+        elif kind == 1:
+            out.append(f"{doc_ndc[:5]}-{doc_ndc[5:7]}")
+        elif kind == 2:
+            out.append(doc["generic_name"])
+        else:
+            word = doc["brand_name"].lower()
+            out.append(word[: rng.randint(2, len(word))])
+    return out
+
+
+def _pct(samples: list, p: float) -> float:
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(p * len(samples)))]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--n", type=int, default=300000)
+    parser.add_argument("--queries", type=int, default=5000)
+    args = parser.parse_args()
+    docs = synthetic_catalog(args.n)
+    queries = synthetic_queries(docs, args.queries)
+
+    service = NDCSearchService(lambda since: [] if since else docs.items(), lambda since: [])
+    t0 = time.perf_counter()
+    service.rebuild()
+    build_s = time.perf_counter() - t0
+
+    latencies = []
+    for i, q in enumerate(queries):
+        t = time.perf_counter()
+        page = service.search(q, limit=20)
+        if i % 4 == 0 and page["next_cursor"]:
+            service.search(q, limit=20, cursor=page["next_cursor"])
+        latencies.append((time.perf_counter() - t) * 1000)
+
+    print(json.dumps({
+        "entries": len(service.snapshot),
+        "tokens": len(service.snapshot.vocab),
+        "build_s": round(build_s, 3),
+        "queries": len(queries),
+        "query_p50_ms": round(_pct(latencies, 0.50), 3),
+        "query_p99_ms": round(_pct(latencies, 0.99), 3),
+        "query_max_ms": round(max(latencies), 3),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""Serial vs concurrent openFDA sweep against a local stub server.
+
+Run: python -m benchmarks.bench_openfda_sweep [--items 5000] [--latency-ms 80] [--concurrency 8]
+
+The stub mimics openFDA pagination (meta.results.total, 404 past the end) and
+adds a fixed per-request latency so the benchmark reflects round-trip bound
+behavior rather than localhost speed.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from config.settings import settings
+from ingest.openfda_client import fetch_all_shortages_async, fetch_shortages_page
+
+
+def make_handler(items: int, latency_s: float):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            qs = parse_qs(urlparse(self.path).query)
+            skip = int(qs.get("skip", ["0"])[0])
+            limit = int(qs.get("limit", ["100"])[0])
+            time.sleep(latency_s)
+            if skip >= items:
+                body = json.dumps({"error": {"code": "NOT_FOUND"}}).encode()
+                self.send_response(404)
+            else:
+                results = [{"package_ndc": f"{i:011d}", "status": "Current"} for i in range(skip, min(skip + limit, items))]
+                body = json.dumps({"meta": {"results": {"skip": skip, "limit": limit, "total": items}}, "results": results}).encode()
+                self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+def serial_sweep(limit: int) -> int:
+    fetched, skip = 0, 0
+    while True:
+        page, _ = fetch_shortages_page(skip=skip, limit=limit)
+        if not page:
+            return fetched
+        fetched += len(page)
+        skip += limit
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--items", type=int, default=4900)
+    ap.add_argument("--limit", type=int, default=100)
+    ap.add_argument("--latency-ms", type=float, default=80.0)
+    ap.add_argument("--concurrency", type=int, default=8)
+    args = ap.parse_args()
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(args.items, args.latency_ms / 1000.0))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    settings.OPENFDA_SHORTAGE_URL = f"http://127.0.0.1:{server.server_port}/drug/shortages.json"
+
+    try:
+        t0 = time.perf_counter()
+        n_serial = serial_sweep(args.limit)
+        serial_s = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        recs, meta = asyncio.run(fetch_all_shortages_async(limit=args.limit, max_items=args.items + 1, concurrency=args.concurrency))
+        concurrent_s = time.perf_counter() - t0
+    finally:
+        server.shutdown()
+
+    print(json.dumps({
+        "items": args.items,
+        "pages": meta.get("pages"),
+        "latency_ms": args.latency_ms,
+        "concurrency": args.concurrency,
+        "serial_s": round(serial_s, 3),
+        "serial_fetched": n_serial,
+        "concurrent_s": round(concurrent_s, 3),
+        "concurrent_fetched": len(recs),
+        "speedup": round(serial_s / concurrent_s, 2) if concurrent_s else None,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -12,7 +12,9 @@ from repos.user_repo import UserRepository
 from repos.watchlist_repo import WatchlistRepository
 from repos.ndc_watchers_repo import NDCWatchersRepository
 from utils.ids import user_id_from_phone_e164
-from ndc.normalizer import normalize_ndc_to_11
+from ndc.normalizer import normalize_many
+from ndc.resolver import NDCResolver
+from alerts.eligibility import sync_user_eligibility
 
 log = logging.getLogger("glitch.stripe")
 
@@ -64,11 +66,14 @@ class StripeWebhookHandler:
                 if wl_raw:
                     wl_repo = WatchlistRepository()
                     watchers = NDCWatchersRepository()
-                    for part in [p.strip() for p in wl_raw.split(",") if p.strip()]:
-                        ndc11 = normalize_ndc_to_11(part)
-                        if not ndc11:
-                            continue
-                        wl_repo.add(user_id, ndc11, {"added_via": "stripe_metadata"})
+                    ndcs = [n for n in dict.fromkeys(normalize_many(p.strip() for p in wl_raw.split(",") if p.strip())) if n]
+                    # Names for the whole list in one batched resolve.
+                    for ndc11, names in zip(ndcs, NDCResolver().resolve_many(ndcs)):
+                        wl_repo.add(user_id, ndc11, {
+                            "added_via": "stripe_metadata",
+                            "brand_name": names.get("brand_name", ""),
+                            "generic_name": names.get("generic_name", ""),
+                        })
                         watchers.add_watcher(ndc11, user_id)
 
                 self.repo.upsert(user_id, {
@@ -78,13 +83,26 @@ class StripeWebhookHandler:
                     "last_event_id": event_id,
                     "last_event_type": event_type,
                 })
+                # Watcher entries carry subscription status / activation for fan-out.
+                sync_user_eligibility(user_id, subs=self.repo)
         elif event_type in ("customer.subscription.updated", "customer.subscription.deleted"):
             sub_id = obj.get("id")
             status = obj.get("status")
             cust_id = obj.get("customer")
-            # Find by user_id isn't directly possible without an index; we store under user_id. MVP: rely on checkout.session.completed to set user_id doc.
-            # If you need full fidelity, add an index collection mapping subscription_id -> user_id.
-            # We'll record the event for observability only.
-            log.info("subscription event received", extra={"extra": {"stripe_subscription_id": sub_id, "status": status, "customer": cust_id}})
+            # subscriptions/{user_id} carries the Stripe subscription id written at checkout.
+            user_id = self.repo.find_user_by_stripe_subscription(sub_id) if sub_id else None
+            if user_id:
+                if event_type == "customer.subscription.deleted":
+                    status = status or "canceled"
+                self.repo.upsert(user_id, {
+                    "status": status or "",
+                    "stripe_customer_id": cust_id,
+                    "last_event_id": event_id,
+                    "last_event_type": event_type,
+                })
+                sync_user_eligibility(user_id, subs=self.repo)
+            else:
+                log.info("subscription event for unknown subscription",
+                         extra={"extra": {"stripe_subscription_id": sub_id, "status": status, "customer": cust_id}})
 
         return {"ok": True, "event_type": event_type, "event_id": event_id}
@@ -22,6 +22,34 @@ class Settings(BaseSettings):
     MAX_SWEEP_ITEMS: int = Field(default=5000)
     OPENFDA_SHORTAGE_URL: str = Field(default="https://api.fda.gov/drug/shortages.json")
     OPENFDA_LIMIT: int = Field(default=100)
+    OPENFDA_CONCURRENCY: int = Field(default=8)  # parallel page fetches per sweep
+    OPENFDA_MAX_RETRIES: int = Field(default=4)  # retries on 429/5xx/transport errors
+    OPENFDA_BACKOFF_BASE_SECONDS: float = Field(default=0.5)
+    SWEEP_BATCH_SIZE: int = Field(default=500)  # records per batched Firestore read/commit in sweeps
+    SWEEP_SKIP_UNCHANGED: bool = Field(default=True)  # skip records whose snapshot_hash matches the preloaded index
+    SHORTAGE_HASH_INDEX_BUCKET: str = Field(default="")  # optional GCS bucket for the cached hash index artifact
+    SHORTAGE_HASH_INDEX_MAX_AGE_SECONDS: int = Field(default=86400)  # rebuild from Firestore after this age
+    SWEEP_INCREMENTAL_ENABLED: bool = Field(default=True)  # delta polls query last_updated >= high-water mark
+    FULL_RECONCILE_INTERVAL_HOURS: int = Field(default=24)  # full sweep cadence under incremental polling
+    POLL_PROBE_ENABLED: bool = Field(default=True)  # limit=1 "has anything changed" probe before delta polls
+    POLL_INTERVAL_FLOOR_SECONDS: int = Field(default=300)
+    POLL_INTERVAL_CEILING_SECONDS: int = Field(default=3600)
+    POLL_INTERVAL_BACKOFF_FACTOR: float = Field(default=2.0)  # interval growth per quiet poll
+    SWEEP_PIPELINE_QUEUE_PAGES: int = Field(default=4)  # bounded queue depth between streaming sweep stages
+
+    # NDC name resolution cache (in-process; see ndc/cache.py)
+    RESOLVER_CACHE_ENABLED: bool = Field(default=True)
+    RESOLVER_CACHE_MAX_ENTRIES: int = Field(default=100000)  # per tier (overrides, index); LRU beyond this
+    RESOLVER_CACHE_TTL_SECONDS: int = Field(default=21600)  # found docs; bounds cross-process staleness
+    RESOLVER_CACHE_NEGATIVE_TTL_SECONDS: int = Field(default=3600)  # "no override" / "not in index" entries
+    NDC_INDEX_ARTIFACT_BUCKET: str = Field(default="")  # bucket holding dailymed/ndc_index.bin; set to resolve index names from the mmapped artifact
+    NDC_INDEX_ARTIFACT_REFRESH_SECONDS: int = Field(default=3600)  # re-download interval for the artifact
+
+    # NDC search (/api/ndc/search; in-memory, see ndc/search_index.py)
+    NDC_SEARCH_REFRESH_SECONDS: int = Field(default=60)  # pull docs updated since the last refresh
+    NDC_SEARCH_FULL_REBUILD_SECONDS: int = Field(default=86400)  # full rebuild (also drops deleted NDCs)
+    NDC_SEARCH_DELTA_MAX: int = Field(default=5000)  # fold the delta into a new snapshot beyond this
+    NDC_SEARCH_MAX_PREFIX_EXPANSION: int = Field(default=256)  # vocabulary tokens a partial last word may expand to
 
     # DailyMed bulk
     GCS_DAILYMED_BUCKET: str = Field(default="")
@@ -29,13 +57,50 @@ class Settings(BaseSettings):
         default="https://dailymed.nlm.nih.gov/dailymed/spl-resources-all-drug-labels.cfm"
     )
     # NOTE: Above is a landing page; the ingestor supports direct URL to a zip if provided.
+    DAILYMED_TMP_DIR: str = Field(default="")  # where the bulk zip is staged; point at a disk volume on Cloud Run
+    DAILYMED_PARSE_WORKERS: int = Field(default=0)  # SPL parse processes; 0 = os.cpu_count()
+    DAILYMED_PARSE_BATCH_SIZE: int = Field(default=200)  # zip members per worker task
+    NDC_INDEX_WRITE_BATCH_SIZE: int = Field(default=500)  # docs per BulkWriter flush
+    NDC_INDEX_MAX_OPS_PER_SECOND: int = Field(default=500)  # BulkWriter throttle ceiling
+    NDC_INDEX_WRITE_MAX_ATTEMPTS: int = Field(default=5)  # per-doc write attempts before giving up
+    GCS_UPLOAD_CHUNK_MB: int = Field(default=8)  # resumable upload chunk size (multiple of 256KB)
+    DAILYMED_JOB_SLICE_SECONDS: int = Field(default=240)  # work budget per ingest-job invocation (< request timeout)
+    DAILYMED_JOB_LEASE_SECONDS: int = Field(default=600)  # a crashed runner's claim expires after this
+    DAILYMED_JOB_MAX_CONSECUTIVE_ERRORS: int = Field(default=5)  # failed steps in a row before the job is marked failed
+    DAILYMED_DOWNLOAD_SLICE_MB: int = Field(default=512)  # bulk zip bytes fetched (Range request) per job step
+    NDC_INDEX_ARTIFACT_PUBLISH: bool = Field(default=True)  # publish dailymed/ndc_index.bin after each ingest
 
     # Messaging
     TELEGRAM_BOT_TOKEN: str = Field(default="")
+    TELEGRAM_TIMEOUT_SECONDS: float = Field(default=20.0)
+    TELEGRAM_GLOBAL_RATE_PER_SECOND: float = Field(default=30.0)  # bot-wide send rate (Telegram's broadcast limit)
+    TELEGRAM_PER_CHAT_RATE_PER_SECOND: float = Field(default=1.0)  # per-chat send rate
+    TELEGRAM_MAX_CONCURRENCY: int = Field(default=64)  # in-flight sends / pooled connections per worker
+    TELEGRAM_MAX_RETRIES: int = Field(default=2)  # inline retries on 429 / 5xx / transport errors
+    TELEGRAM_INLINE_RETRY_MAX_SECONDS: float = Field(default=5.0)  # longer retry_after goes back to the outbox
+    TELEGRAM_FLOOD_PAUSE_MAX_SECONDS: float = Field(default=5.0)  # cap on the global pause after a 429
     TWILIO_ACCOUNT_SID: str = Field(default="")
     TWILIO_AUTH_TOKEN: str = Field(default="")
     TWILIO_FROM_NUMBER: str = Field(default="")
 
+    # Alert outbox (see alerts/outbox.py, alerts/outbox_worker.py)
+    ALERT_OUTBOX_BACKEND: str = Field(default="firestore")  # firestore | sqlite | memory
+    ALERT_OUTBOX_SQLITE_PATH: str = Field(default="alert_outbox.sqlite3")  # sqlite backend file
+    ALERT_OUTBOX_LEASE_SECONDS: int = Field(default=120)  # an unacked item becomes leasable again after this
+    ALERT_OUTBOX_LEASE_BATCH: int = Field(default=100)  # items leased per worker round trip
+    ALERT_OUTBOX_MAX_ATTEMPTS: int = Field(default=6)  # deliveries tried before an item is dead-lettered
+    ALERT_OUTBOX_RETRY_BASE_SECONDS: float = Field(default=30.0)  # backoff base (doubles per attempt)
+    ALERT_OUTBOX_RETRY_MAX_SECONDS: float = Field(default=3600.0)
+    ALERT_OUTBOX_RETENTION_DAYS: int = Field(default=7)  # done/dead items expire (Firestore TTL on expire_at)
+    ALERT_FANOUT_PAGE_SIZE: int = Field(default=1000)  # watcher entries per cursor page during fan-out
+    ALERT_FANOUT_WORKERS: int = Field(default=4)  # watcher pages evaluated/enqueued in parallel for one hot NDC
+    ALERT_WORKER_CONCURRENCY: int = Field(default=8)  # parallel Firestore calls (quota, ack, audit) per worker
+    ALERT_DELIVERY_CLAIM_STALE_SECONDS: float = Field(default=600.0)  # an unfinished delivery claim older than this can be re-claimed
+    ALERT_COALESCE_ENABLED: bool = Field(default=True)  # one combined message per user per sweep
+    ALERT_AUDIT_FLUSH_RECORDS: int = Field(default=200)  # buffered delivery attempts (2 docs each) per audit commit
+    ALERT_AUDIT_FLUSH_SECONDS: float = Field(default=5.0)  # max age of a buffered audit record before a flush
+    ALERT_WORKER_SLICE_SECONDS: int = Field(default=240)  # budget per /alert_outbox_drain call (< request timeout)
+
     # Billing
     STRIPE_API_KEY: str = Field(default="")
     STRIPE_WEBHOOK_SECRET: str = Field(default="")
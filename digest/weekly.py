@@ -6,6 +6,7 @@ from typing import Any, Dict, List
 
 from repos.watchlist_repo import WatchlistRepository
 from repos.shortage_repo import ShortageRepository
+from ndc.resolver import NDCResolver
 from messaging.dispatcher import MessageDispatcher
 
 log = logging.getLogger("glitch.digest.weekly")
@@ -29,14 +30,16 @@ def run_weekly_digest_for_user(user_id: str, telegram_chat_id: str) -> Dict[str,
     disp = MessageDispatcher()
 
     watched = wl.list_ndcs(user_id)
+    ndcs = [w["ndc_digits"] for w in watched]
+    # Batched: one shortage get_all, then names with the shortage doc as fallback.
+    shortages = sr.get_many(ndcs)
+    fallbacks = [shortages.get(ndc) or {} for ndc in ndcs]
     enriched = []
-    for w in watched:
-        ndc = w["ndc_digits"]
-        s = sr.get(ndc) or {}
+    for ndc, s, names in zip(ndcs, fallbacks, NDCResolver().resolve_many(ndcs, fallbacks)):
         enriched.append({
             "ndc_digits": ndc,
-            "brand_name": s.get("brand_name",""),
-            "generic_name": s.get("generic_name",""),
+            "brand_name": names.get("brand_name",""),
+            "generic_name": names.get("generic_name",""),
             "status": s.get("status",""),
         })
 
@@ -1,19 +1,24 @@
 from __future__ import annotations
 
-import io
+import hashlib
+import itertools
 import logging
-import re
+import multiprocessing
+import os
+import tempfile
 import zipfile
-from datetime import datetime, timezone
-from typing import Dict, Iterable, Optional, Tuple
-from xml.etree import ElementTree as ET
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
 
 import requests
 
 from config.settings import settings
-from storage.gcs_client import upload_bytes
-from repos.ndc_index_repo import NDCIndexRepository
-from ndc.normalizer import normalize_ndc_to_11
+from storage.gcs_client import blob_exists, compose_blobs, upload_file
+from ingest.dailymed_manifest import DailyMedManifest, MemberKey, load_manifest, save_manifest, zip_member_keys
+from ingest.ndc_index_writer import NDCIndexWriter
+from ndc.index_artifact import publish_index_artifact
+from ingest.spl_extract import SplRecord, extract_zip_members
+from utils.batching import chunked
 
 log = logging.getLogger("glitch.ingest.dailymed")
 
@@ -21,78 +26,289 @@ log = logging.getLogger("glitch.ingest.dailymed")
 # - Direct URL to a zip containing SPL XML files
 # - Zip that contains subfolders
 #
-# We parse SPL XML looking for NDC-like content and common SPL structures.
-# This is intentionally robust and defensive.
+# SPL parsing lives in ingest/spl_extract.py so parse workers stay lightweight.
 
-NDC_RE = re.compile(r"(\d{4,5})[- ]?(\d{3,4})[- ]?(\d{1,2})")
+DOWNLOAD_CHUNK_BYTES = 1024 * 1024
 
 
-def download_bulk_zip(url: str) -> bytes:
-    r = requests.get(url, timeout=120)
-    r.raise_for_status()
-    return r.content
+def download_bulk_zip(url: str, dest_dir: Optional[str] = None) -> Tuple[str, str, int]:
+    """Stream the archive to a temp file, hashing as it goes.
 
+    Returns (path, sha256 hex, size in bytes). Memory use is one chunk regardless of
+    archive size; the caller owns (and must delete) the file.
+    """
+    h = hashlib.sha256()
+    size = 0
+    fd, path = tempfile.mkstemp(prefix="dailymed_", suffix=".zip", dir=dest_dir or settings.DAILYMED_TMP_DIR or None)
+    try:
+        with os.fdopen(fd, "wb") as f, requests.get(url, stream=True, timeout=120) as r:
+            r.raise_for_status()
+            for chunk in r.iter_content(chunk_size=DOWNLOAD_CHUNK_BYTES):
+                if not chunk:
+                    continue
+                f.write(chunk)
+                h.update(chunk)
+                size += len(chunk)
+    except BaseException:
+        os.unlink(path)
+        raise
+    return path, h.hexdigest(), size
 
-def iter_xml_files_from_zip(zip_bytes: bytes) -> Iterable[Tuple[str, bytes]]:
-    with zipfile.ZipFile(io.BytesIO(zip_bytes)) as z:
-        for name in z.namelist():
-            if name.lower().endswith(".xml"):
-                yield name, z.read(name)
 
+def _content_range_total(value: Optional[str]) -> Optional[int]:
+    # "bytes 0-99/1234" -> 1234; "bytes 0-99/*" -> None
+    total = (value or "").rpartition("/")[2].strip()
+    return int(total) if total.isdigit() else None
 
-def extract_ndcs_from_spl_xml(xml_bytes: bytes) -> Iterable[str]:
-    # Strategy:
-    # 1) Try structured tags if present (varies)
-    # 2) Fallback: regex scan of text content for NDC patterns
-    try:
-        root = ET.fromstring(xml_bytes)
-    except Exception:
-        return []
 
-    found = set()
+def download_range(url: str, path: str, offset: int, max_bytes: int, etag: Optional[str] = None) -> Dict[str, Any]:
+    """Fetch up to `max_bytes` of the archive from byte `offset` into `path` (overwritten).
+
+    Sends If-Range with a strong ETag from an earlier slice, so a file replaced
+    mid-download is not stitched together. A 200 reply (range ignored, or the
+    file changed) carries the whole archive: it is read only when its
+    Content-Length fits in `max_bytes` (reported with start=0); otherwise the
+    body is left unread and ranged=False, bytes=0 is returned so the caller
+    never runs an unbounded step. Returns {start, bytes, total, complete, etag, ranged}.
+    """
+    headers = {"Range": f"bytes={offset}-{offset + max(1, max_bytes) - 1}"}
+    if etag and not etag.startswith("W/"):
+        headers["If-Range"] = etag
+    size = 0
+    with open(path, "wb") as f, requests.get(url, headers=headers, stream=True, timeout=120) as r:
+        if r.status_code == 416:
+            # Nothing left past `offset`: the previous slice ended exactly at the end.
+            return {"start": offset, "bytes": 0, "total": offset, "complete": True, "etag": etag, "ranged": True}
+        r.raise_for_status()
+        ranged = r.status_code == 206
+        if not ranged:
+            length = r.headers.get("Content-Length") or ""
+            if not length.isdigit() or int(length) > max_bytes:
+                return {"start": 0, "bytes": 0, "total": int(length) if length.isdigit() else None, "complete": False,
+                        "etag": r.headers.get("ETag"), "ranged": False}
+        for chunk in r.iter_content(chunk_size=DOWNLOAD_CHUNK_BYTES):
+            if chunk:
+                f.write(chunk)
+                size += len(chunk)
+        start = offset if ranged else 0
+        total = _content_range_total(r.headers.get("Content-Range")) if ranged else size
+        etag = r.headers.get("ETag") or (etag if ranged else None)
+    if total is not None:
+        complete = start + size >= total
+    else:
+        complete = size < max_bytes
+    return {"start": start, "bytes": size, "total": total, "complete": complete, "etag": etag, "ranged": ranged}
+
+
+def sha256_file(path: str) -> Tuple[str, int]:
+    h = hashlib.sha256()
+    size = 0
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(DOWNLOAD_CHUNK_BYTES), b""):
+            h.update(chunk)
+            size += len(chunk)
+    return h.hexdigest(), size
+
+
+def list_xml_members(zip_path: str) -> List[str]:
+    with zipfile.ZipFile(zip_path) as z:
+        return [info.filename for info in z.infolist() if info.filename.lower().endswith(".xml")]
+
+
+def iter_xml_files_from_zip(zip_path: str) -> Iterable[Tuple[str, bytes]]:
+    # Members are read one at a time from the on-disk archive; only the current
+    # SPL document is ever held in memory.
+    with zipfile.ZipFile(zip_path) as z:
+        for info in z.infolist():
+            if info.filename.lower().endswith(".xml"):
+                yield info.filename, z.read(info)
+
+
+def parse_workers() -> int:
+    return settings.DAILYMED_PARSE_WORKERS or os.cpu_count() or 1
+
+
+def iter_extracted_records(
+    zip_path: str,
+    workers: Optional[int] = None,
+    batch_size: Optional[int] = None,
+    names: Optional[List[str]] = None,
+) -> Iterator[Tuple[str, List[SplRecord]]]:
+    """Yield (member name, index records) for every SPL XML member, parsed across processes.
+
+    `names` restricts parsing to those members (default: every XML member).
+
+    Members are split into batches of `batch_size` names; each worker opens the
+    archive by path. At most 2x`workers` batches are in flight so results stream
+    back to the single caller-side writer instead of piling up. Order is not
+    preserved. workers=1 parses in-process.
+    """
+    workers = max(1, workers or parse_workers())
+    batch_size = max(1, batch_size or settings.DAILYMED_PARSE_BATCH_SIZE)
+    names = list_xml_members(zip_path) if names is None else list(names)
+    if not names:
+        return
+    if workers == 1:
+        for batch in chunked(names, batch_size):
+            yield from extract_zip_members(zip_path, batch)
+        return
+
+    # forkserver: workers never inherit the parent's gRPC/HTTP client threads.
+    ctx = multiprocessing.get_context("forkserver")
+    batches = iter(chunked(names, batch_size))
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as ex:
+        in_flight = set()
+        for batch in itertools.islice(batches, workers * 2):
+            in_flight.add(ex.submit(extract_zip_members, zip_path, batch))
+        while in_flight:
+            finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            for fut in finished:
+                yield from fut.result()
+                nxt = next(batches, None)
+                if nxt is not None:
+                    in_flight.add(ex.submit(extract_zip_members, zip_path, nxt))
+
+
+def archive_blob_name(sha256: str) -> str:
+    # Content-addressed: re-publishing an identical archive is a no-op.
+    return f"dailymed/sha256/{sha256}.zip"
+
+
+def publish_archive(zip_path: str, sha256: str, gcs_bucket: str) -> Tuple[str, bool]:
+    """Upload the archive under its content address unless it is already there."""
+    blob = archive_blob_name(sha256)
+    uploaded = not blob_exists(gcs_bucket, blob)
+    if uploaded:
+        upload_file(gcs_bucket, blob, zip_path, content_type="application/zip")
+    return blob, uploaded
+
 
-    # Structured attempt: scan all text nodes for patterns
-    for elem in root.iter():
-        if elem.text:
-            for m in NDC_RE.finditer(elem.text):
-                ndc = "".join(m.groups())
-                ndc11 = normalize_ndc_to_11(ndc)
-                if ndc11:
-                    found.add(ndc11)
+def publish_archive_parts(part_blobs: List[str], sha256: str, gcs_bucket: str) -> Tuple[str, bool]:
+    """publish_archive for an archive already staged in GCS as consecutive parts (composed server-side)."""
+    blob = archive_blob_name(sha256)
+    uploaded = not blob_exists(gcs_bucket, blob)
+    if uploaded:
+        compose_blobs(gcs_bucket, part_blobs, blob, content_type="application/zip")
+    return blob, uploaded
 
-    return list(found)
 
+# Incremental planning against the per-member manifest. The affected NDCs are
+# every NDC a changed or removed member used to list or now lists; for those,
+# any unchanged member that also lists them is re-parsed too ("co-sources") so
+# the merge policy sees every source. Affected NDCs no member lists any more
+# are deleted.
 
-def build_ndc_index_from_bulk_zip(url: str, gcs_bucket: str) -> Dict[str, int]:
+def plan_members(old: DailyMedManifest, current: Dict[str, MemberKey], full: bool = False) -> Tuple[List[str], List[str]]:
+    # full: every member is re-parsed, but removals still come from the old manifest.
+    changed = list(current) if full else [n for n, key in current.items() if old.key(n) != key]
+    removed = [n for n in old.members if n not in current]
+    return changed, removed
+
+
+def affected_ndcs(old: DailyMedManifest, changed: List[str], removed: List[str],
+                  parsed: Dict[str, List[SplRecord]]) -> Set[str]:
+    affected: Set[str] = set()
+    for name in itertools.chain(changed, removed):
+        affected.update(old.ndcs(name))
+    for records in parsed.values():
+        affected.update(r["ndc_digits"] for r in records)
+    return affected
+
+
+def co_source_members(old: DailyMedManifest, current: Dict[str, MemberKey], changed: List[str],
+                      affected: Set[str]) -> List[str]:
+    changed_set = set(changed)
+    return [n for n in current if n not in changed_set and affected.intersection(old.ndcs(n))]
+
+
+def merge_affected(writer: NDCIndexWriter, parsed: Dict[str, List[SplRecord]], affected: Set[str]) -> List[str]:
+    """Feed affected records to the writer (members in name order); return NDCs to delete."""
+    still_listed: Set[str] = set()
+    for name in sorted(parsed):
+        for rec in parsed[name]:
+            if rec["ndc_digits"] in affected:
+                still_listed.add(rec["ndc_digits"])
+                writer.add(rec, spl_xml_source=name)
+    return sorted(affected - still_listed)
+
+
+def next_manifest(old: DailyMedManifest, current: Dict[str, MemberKey], changed: List[str],
+                  parsed: Dict[str, List[SplRecord]], sha256: str) -> DailyMedManifest:
+    changed_set = set(changed)
+    new = DailyMedManifest({n: old.members[n] for n in current if n in old.members and n not in changed_set}, sha256)
+    for name in changed:
+        new.set_member(name, current[name], (r["ndc_digits"] for r in parsed.get(name, [])))
+    return new
+
+
+def build_ndc_index_from_bulk_zip(url: str, gcs_bucket: str, full: bool = False) -> Dict[str, Any]:
     if not gcs_bucket:
         raise RuntimeError("GCS_DAILYMED_BUCKET not configured")
 
-    zip_bytes = download_bulk_zip(url)
-    ts = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
-    gcs_path = upload_bytes(gcs_bucket, f"dailymed/bulk_{ts}.zip", zip_bytes, content_type="application/zip")
-    log.info("dailymed bulk downloaded", extra={"extra": {"gcs_path": gcs_path, "bytes": len(zip_bytes)}})
-
-    repo = NDCIndexRepository()
-    xml_count = 0
-    ndc_count = 0
-
-    for name, xml in iter_xml_files_from_zip(zip_bytes):
-        xml_count += 1
-        ndcs = extract_ndcs_from_spl_xml(xml)
-        if not ndcs:
-            continue
-        for ndc11 in ndcs:
-            # For MVP, we only guarantee NDC presence; name fields can be enriched later by deeper SPL parsing.
-            # We still keep schema stable and allow future enrich.
-            repo.upsert(ndc11, {
-                "ndc_digits": ndc11,
-                "brand_name": "",
-                "generic_name": "",
-                "manufacturer": "",
-                "source": "dailymed_bulk",
-                "spl_xml_source": name,
-                "updated_at": datetime.now(timezone.utc).isoformat(),
-            })
-            ndc_count += 1
-
-    return {"xml_files": xml_count, "ndc_upserts": ndc_count}
+    zip_path, sha256, size = download_bulk_zip(url)
+    try:
+        return _index_zip(zip_path, sha256, size, gcs_bucket, full=full)
+    finally:
+        os.unlink(zip_path)
+
+
+def _index_zip(zip_path: str, sha256: str, size: int, gcs_bucket: str, full: bool = False) -> Dict[str, Any]:
+    """Incremental re-ingest in one call (see plan_members and friends above).
+
+    full=True re-parses every member (and never skips an unchanged archive); the
+    stored manifest is still diffed so NDCs of removed members get deleted.
+    Long runs should go through ingest/dailymed_job.py, which checkpoints.
+    """
+    blob, archive_uploaded = publish_archive(zip_path, sha256, gcs_bucket)
+    gcs_path = f"gs://{gcs_bucket}/{blob}"
+    log.info("dailymed bulk downloaded", extra={"extra": {"gcs_path": gcs_path, "bytes": size, "sha256": sha256, "archive_uploaded": archive_uploaded}})
+
+    old = load_manifest(gcs_bucket)
+    if not full and old.archive_sha256 == sha256:
+        log.info("dailymed archive unchanged; skipping", extra={"extra": {"sha256": sha256}})
+        return {"skipped": "archive_unchanged", "sha256": sha256, "gcs_path": gcs_path, "xml_files": 0, "ndc_upserts": 0, "ndc_removals": 0}
+
+    current = zip_member_keys(zip_path)
+    changed, removed = plan_members(old, current, full=full)
+    workers = parse_workers()
+
+    parsed: Dict[str, List[SplRecord]] = dict(iter_extracted_records(zip_path, workers=workers, names=changed))
+    affected = affected_ndcs(old, changed, removed, parsed)
+    co_sources = co_source_members(old, current, changed, affected)
+    parsed.update(iter_extracted_records(zip_path, workers=workers, names=co_sources))
+
+    writer = NDCIndexWriter()
+    removals = merge_affected(writer, parsed, affected)
+    upserts = writer.items()
+    write_stats = writer.close()
+    delete_stats = {"deleted": 0, "failed": 0}
+    if removals:
+        delete_stats = writer.repo.delete_many(removals, max_ops_per_second=settings.NDC_INDEX_MAX_OPS_PER_SECOND)
+
+    # A partially failed write or delete must be retried next run: keep the old manifest.
+    manifest_saved = not write_stats["failed"] and not delete_stats["failed"]
+    artifact_stats: Dict[str, Any] = {}
+    if manifest_saved:
+        # Artifact first: it is built from the previous artifact plus this delta, so
+        # the manifest that would skip this archive next run is saved only after it.
+        if settings.NDC_INDEX_ARTIFACT_PUBLISH:
+            artifact_stats = publish_index_artifact(gcs_bucket, upserts, removals, repo=writer.repo)
+        save_manifest(gcs_bucket, next_manifest(old, current, changed, parsed, sha256))
+
+    stats = {
+        "sha256": sha256,
+        "gcs_path": gcs_path,
+        "xml_files": len(current),
+        "members_changed": len(changed),
+        "members_removed": len(removed),
+        "members_reparsed_for_merge": len(co_sources),
+        "ndc_upserts": write_stats["written"],
+        "ndc_removals": delete_stats["deleted"],
+        "ndc_removals_failed": delete_stats["failed"],
+        "parse_workers": workers,
+        "manifest_saved": manifest_saved,
+        **write_stats,
+        **artifact_stats,
+    }
+    log.info("dailymed incremental ingest complete", extra={"extra": stats})
+    return stats
@@ -0,0 +1,516 @@
+from __future__ import annotations
+
+import argparse
+import gzip
+import json
+import logging
+import os
+import shutil
+import socket
+import tempfile
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from config.settings import settings
+from ingest.dailymed_bulk import (
+    DOWNLOAD_CHUNK_BYTES, affected_ndcs, co_source_members, download_range, iter_extracted_records,
+    merge_affected, next_manifest, parse_workers, plan_members, publish_archive_parts, sha256_file,
+)
+from ingest.dailymed_manifest import MANIFEST_BLOB, DailyMedManifest, save_manifest, zip_member_keys
+from ingest.ndc_index_writer import NDCIndexWriter
+from ingest.spl_extract import SplRecord
+from ndc.index_artifact import publish_index_artifact
+from repos.dailymed_job_repo import STATUS_DONE, STATUS_FAILED, STATUS_RUNNING, DailyMedJobRepository, LeaseLostError
+from storage.gcs_client import delete_blobs, download_bytes, download_file, upload_bytes, upload_file
+
+log = logging.getLogger("glitch.ingest.dailymed_job")
+
+# Resumable DailyMed bulk ingest. The incremental plan from dailymed_bulk runs as
+# a job whose cursor lives in system/dailymed_ingest_job:
+#   download - one Range request of DAILYMED_DOWNLOAD_SLICE_MB per step; each
+#              slice is staged as a part blob (dailymed/jobs/<job_id>/download/).
+#              A server that ignores Range fails the job rather than running
+#              one unbounded step (unless the whole file fits in a slice).
+#   archive  - sha256 of the zip; the parts are composed into the
+#              content-addressed archive (dailymed/sha256/<hex>.zip)
+#   plan     - manifest diff; skips the job when the archive is unchanged
+#   parse    - member_index walks changed members, then co-source members; each
+#              slice's records are staged to GCS (dailymed/jobs/<job_id>/parsed/)
+#   write    - merged ndc_index docs in NDC order; write_offset is the next doc
+#   finalize - deletions, manifest, status=done
+# Every step checkpoints, so an invocation that hits its time budget (or dies)
+# loses at most one step. A runner without the local file rebuilds it from the
+# staged parts (download/archive) or the archive (later phases). One runner at a
+# time, via a lease on the cursor; a checkpoint from a runner that lost its lease
+# is refused and that step is redone by the new owner. A job whose steps keep
+# failing (DAILYMED_JOB_MAX_CONSECUTIVE_ERRORS in a row) or that an operator
+# abandons ends with status=failed, which lets a new job start.
+
+PHASE_DOWNLOAD = "download"
+PHASE_ARCHIVE = "archive"
+PHASE_PLAN = "plan"
+PHASE_PARSE = "parse"
+PHASE_WRITE = "write"
+PHASE_FINALIZE = "finalize"
+PHASE_DONE = "done"
+
+
+def _job_prefix(job_id: str) -> str:
+    return f"dailymed/jobs/{job_id}"
+
+
+def _put_json(bucket: str, blob: str, obj: Any) -> None:
+    upload_bytes(bucket, blob, gzip.compress(json.dumps(obj, separators=(",", ":")).encode("utf-8")), content_type="application/gzip")
+
+
+def _get_json(bucket: str, blob: str) -> Any:
+    raw = download_bytes(bucket, blob)
+    if raw is None:
+        raise RuntimeError(f"dailymed job artifact missing: gs://{bucket}/{blob}")
+    return json.loads(gzip.decompress(raw).decode("utf-8"))
+
+
+def _tmp_dir() -> str:
+    return settings.DAILYMED_TMP_DIR or tempfile.gettempdir()
+
+
+def _local_zip_path(sha256: str) -> str:
+    return os.path.join(_tmp_dir(), f"dailymed_{sha256}.zip")
+
+
+def _local_download_path(job_id: str) -> str:
+    return os.path.join(_tmp_dir(), f"dailymed_{job_id}.download")
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def start_job(url: str, gcs_bucket: str, full: bool = False, repo: Optional[DailyMedJobRepository] = None) -> Dict[str, Any]:
+    """Write a fresh cursor in the download phase; run_job does everything else.
+
+    Refuses (returns the current progress) while another job is still running;
+    the check and the write are one transaction.
+    """
+    if not gcs_bucket:
+        raise RuntimeError("GCS_DAILYMED_BUCKET not configured")
+    repo = repo or DailyMedJobRepository()
+
+    job_id = f"{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')}_{uuid.uuid4().hex[:8]}"
+    cursor: Dict[str, Any] = {
+        "job_id": job_id,
+        "url": url,
+        "full": full,
+        "gcs_bucket": gcs_bucket,
+        "status": STATUS_RUNNING,
+        "phase": PHASE_DOWNLOAD,
+        "download_offset": 0,
+        "download_parts": [],
+        "download_etag": None,
+        "download_seconds": 0.0,
+        "bytes_total": None,
+        "sha256": None,
+        "bytes": None,
+        "archive_blob": None,
+        "started_at": _now(),
+        "updated_at": _now(),
+        "member_index": 0,
+        "members_total": 0,
+        "co_sources_planned": False,
+        "staged": [],
+        "records_staged": 0,
+        "write_offset": 0,
+        "writes_total": None,
+        "written": 0,
+        "failed": 0,
+        "parse_seconds": 0.0,
+        "write_seconds": 0.0,
+        "slices": 0,
+        "last_error": None,
+        "consecutive_errors": 0,
+    }
+    running = repo.start(cursor)
+    if running is not None:
+        return {"started": False, "reason": "job_in_progress", **job_progress(running)}
+    log.info("dailymed ingest job started", extra={"extra": {"job_id": job_id, "url": url, "full": full}})
+    return {"started": True, **job_progress(cursor)}
+
+
+class _JobRunner:
+    def __init__(self, cursor: Dict[str, Any], repo: DailyMedJobRepository, owner: str):
+        self.cursor = cursor
+        self.repo = repo
+        self.owner = owner
+        self.bucket = cursor["gcs_bucket"]
+        self.prefix = _job_prefix(cursor["job_id"])
+        self._plan: Optional[Dict[str, Any]] = None
+        self._base: Optional[DailyMedManifest] = None
+        self._parsed: Optional[Dict[str, List[SplRecord]]] = None
+        self._writer: Optional[NDCIndexWriter] = None
+        self._items: Optional[List[Any]] = None
+        self._removals: List[str] = []
+
+    # -- lazily loaded job state ------------------------------------------------
+
+    @property
+    def plan(self) -> Dict[str, Any]:
+        if self._plan is None:
+            self._plan = _get_json(self.bucket, f"{self.prefix}/plan.json.gz")
+        return self._plan
+
+    @property
+    def base(self) -> DailyMedManifest:
+        if self._base is None:
+            raw = download_bytes(self.bucket, f"{self.prefix}/base_manifest.json.gz") if self.plan["has_base_manifest"] else None
+            self._base = DailyMedManifest.from_bytes(raw) if raw else DailyMedManifest()
+        return self._base
+
+    @property
+    def parsed(self) -> Dict[str, List[SplRecord]]:
+        if self._parsed is None:
+            self._parsed = {}
+            for start in self.cursor["staged"]:
+                self._parsed.update(_get_json(self.bucket, f"{self.prefix}/parsed/{start:07d}.json.gz"))
+        return self._parsed
+
+    def zip_path(self) -> str:
+        path = _local_zip_path(self.cursor["sha256"])
+        if not os.path.exists(path):
+            # Resuming on a fresh instance: pull the archived copy.
+            log.info("dailymed job fetching archive", extra={"extra": {"blob": self.cursor["archive_blob"]}})
+            tmp = f"{path}.{uuid.uuid4().hex[:8]}.part"
+            download_file(self.bucket, self.cursor["archive_blob"], tmp)
+            os.replace(tmp, path)
+        return path
+
+    def _current(self) -> Dict[str, Any]:
+        return {n: tuple(k) for n, k in self.plan["current"].items()}
+
+    def _affected(self):
+        return affected_ndcs(self.base, self.plan["changed"], self.plan["removed"], self.parsed)
+
+    def _checkpoint(self, updates: Dict[str, Any]) -> None:
+        # Raises LeaseLostError if another runner took over; the cursor is then left as it was.
+        if self.cursor.get("consecutive_errors"):
+            updates = {**updates, "consecutive_errors": 0}
+        self.cursor = self.repo.checkpoint(updates, self.owner, settings.DAILYMED_JOB_LEASE_SECONDS)
+
+    # -- steps ------------------------------------------------------------------
+
+    def step(self) -> None:
+        phase = self.cursor["phase"]
+        if phase == PHASE_DOWNLOAD:
+            self._download_step()
+        elif phase == PHASE_ARCHIVE:
+            self._archive_step()
+        elif phase == PHASE_PLAN:
+            self._plan_step()
+        elif phase == PHASE_PARSE:
+            self._parse_step()
+        elif phase == PHASE_WRITE:
+            self._write_step()
+        elif phase == PHASE_FINALIZE:
+            self._finalize()
+
+    def _part_blob(self, start: int) -> str:
+        return f"{self.prefix}/download/{start:013d}.part"
+
+    def _download_file(self) -> str:
+        """Local copy of the bytes downloaded so far, rebuilt from the staged parts if missing."""
+        path = _local_download_path(self.cursor["job_id"])
+        offset = self.cursor["download_offset"]
+        if os.path.exists(path) and os.path.getsize(path) >= offset:
+            # Drop the tail of a slice whose checkpoint never landed.
+            os.truncate(path, offset)
+            return path
+        log.info("dailymed job rebuilding download from parts", extra={"extra": {"parts": len(self.cursor["download_parts"])}})
+        fetched = f"{path}.fetch"
+        with open(path, "wb") as out:
+            for start in self.cursor["download_parts"]:
+                download_file(self.bucket, self._part_blob(start), fetched)
+                with open(fetched, "rb") as f:
+                    shutil.copyfileobj(f, out, DOWNLOAD_CHUNK_BYTES)
+                os.unlink(fetched)
+        return path
+
+    def _download_step(self) -> None:
+        path = self._download_file()
+        offset = self.cursor["download_offset"]
+        part = f"{path}.{offset:013d}"
+        t0 = time.perf_counter()
+        try:
+            res = download_range(self.cursor["url"], part, offset, settings.DAILYMED_DOWNLOAD_SLICE_MB * 1024 * 1024,
+                                 etag=self.cursor["download_etag"])
+            if not res["ranged"] and not res["bytes"]:
+                self._whole_file_reply(path, res)
+                return
+            parts = self.cursor["download_parts"]
+            if res["start"] != offset:
+                # The server sent the whole file (no Range support, or it changed): start over.
+                log.info("dailymed download restarted from byte 0", extra={"extra": {"offset": offset}})
+                parts = []
+                open(path, "wb").close()
+            if res["bytes"]:
+                upload_file(self.bucket, self._part_blob(res["start"]), part)
+                parts = parts + [res["start"]]
+                with open(part, "rb") as f, open(path, "ab") as out:
+                    shutil.copyfileobj(f, out, DOWNLOAD_CHUNK_BYTES)
+        finally:
+            if os.path.exists(part):
+                os.unlink(part)
+        self._checkpoint({
+            "download_offset": res["start"] + res["bytes"],
+            "download_parts": parts,
+            "download_etag": res["etag"],
+            "bytes_total": res["total"],
+            "download_seconds": round(self.cursor["download_seconds"] + time.perf_counter() - t0, 3),
+            **({"phase": PHASE_ARCHIVE} if res["complete"] else {}),
+        })
+
+    def _whole_file_reply(self, path: str, res: Dict[str, Any]) -> None:
+        # A 200 too large to read in one step. After earlier slices it means the
+        # archive was replaced (If-Range mismatch): start over. On a fresh
+        # download the server ignores Range, which this job cannot work with.
+        if self.cursor["download_offset"] or self.cursor["download_etag"]:
+            log.info("dailymed archive changed mid-download; restarting", extra={"extra": {"offset": self.cursor["download_offset"]}})
+            open(path, "wb").close()
+            self._checkpoint({"download_offset": 0, "download_parts": [], "download_etag": None, "bytes_total": None})
+            return
+        error = (f"server ignored the Range request ({res['total'] or 'unknown'} bytes in one reply); "
+                 "use the one-shot build_ndc_index_from_bulk_zip (ingest/dailymed_bulk.py) for this URL")
+        log.error("dailymed ingest job failed", extra={"extra": {"job_id": self.cursor["job_id"], "error": error}})
+        self._checkpoint({"status": STATUS_FAILED, "finished_at": _now(), "last_error": error})
+
+    def _archive_step(self) -> None:
+        path = self._download_file()
+        sha256, size = sha256_file(path)
+        parts = [self._part_blob(start) for start in self.cursor["download_parts"]]
+        blob, uploaded = publish_archive_parts(parts, sha256, self.bucket)
+        log.info("dailymed bulk downloaded", extra={"extra": {"gcs_path": f"gs://{self.bucket}/{blob}", "bytes": size,
+                                                              "sha256": sha256, "archive_uploaded": uploaded}})
+        self._checkpoint({"phase": PHASE_PLAN, "sha256": sha256, "bytes": size, "archive_blob": blob,
+                          "archive_uploaded": uploaded})
+        # Later phases read the archive; the parts are no longer needed.
+        os.replace(path, _local_zip_path(sha256))
+        delete_blobs(self.bucket, parts)
+
+    def _plan_step(self) -> None:
+        sha256 = self.cursor["sha256"]
+        # Snapshot the manifest the plan was computed against; finalize diffs from it.
+        # A full run reads it too: removed members' NDCs must still be deleted.
+        full = self.cursor["full"]
+        old_raw = download_bytes(self.bucket, MANIFEST_BLOB)
+        old = DailyMedManifest.from_bytes(old_raw) if old_raw else DailyMedManifest()
+        if not full and old.archive_sha256 == sha256:
+            self._checkpoint({"status": STATUS_DONE, "phase": PHASE_DONE, "skipped": "archive_unchanged", "finished_at": _now()})
+            path = _local_zip_path(sha256)
+            if os.path.exists(path):
+                os.unlink(path)
+            log.info("dailymed archive unchanged; job not needed", extra={"extra": {"sha256": sha256}})
+            return
+
+        current = zip_member_keys(self.zip_path())
+        changed, removed = plan_members(old, current, full=full)
+        if old_raw:
+            upload_bytes(self.bucket, f"{self.prefix}/base_manifest.json.gz", old_raw, content_type="application/gzip")
+        plan = {
+            "current": {n: list(k) for n, k in current.items()},
+            "changed": changed,
+            "removed": removed,
+            "co_sources": None,
+            "has_base_manifest": bool(old_raw),
+        }
+        _put_json(self.bucket, f"{self.prefix}/plan.json.gz", plan)
+        self._checkpoint({"phase": PHASE_PARSE, "members_total": len(changed), "members_changed": len(changed),
+                          "members_removed": len(removed), "xml_files": len(current)})
+        self._plan, self._base = plan, old
+        log.info("dailymed ingest job planned", extra={"extra": {k: self.cursor[k] for k in ("job_id", "sha256", "xml_files", "members_changed", "members_removed")}})
+
+    def _parse_step(self) -> None:
+        members = self.plan["changed"] + (self.plan["co_sources"] or [])
+        idx = self.cursor["member_index"]
+        if idx < len(members):
+            workers = parse_workers()
+            names = members[idx: idx + workers * max(1, settings.DAILYMED_PARSE_BATCH_SIZE)]
+            t0 = time.perf_counter()
+            records = dict(iter_extracted_records(self.zip_path(), workers=workers, names=names))
+            # Staged under the slice's start index: a retried slice overwrites its own blob.
+            _put_json(self.bucket, f"{self.prefix}/parsed/{idx:07d}.json.gz", records)
+            self.parsed.update(records)
+            self._checkpoint({
+                "member_index": idx + len(names),
+                "staged": sorted(set(self.cursor["staged"]) | {idx}),
+                "records_staged": self.cursor["records_staged"] + sum(len(r) for r in records.values()),
+                "parse_seconds": round(self.cursor["parse_seconds"] + time.perf_counter() - t0, 3),
+            })
+            return
+
+        if self.plan["co_sources"] is None:
+            co_sources = co_source_members(self.base, self._current(), self.plan["changed"], self._affected())
+            self.plan["co_sources"] = co_sources
+            _put_json(self.bucket, f"{self.prefix}/plan.json.gz", self.plan)
+            self._checkpoint({"co_sources_planned": True, "members_reparsed_for_merge": len(co_sources),
+                              "members_total": len(self.plan["changed"]) + len(co_sources)})
+            return
+
+        self._prepare_items()
+        self._checkpoint({"phase": PHASE_WRITE, "writes_total": len(self._items or [])})
+
+    def _prepare_items(self) -> None:
+        # Deterministic from the staged records, so every runner computes the same order.
+        self._writer = NDCIndexWriter()
+        self._removals = merge_affected(self._writer, self.parsed, self._affected())
+        self._items = self._writer.items()
+
+    def _write_step(self) -> None:
+        if self._items is None:
+            self._prepare_items()
+        off = self.cursor["write_offset"]
+        batch = (self._items or [])[off: off + max(1, settings.NDC_INDEX_WRITE_BATCH_SIZE)]
+        if not batch:
+            self._checkpoint({"phase": PHASE_FINALIZE})
+            return
+        res = self._writer.write(batch)
+        self._checkpoint({
+            "write_offset": off + len(batch),
+            "written": self.cursor["written"] + res["written"],
+            "failed": self.cursor["failed"] + res["failed"],
+            "write_seconds": round(self.cursor["write_seconds"] + res["write_seconds"], 3),
+        })
+
+    def _finalize(self) -> None:
+        if self._items is None:
+            self._prepare_items()
+        delete_stats = {"deleted": 0, "failed": 0}
+        if self._removals:
+            delete_stats = self._writer.repo.delete_many(self._removals, max_ops_per_second=settings.NDC_INDEX_MAX_OPS_PER_SECOND)
+        # A partially failed write or delete must be retried next run: keep the old manifest.
+        manifest_saved = not self.cursor["failed"] and not delete_stats["failed"]
+        artifact_stats: Dict[str, Any] = {}
+        if manifest_saved:
+            # Artifact before manifest (see _index_zip); a failed publish retries the finalize.
+            if settings.NDC_INDEX_ARTIFACT_PUBLISH:
+                artifact_stats = publish_index_artifact(self.bucket, self._items or [], self._removals, repo=self._writer.repo)
+            save_manifest(self.bucket, next_manifest(self.base, self._current(), self.plan["changed"], self.parsed, self.cursor["sha256"]))
+        self._checkpoint({"phase": PHASE_DONE, "status": STATUS_DONE, "finished_at": _now(),
+                          "ndc_removals": delete_stats["deleted"], "ndc_removals_failed": delete_stats["failed"],
+                          "manifest_saved": manifest_saved, **artifact_stats})
+        path = _local_zip_path(self.cursor["sha256"])
+        if os.path.exists(path):
+            os.unlink(path)
+        log.info("dailymed ingest job complete", extra={"extra": job_progress(self.cursor)})
+
+
+def run_job(budget_seconds: Optional[float] = None, repo: Optional[DailyMedJobRepository] = None) -> Dict[str, Any]:
+    """Advance the current job until it finishes or `budget_seconds` elapse (None = no limit)."""
+    repo = repo or DailyMedJobRepository()
+    cursor = repo.get()
+    if not cursor or cursor.get("status") != STATUS_RUNNING:
+        return job_progress(cursor)
+
+    owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+    if not repo.claim(cursor["job_id"], owner, settings.DAILYMED_JOB_LEASE_SECONDS):
+        return {"claimed": False, **job_progress(cursor)}
+
+    deadline = None if budget_seconds is None else time.monotonic() + budget_seconds
+    runner = _JobRunner(cursor, repo, owner)
+    try:
+        # At least one step per invocation, so even a tiny budget makes progress.
+        while runner.cursor["phase"] != PHASE_DONE and runner.cursor["status"] == STATUS_RUNNING:
+            runner.step()
+            if deadline is not None and time.monotonic() >= deadline:
+                break
+    except LeaseLostError:
+        # Our lease expired mid-step and another runner took over: its cursor wins.
+        log.warning("dailymed ingest job lease lost; step discarded", extra={"extra": {"job_id": cursor["job_id"], "phase": runner.cursor["phase"]}})
+        return {"claimed": False, "reason": "lease_lost", **job_progress(repo.get())}
+    except Exception as e:
+        log.exception("dailymed ingest job step failed", extra={"extra": {"job_id": cursor["job_id"], "phase": runner.cursor["phase"]}})
+        errors = int(runner.cursor.get("consecutive_errors") or 0) + 1
+        updates: Dict[str, Any] = {"last_error": f"{type(e).__name__}: {e}"[:500], "consecutive_errors": errors}
+        if errors >= settings.DAILYMED_JOB_MAX_CONSECUTIVE_ERRORS:
+            # Stop retrying: a job left running forever would refuse every new one.
+            updates.update(status=STATUS_FAILED, finished_at=_now())
+            log.error("dailymed ingest job failed", extra={"extra": {"job_id": cursor["job_id"], "consecutive_errors": errors}})
+        try:
+            repo.checkpoint(updates, owner, settings.DAILYMED_JOB_LEASE_SECONDS)
+        except LeaseLostError:
+            pass
+        raise
+    finally:
+        repo.release(owner)
+    return {"claimed": True, **job_progress(runner.cursor)}
+
+
+def abandon_job(reason: str = "abandoned by operator", repo: Optional[DailyMedJobRepository] = None) -> Dict[str, Any]:
+    """Mark the running job failed so a new one can start; staged blobs expire with the dailymed/jobs/ lifecycle rule."""
+    repo = repo or DailyMedJobRepository()
+    abandoned = repo.abandon(reason)
+    if abandoned is None:
+        return {"abandoned": False, **job_progress(repo.get())}
+    log.warning("dailymed ingest job abandoned", extra={"extra": {"job_id": abandoned.get("job_id"), "reason": reason}})
+    return {"abandoned": True, **job_progress(abandoned)}
+
+
+def job_progress(cursor: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Progress, throughput and ETA derived from the cursor alone."""
+    if not cursor:
+        return {"status": "none"}
+    c = cursor
+    members_done, members_total = c.get("member_index", 0), c.get("members_total", 0)
+    writes_done, writes_total = c.get("write_offset", 0), c.get("writes_total")
+    parse_rate = members_done / c["parse_seconds"] if c.get("parse_seconds") else None
+    write_rate = writes_done / c["write_seconds"] if c.get("write_seconds") else None
+    bytes_done, bytes_total = c.get("download_offset", 0), c.get("bytes_total")
+    download_rate = bytes_done / c["download_seconds"] if c.get("download_seconds") else None
+
+    eta: Optional[float] = 0.0
+    if c.get("status") == STATUS_RUNNING:
+        if c.get("phase") == PHASE_DOWNLOAD:
+            eta = (bytes_total - bytes_done) / download_rate if download_rate and bytes_total else None
+        elif c.get("phase") in (PHASE_ARCHIVE, PHASE_PLAN):
+            eta = None
+        elif c.get("phase") == PHASE_PARSE:
+            # Write volume is unknown until parsing ends, so this covers parsing only.
+            eta = (members_total - members_done) / parse_rate if parse_rate else None
+        elif writes_total is not None:
+            eta = (writes_total - writes_done) / write_rate if write_rate else None
+
+    keys = ("job_id", "status", "phase", "sha256", "started_at", "updated_at", "finished_at", "xml_files",
+            "members_changed", "members_removed", "members_reparsed_for_merge", "written", "failed",
+            "ndc_removals", "ndc_removals_failed", "manifest_saved", "artifact_entries", "skipped", "last_error",
+            "consecutive_errors", "slices")
+    return {
+        **{k: c.get(k) for k in keys if k in c},
+        "bytes_downloaded": bytes_done,
+        "bytes_total": bytes_total,
+        "members_done": members_done,
+        "members_total": members_total,
+        "writes_done": writes_done,
+        "writes_total": writes_total,
+        "members_per_second": round(parse_rate, 1) if parse_rate else None,
+        "writes_per_second": round(write_rate, 1) if write_rate else None,
+        "eta_seconds": round(eta, 1) if eta is not None else None,
+        "eta_covers": c.get("phase") if c.get("phase") in (PHASE_DOWNLOAD, PHASE_PARSE) else "write",
+    }
+
+
+def main() -> None:
+    # Local worker: optionally start a job, then run it to completion without a time budget.
+    parser = argparse.ArgumentParser(description="Run (or resume) the DailyMed bulk ingest job.")
+    parser.add_argument("--url", help="start a new job for this bulk zip URL first")
+    parser.add_argument("--full", action="store_true", help="re-parse every member and rewrite the whole index")
+    parser.add_argument("--abandon", action="store_true", help="mark the running job failed and exit")
+    args = parser.parse_args()
+    if args.abandon:
+        print(json.dumps(abandon_job(), default=str))
+        return
+    if args.url:
+        print(json.dumps(start_job(args.url, settings.GCS_DAILYMED_BUCKET, full=args.full), default=str))
+    print(json.dumps(run_job(budget_seconds=None), default=str))
+
+
+if __name__ == "__main__":
+    main()
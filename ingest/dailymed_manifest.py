@@ -0,0 +1,62 @@
+from __future__ import annotations
+
+import gzip
+import json
+import zipfile
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from storage.gcs_client import download_bytes, upload_bytes
+
+# Per-member manifest for incremental DailyMed re-ingest, stored next to the
+# archives in the DailyMed bucket:
+#   {"archive_sha256": str, "updated_at": iso,
+#    "members": {member_name: {"crc": int, "size": int, "ndcs": [ndc11, ...]}}}
+# A member is unchanged when its zip CRC-32 and uncompressed size both match.
+
+MANIFEST_BLOB = "dailymed/manifest.json.gz"
+
+MemberKey = Tuple[int, int]  # (crc, size)
+
+
+class DailyMedManifest:
+    def __init__(self, members: Optional[Dict[str, Dict[str, Any]]] = None, archive_sha256: str = ""):
+        self.members: Dict[str, Dict[str, Any]] = members or {}
+        self.archive_sha256 = archive_sha256
+
+    def key(self, name: str) -> Optional[MemberKey]:
+        m = self.members.get(name)
+        return (int(m["crc"]), int(m["size"])) if m else None
+
+    def ndcs(self, name: str) -> List[str]:
+        return list((self.members.get(name) or {}).get("ndcs") or [])
+
+    def set_member(self, name: str, key: MemberKey, ndcs: Iterable[str]) -> None:
+        self.members[name] = {"crc": key[0], "size": key[1], "ndcs": sorted(set(ndcs))}
+
+    def to_bytes(self) -> bytes:
+        payload = {
+            "archive_sha256": self.archive_sha256,
+            "updated_at": datetime.now(timezone.utc).isoformat(),
+            "members": self.members,
+        }
+        return gzip.compress(json.dumps(payload, separators=(",", ":")).encode("utf-8"))
+
+    @classmethod
+    def from_bytes(cls, raw: bytes) -> "DailyMedManifest":
+        data = json.loads(gzip.decompress(raw).decode("utf-8"))
+        return cls(dict(data.get("members") or {}), str(data.get("archive_sha256") or ""))
+
+
+def zip_member_keys(zip_path: str) -> Dict[str, MemberKey]:
+    with zipfile.ZipFile(zip_path) as z:
+        return {i.filename: (i.CRC, i.file_size) for i in z.infolist() if i.filename.lower().endswith(".xml")}
+
+
+def load_manifest(bucket: str) -> DailyMedManifest:
+    raw = download_bytes(bucket, MANIFEST_BLOB)
+    return DailyMedManifest.from_bytes(raw) if raw else DailyMedManifest()
+
+
+def save_manifest(bucket: str, manifest: DailyMedManifest) -> str:
+    return upload_bytes(bucket, MANIFEST_BLOB, manifest.to_bytes(), content_type="application/gzip")
@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 import hashlib
+from datetime import datetime
 from typing import Any, Dict
 
 
@@ -16,3 +17,18 @@ def snapshot_hash(record: Dict[str, Any]) -> str:
     }
     s = str(sorted(relevant.items())).encode("utf-8")
     return hashlib.sha256(s).hexdigest()
+
+
+# (format, width) pairs for the date shapes openFDA has used; time suffixes are ignored.
+_DATE_FORMATS = (("%Y-%m-%d", 10), ("%m/%d/%Y", 10), ("%Y%m%d", 8))
+
+
+def normalize_last_updated(value: Any) -> str:
+    """openFDA date -> ISO YYYY-MM-DD (comparable as a string); "" if unparseable."""
+    s = str(value or "").strip()
+    for fmt, width in _DATE_FORMATS:
+        try:
+            return datetime.strptime(s[:width], fmt).date().isoformat()
+        except ValueError:
+            continue
+    return ""
@@ -0,0 +1,112 @@
+from __future__ import annotations
+
+import gzip
+import json
+import logging
+import threading
+import time
+from typing import Dict, Iterable, Optional, Tuple
+
+from config.settings import settings
+from repos.shortage_repo import ShortageRepository
+from storage.gcs_client import download_bytes, upload_bytes
+
+log = logging.getLogger("glitch.ingest.hash_index")
+
+# Compact ndc11 -> snapshot_hash map of everything stored in `shortages`.
+# Lets a sweep decide "unchanged" without touching Firestore for that record.
+#
+# Sources, cheapest first:
+#   1) process cache (warm ingest instance)
+#   2) gzipped JSON artifact in GCS (cold start), if SHORTAGE_HASH_INDEX_BUCKET is set
+#   3) projection query on shortages selecting only snapshot_hash
+# Anything older than SHORTAGE_HASH_INDEX_MAX_AGE_SECONDS is rebuilt from (3),
+# which bounds drift if shortage docs are edited outside the sweeper.
+
+ARTIFACT_BLOB = "artifacts/shortage_hash_index.json.gz"
+
+_lock = threading.Lock()
+_cached: Optional["ShortageHashIndex"] = None
+
+
+class ShortageHashIndex:
+    def __init__(self, hashes: Dict[str, str], built_at: float, source: str):
+        self.hashes = hashes
+        self.built_at = built_at
+        self.source = source
+        self.dirty = False
+
+    def __len__(self) -> int:
+        return len(self.hashes)
+
+    def get(self, ndc11: str) -> Optional[str]:
+        return self.hashes.get(ndc11)
+
+    def update(self, items: Iterable[Tuple[str, str]]) -> None:
+        for ndc11, h in items:
+            if self.hashes.get(ndc11) != h:
+                self.hashes[ndc11] = h
+                self.dirty = True
+
+    def age_seconds(self) -> float:
+        return time.time() - self.built_at
+
+    def to_bytes(self) -> bytes:
+        return gzip.compress(json.dumps({"built_at": self.built_at, "hashes": self.hashes}, separators=(",", ":")).encode("utf-8"))
+
+    @classmethod
+    def from_bytes(cls, raw: bytes, source: str) -> "ShortageHashIndex":
+        data = json.loads(gzip.decompress(raw).decode("utf-8"))
+        return cls(dict(data.get("hashes") or {}), float(data.get("built_at") or 0), source)
+
+
+def _fresh(idx: Optional[ShortageHashIndex]) -> bool:
+    return idx is not None and idx.age_seconds() < settings.SHORTAGE_HASH_INDEX_MAX_AGE_SECONDS
+
+
+def _load_artifact() -> Optional[ShortageHashIndex]:
+    bucket = settings.SHORTAGE_HASH_INDEX_BUCKET
+    if not bucket:
+        return None
+    try:
+        raw = download_bytes(bucket, ARTIFACT_BLOB)
+        return ShortageHashIndex.from_bytes(raw, source="gcs") if raw else None
+    except Exception as e:
+        log.warning("hash index artifact unreadable; rebuilding", extra={"extra": {"error": str(e)}})
+        return None
+
+
+def load_hash_index(repo: Optional[ShortageRepository] = None) -> ShortageHashIndex:
+    global _cached
+    with _lock:
+        if _fresh(_cached):
+            return _cached
+        idx = _load_artifact()
+        if not _fresh(idx):
+            repo = repo or ShortageRepository()
+            idx = ShortageHashIndex(dict(repo.iter_snapshot_hashes()), time.time(), source="projection")
+            idx.dirty = True  # publish the rebuilt artifact
+        _cached = idx
+        log.info("hash index loaded", extra={"extra": {"source": idx.source, "entries": len(idx)}})
+        return idx
+
+
+def save_hash_index(idx: ShortageHashIndex) -> None:
+    """Keep the process cache and (if configured) the GCS artifact in step with writes."""
+    global _cached
+    with _lock:
+        _cached = idx
+        if not idx.dirty or not settings.SHORTAGE_HASH_INDEX_BUCKET:
+            return
+        upload_bytes(settings.SHORTAGE_HASH_INDEX_BUCKET, ARTIFACT_BLOB, idx.to_bytes(), content_type="application/gzip")
+        idx.dirty = False
+
+
+def invalidate_hash_index() -> None:
+    """Drop the process cache; the next sweep rebuilds from Firestore. Call after out-of-band shortage edits."""
+    global _cached
+    with _lock:
+        _cached = None
+        if settings.SHORTAGE_HASH_INDEX_BUCKET:
+            upload_bytes(settings.SHORTAGE_HASH_INDEX_BUCKET, ARTIFACT_BLOB,
+                         ShortageHashIndex({}, 0.0, "invalidated").to_bytes(), content_type="application/gzip")
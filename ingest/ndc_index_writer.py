@@ -0,0 +1,96 @@
+from __future__ import annotations
+
+import logging
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from config.settings import settings
+from repos.ndc_index_repo import NDCIndexRepository
+from utils.batching import chunked
+
+log = logging.getLogger("glitch.ingest.ndc_index_writer")
+
+NAME_FIELDS = ("brand_name", "generic_name", "manufacturer")
+
+
+def _filled(rec: Dict[str, Any]) -> int:
+    return sum(1 for f in NAME_FIELDS if rec.get(f))
+
+
+def merge_index_records(current: Optional[Dict[str, Any]], candidate: Dict[str, Any]) -> Dict[str, Any]:
+    """Merge policy for one NDC listed by several SPL files.
+
+    The record with more populated name fields wins; ties go to the
+    lexicographically smallest spl_xml_source, so the result doesn't depend on
+    parse-worker completion order.
+    """
+    if current is None:
+        return candidate
+    cur, cand = _filled(current), _filled(candidate)
+    if cand != cur:
+        return candidate if cand > cur else current
+    return candidate if candidate.get("spl_xml_source", "") < current.get("spl_xml_source", "") else current
+
+
+class NDCIndexWriter:
+    """Single writer stage for the ndc_index build.
+
+    Records are deduplicated per NDC across the whole ingest (see
+    merge_index_records) and written once, at close(), through the repository's
+    BulkWriter path with NDC_INDEX_WRITE_BATCH_SIZE flushes, throttling at
+    NDC_INDEX_MAX_OPS_PER_SECOND and up to NDC_INDEX_WRITE_MAX_ATTEMPTS tries.
+    updated_at is stamped per flush batch, so the timestamps of one ingest grow
+    in commit order and an updated_at watermark taken mid-ingest only shares its
+    value with one batch (see ndc/search_index.py).
+    """
+
+    def __init__(self, repo: Optional[NDCIndexRepository] = None):
+        self.repo = repo or NDCIndexRepository()
+        self.pending: Dict[str, Dict[str, Any]] = {}
+        self.records_seen = 0
+
+    def add(self, record: Dict[str, Any], spl_xml_source: str) -> None:
+        self.records_seen += 1
+        ndc11 = record["ndc_digits"]
+        candidate = {**record, "source": "dailymed_bulk", "spl_xml_source": spl_xml_source}
+        self.pending[ndc11] = merge_index_records(self.pending.get(ndc11), candidate)
+
+    def items(self) -> List[Tuple[str, Dict[str, Any]]]:
+        """Merged docs in NDC order (a stable order lets a resumable job checkpoint an offset)."""
+        return [(ndc11, self.pending[ndc11]) for ndc11 in sorted(self.pending)]
+
+    def write(self, items: List[Tuple[str, Dict[str, Any]]]) -> Dict[str, Any]:
+        t0 = time.perf_counter()
+        stamped: List[Tuple[str, Dict[str, Any]]] = []
+        # Same chunking as upsert_many's flushes, which commit one after another.
+        for chunk in chunked(items, max(1, settings.NDC_INDEX_WRITE_BATCH_SIZE)):
+            now = datetime.now(timezone.utc).isoformat()
+            stamped.extend((ndc11, {**doc, "updated_at": now}) for ndc11, doc in chunk)
+        res = self.repo.upsert_many(
+            stamped,
+            flush_every=settings.NDC_INDEX_WRITE_BATCH_SIZE,
+            max_ops_per_second=settings.NDC_INDEX_MAX_OPS_PER_SECOND,
+            max_attempts=settings.NDC_INDEX_WRITE_MAX_ATTEMPTS,
+        )
+        elapsed = time.perf_counter() - t0
+        if res["failed"]:
+            log.warning("ndc_index writes failed", extra={"extra": {"failed": res["failed"], "sample": res["failed_ndcs"]}})
+        return {
+            "written": res["written"],
+            "failed": res["failed"],
+            "write_seconds": round(elapsed, 3),
+            "writes_per_second": round(res["written"] / elapsed, 1) if elapsed > 0 else None,
+        }
+
+    def close(self) -> Dict[str, Any]:
+        res = self.write(self.items())
+        stats = {
+            "records_seen": self.records_seen,
+            "unique_ndcs": len(self.pending),
+            "duplicates_merged": self.records_seen - len(self.pending),
+            **res,
+        }
+        log.info("ndc_index write stage done", extra={"extra": stats})
+        self.pending = {}
+        return stats
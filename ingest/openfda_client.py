@@ -1,10 +1,20 @@
 from __future__ import annotations
 
+import asyncio
+import logging
+import random
+
 import httpx
-from typing import Any, Dict, List, Tuple
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
 
 from config.settings import settings
 
+log = logging.getLogger("glitch.ingest.openfda")
+
+# Status codes worth retrying: openFDA throttles with 429 and occasionally
+# returns transient 5xx from behind its load balancer.
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
 
 def fetch_shortages_page(skip: int, limit: int) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
     params = {"limit": limit, "skip": skip}
@@ -19,3 +29,198 @@ def fetch_shortages_page(skip: int, limit: int) -> Tuple[List[Dict[str, Any]], D
     results = data.get("results") or []
     meta = data.get("meta") or {}
     return results, meta
+
+
+def probe_latest_shortage() -> Tuple[Optional[Dict[str, Any]], Dict[str, Any]]:
+    """One-record request for the most recently updated shortage (plus feed meta).
+
+    Used as a cheap "has anything changed" check before a full sweep.
+    """
+    params = {"limit": 1, "sort": "last_updated:desc"}
+    r = httpx.get(settings.OPENFDA_SHORTAGE_URL, params=params, timeout=30.0)
+    if r.status_code == 404:
+        return None, {"status": "eof_404"}
+    r.raise_for_status()
+    data = r.json()
+    results = data.get("results") or []
+    return (results[0] if results else None), (data.get("meta") or {})
+
+
+def _backoff_seconds(attempt: int, base: float, retry_after: Optional[str] = None) -> float:
+    # Honor Retry-After when openFDA sends one; otherwise exponential backoff with full jitter.
+    if retry_after:
+        try:
+            return max(0.0, float(retry_after))
+        except ValueError:
+            pass
+    return random.uniform(0, base * (2 ** attempt))
+
+
+async def fetch_shortages_page_async(
+    client: httpx.AsyncClient,
+    skip: int,
+    limit: int,
+    max_retries: Optional[int] = None,
+    backoff_base: Optional[float] = None,
+    search: Optional[str] = None,
+) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+    max_retries = settings.OPENFDA_MAX_RETRIES if max_retries is None else max_retries
+    backoff_base = settings.OPENFDA_BACKOFF_BASE_SECONDS if backoff_base is None else backoff_base
+    params: Dict[str, Any] = {"limit": limit, "skip": skip}
+    if search:
+        params["search"] = search
+
+    attempt = 0
+    while True:
+        try:
+            r = await client.get(settings.OPENFDA_SHORTAGE_URL, params=params)
+        except httpx.TransportError as e:
+            if attempt >= max_retries:
+                raise
+            delay = _backoff_seconds(attempt, backoff_base)
+            log.warning("openfda transport error; retrying", extra={"extra": {"skip": skip, "attempt": attempt, "error": str(e), "delay_s": round(delay, 3)}})
+        else:
+            # Same end-of-results contract as the sync client. A search that
+            # matches nothing is also a 404 from openFDA.
+            if r.status_code == 404:
+                return [], {"status": "eof_404", "skip": skip, "limit": limit}
+            if r.status_code not in RETRYABLE_STATUS or attempt >= max_retries:
+                r.raise_for_status()
+                data = r.json()
+                return data.get("results") or [], data.get("meta") or {}
+            delay = _backoff_seconds(attempt, backoff_base, r.headers.get("Retry-After"))
+            log.warning("openfda retryable status; retrying", extra={"extra": {"skip": skip, "attempt": attempt, "status_code": r.status_code, "delay_s": round(delay, 3)}})
+        attempt += 1
+        await asyncio.sleep(delay)
+
+
+def _meta_total(meta: Dict[str, Any]) -> Optional[int]:
+    total = (meta.get("results") or {}).get("total")
+    try:
+        return int(total) if total is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def new_async_client(concurrency: int) -> httpx.AsyncClient:
+    # One pooled client per sweep: keep-alive connections are reused across pages
+    # instead of paying a TLS handshake per request.
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    return httpx.AsyncClient(timeout=30.0, limits=limits)
+
+
+async def iter_shortage_pages_async(
+    limit: Optional[int] = None,
+    max_items: Optional[int] = None,
+    concurrency: Optional[int] = None,
+    queue_pages: Optional[int] = None,
+    search: Optional[str] = None,
+) -> AsyncIterator[Tuple[List[Dict[str, Any]], Dict[str, Any]]]:
+    """Yield openFDA pages as they arrive, fetched over one pooled connection set.
+
+    The first page tells us meta.results.total; the remaining skip offsets are then
+    fetched by `concurrency` workers. If openFDA omits the total, workers probe
+    forward until a short/empty page marks the end. Pages land in a bounded queue
+    (`queue_pages`), so a slow consumer stalls the fetchers instead of buffering
+    the whole feed. Pages may arrive out of skip order. `search` is passed
+    through as openFDA's search parameter (e.g. a last_updated range).
+    Fail-closed on MAX_SWEEP_ITEMS exactly like the serial sweep: with a
+    reported total the check happens before the first page is yielded; without
+    one, pages are held (at most MAX_SWEEP_ITEMS records) until the end of the
+    feed is known, so an oversized feed never yields a page either.
+    """
+    limit = limit or settings.OPENFDA_LIMIT
+    max_items = settings.MAX_SWEEP_ITEMS if max_items is None else max_items
+    concurrency = max(1, concurrency or settings.OPENFDA_CONCURRENCY)
+    queue_pages = max(1, queue_pages or settings.SWEEP_PIPELINE_QUEUE_PAGES)
+
+    async with new_async_client(concurrency) as client:
+        first, first_meta = await fetch_shortages_page_async(client, skip=0, limit=limit, search=search)
+        fetched = len(first)
+        if fetched >= max_items:
+            raise RuntimeError(f"max_sweep_items_exceeded: fetched={fetched} cap={max_items}")
+        if not first:
+            return
+
+        total = _meta_total(first_meta)
+        if total is not None and total >= max_items:
+            # Fail-closed before spending any more requests on an oversized feed.
+            raise RuntimeError(f"max_sweep_items_exceeded: reported_total={total} cap={max_items}")
+        # Unknown size: nothing is released before the whole feed is counted.
+        held: Optional[List[Tuple[List[Dict[str, Any]], Dict[str, Any]]]] = [(first, first_meta)] if total is None else None
+        if held is None:
+            yield first, first_meta
+
+        # Offsets are handed out from a shared cursor; `end` is the known (or
+        # discovered) end of the feed past which no more pages are requested.
+        cursor = {"next": limit, "end": total if total is not None else (len(first) if len(first) < limit else None)}
+        out: asyncio.Queue = asyncio.Queue(maxsize=queue_pages)
+        done = object()
+
+        async def _worker() -> None:
+            while True:
+                skip = cursor["next"]
+                if cursor["end"] is not None and skip >= cursor["end"]:
+                    return
+                cursor["next"] += limit
+                page, meta = await fetch_shortages_page_async(client, skip=skip, limit=limit, search=search)
+                if total is None and len(page) < limit:
+                    end = skip + len(page)
+                    cursor["end"] = end if cursor["end"] is None else min(cursor["end"], end)
+                if page:
+                    await out.put((page, meta))
+
+        async def _run_workers() -> None:
+            try:
+                await asyncio.gather(*(_worker() for _ in range(concurrency)))
+            except Exception as e:  # surface worker failures to the consumer
+                await out.put(e)
+                return
+            await out.put(done)
+
+        runner = asyncio.create_task(_run_workers())
+        try:
+            while True:
+                item = await out.get()
+                if item is done:
+                    break
+                if isinstance(item, BaseException):
+                    raise item
+                page, meta = item
+                fetched += len(page)
+                if fetched >= max_items:
+                    raise RuntimeError(f"max_sweep_items_exceeded: fetched={fetched} cap={max_items}")
+                if held is not None:
+                    held.append((page, meta))
+                    continue
+                yield page, meta
+            for page, meta in held or ():
+                yield page, meta
+        finally:
+            runner.cancel()
+            try:
+                await runner
+            except (asyncio.CancelledError, Exception):
+                pass
+
+
+async def fetch_all_shortages_async(
+    limit: Optional[int] = None,
+    max_items: Optional[int] = None,
+    concurrency: Optional[int] = None,
+) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+    """Materialize the full shortage feed (see iter_shortage_pages_async)."""
+    all_results: List[Dict[str, Any]] = []
+    meta_last: Dict[str, Any] = {}
+    pages = 0
+    async for page, meta in iter_shortage_pages_async(limit=limit, max_items=max_items, concurrency=concurrency):
+        pages += 1
+        meta_last = meta or meta_last
+        all_results.extend(page)
+    return all_results, {"meta": meta_last, "total_fetched": len(all_results), "pages": pages}
+
+
+def last_updated_search(since: str) -> str:
+    # Inclusive lower bound: records stamped on the high-water-mark day itself are
+    # re-fetched and then dropped by snapshot_hash, so same-day edits are not missed.
+    return f"last_updated:[{since} TO *]"
@@ -0,0 +1,98 @@
+from __future__ import annotations
+
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Optional
+
+from config.settings import settings
+from ingest.delta_engine import normalize_last_updated
+from ingest.openfda_client import probe_latest_shortage
+from ingest.shortage_sweeper import SWEEP_FULL, plan_sweep, sweep_and_upsert_streaming
+from repos.ingest_state_repo import IngestStateRepository
+
+log = logging.getLogger("glitch.ingest.poll_scheduler")
+
+# Scheduler hits /shortage_poll_run on a fixed cron (<= POLL_INTERVAL_FLOOR_SECONDS).
+# This stage decides whether that tick is worth a sweep:
+#   1) not due yet under the adaptive interval -> skip, no network
+#   2) limit=1 probe (newest last_updated + meta) unchanged since the last sweep -> skip
+#   3) otherwise sweep; the interval snaps to the floor when the sweep found changes
+#      and backs off toward the ceiling while the feed stays quiet.
+# Full reconciliation sweeps (see plan_sweep) are never skipped by the probe.
+
+DECISION_SWEPT = "swept"
+DECISION_NOT_DUE = "skipped_not_due"
+DECISION_UNCHANGED = "skipped_feed_unchanged"
+
+
+def next_interval(current: Optional[float], changed: bool) -> float:
+    floor = float(settings.POLL_INTERVAL_FLOOR_SECONDS)
+    ceiling = float(max(settings.POLL_INTERVAL_CEILING_SECONDS, floor))
+    if changed or not current:
+        return floor
+    return min(ceiling, max(floor, float(current) * settings.POLL_INTERVAL_BACKOFF_FACTOR))
+
+
+def is_due(state: Dict[str, Any], now: datetime) -> bool:
+    due = state.get("next_poll_due_at")
+    if not due:
+        return True
+    try:
+        return now >= datetime.fromisoformat(str(due))
+    except ValueError:
+        return True
+
+
+def feed_fingerprint(top: Optional[Dict[str, Any]], meta: Dict[str, Any]) -> str:
+    total = (meta.get("results") or {}).get("total")
+    top_lu = normalize_last_updated((top or {}).get("last_updated"))
+    return f"{meta.get('last_updated') or ''}|{top_lu}|{total if total is not None else ''}"
+
+
+def run_scheduled_poll(mode: str, force: bool = False) -> Dict[str, Any]:
+    state_repo = IngestStateRepository()
+    state = state_repo.get_state()
+    now = datetime.now(timezone.utc)
+    interval = state.get("poll_interval_seconds")
+
+    def _record(decision: str, new_interval: float, extra: Dict[str, Any]) -> None:
+        data = {
+            "last_poll_decision": decision,
+            "last_poll_decision_at": now.isoformat(),
+            "poll_interval_seconds": new_interval,
+            **extra,
+        }
+        state_repo.record_poll_decision(data, skipped=decision != DECISION_SWEPT)
+
+    may_skip = (
+        settings.POLL_PROBE_ENABLED
+        and mode == "delta"
+        and not force
+        and plan_sweep(mode, state, now=now)[0] != SWEEP_FULL  # reconciliation sweeps always run
+    )
+    if may_skip and not is_due(state, now):
+        current = interval or next_interval(None, changed=False)
+        _record(DECISION_NOT_DUE, current, {})
+        log.info("poll skipped", extra={"extra": {"decision": DECISION_NOT_DUE, "next_poll_due_at": state.get("next_poll_due_at")}})
+        return {"ok": True, "mode": mode, "decision": DECISION_NOT_DUE, "poll_interval_seconds": current}
+
+    # Probe before sweeping so a change landing mid-sweep is seen again next tick.
+    fingerprint = None
+    if settings.POLL_PROBE_ENABLED:
+        top, probe_meta = probe_latest_shortage()
+        fingerprint = feed_fingerprint(top, probe_meta)
+        if may_skip and fingerprint == state.get("last_probe_fingerprint"):
+            new_interval = next_interval(interval, changed=False)
+            _record(DECISION_UNCHANGED, new_interval, {"next_poll_due_at": (now + timedelta(seconds=new_interval)).isoformat()})
+            log.info("poll skipped", extra={"extra": {"decision": DECISION_UNCHANGED, "poll_interval_seconds": new_interval}})
+            return {"ok": True, "mode": mode, "decision": DECISION_UNCHANGED, "poll_interval_seconds": new_interval}
+
+    meta, result = sweep_and_upsert_streaming(mode=mode)
+
+    new_interval = next_interval(interval, changed=bool(result.get("changed")))
+    extra: Dict[str, Any] = {"next_poll_due_at": (now + timedelta(seconds=new_interval)).isoformat()}
+    # Only remember the fingerprint once the sweep succeeded, so a failed run is retried.
+    if fingerprint is not None and result.get("ok"):
+        extra["last_probe_fingerprint"] = fingerprint
+    _record(DECISION_SWEPT, new_interval, extra)
+    return {"ok": True, "mode": mode, "decision": DECISION_SWEPT, "poll_interval_seconds": new_interval, "meta": meta, "result": result}
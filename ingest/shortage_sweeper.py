@@ -1,153 +1,375 @@
 from __future__ import annotations
 
+import asyncio
 import logging
+import time
 from datetime import datetime, timezone
 from typing import Any, Dict, List, Optional, Tuple
 
 from config.settings import settings
-from ingest.openfda_client import fetch_shortages_page
-from ingest.delta_engine import snapshot_hash
+from ingest.openfda_client import fetch_all_shortages_async, iter_shortage_pages_async, last_updated_search
+from ingest.delta_engine import normalize_last_updated, snapshot_hash
+from ingest.hash_index import ShortageHashIndex, load_hash_index, save_hash_index
 from ndc.resolver import NDCResolver
-from ndc.normalizer import normalize_ndc_to_11
+from ndc.normalizer import normalize_many
 from repos.ingest_state_repo import IngestStateRepository
 from repos.shortage_repo import ShortageRepository
-from repos.ndc_watchers_repo import NDCWatchersRepository
-from repos.user_repo import UserRepository
-from repos.subscription_repo import SubscriptionRepository
-from repos.rate_limit_repo import RateLimitRepository, utc_day_key
-from alerts.dispatch import AlertDispatcher
+from alerts.fanout import AlertFanout
+from utils.batching import chunked
 
 log = logging.getLogger("glitch.ingest.sweeper")
 
 
 def sweep_all_shortages() -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
-    limit = settings.OPENFDA_LIMIT
-    max_items = settings.MAX_SWEEP_ITEMS
-    all_results: List[Dict[str, Any]] = []
-    skip = 0
-    meta_last = {}
-
-    while True:
-        page, meta = fetch_shortages_page(skip=skip, limit=limit)
-        meta_last = meta
-        if not page:
-            break
-        all_results.extend(page)
-        if len(all_results) >= max_items:
-            # Fail-closed
-            raise RuntimeError(f"max_sweep_items_exceeded: fetched={len(all_results)} cap={max_items}")
-        skip += limit
-
-    return all_results, {"meta": meta_last, "total_fetched": len(all_results)}
+    # Pages are fetched concurrently over a shared connection pool; see
+    # fetch_all_shortages_async for pagination, retry and fail-closed rules.
+    return asyncio.run(fetch_all_shortages_async(
+        limit=settings.OPENFDA_LIMIT,
+        max_items=settings.MAX_SWEEP_ITEMS,
+        concurrency=settings.OPENFDA_CONCURRENCY,
+    ))
+
+
+SWEEP_FULL = "full"
+SWEEP_INCREMENTAL = "incremental"
+
+PreparedRecord = Tuple[str, Dict[str, Any], str]  # (ndc11, raw openFDA record, snapshot_hash)
+
+
+class ShortageSweepProcessor:
+    """Diff/upsert/fan-out for one sweep, fed page by page.
+
+    Used both by the materialized path (upsert_and_detect_changes) and the
+    streaming pipeline, so baseline/delta semantics live in one place.
+    """
+
+    def __init__(
+        self,
+        mode: str,
+        state_repo: Optional[IngestStateRepository] = None,
+        shortage_repo: Optional[ShortageRepository] = None,
+        resolver: Optional[NDCResolver] = None,
+        skip_unchanged: Optional[bool] = None,
+        sweep_kind: str = SWEEP_FULL,
+    ):
+        self.mode = mode
+        self.sweep_kind = sweep_kind
+        self.state_repo = state_repo or IngestStateRepository()
+        self.shortage_repo = shortage_repo or ShortageRepository()
+        self.resolver = resolver or NDCResolver()
+        self.started_at = datetime.now(timezone.utc).isoformat()
+        self.started_epoch = time.time()  # available_at of this sweep's alerts (see AlertFanout.enqueue)
+        self.processed = 0
+        self.changed = 0
+        self.unchanged_skipped = 0
+        self.skip_unchanged = settings.SWEEP_SKIP_UNCHANGED if skip_unchanged is None else skip_unchanged
+        self.hash_index: Optional[ShortageHashIndex] = None
+        self.max_last_updated = ""
+        # Full sweeps remember every NDC seen so feed removals can be detected.
+        self.seen_ndcs: Optional[set] = set() if sweep_kind == SWEEP_FULL else None
+        # Firestore document/RPC counts for the sweep metrics doc.
+        self.ops: Dict[str, int] = {
+            "shortage_reads": 0,
+            "shortage_read_rpcs": 0,
+            "shortage_writes": 0,
+            "shortage_write_rpcs": 0,
+            "name_resolutions": 0,
+        }
+        self.alerts_enqueued = 0
+        # Summed AlertFanout.enqueue stats (watchers read / ineligible / new outbox items).
+        self.alert_fanout: Dict[str, int] = {"pages": 0, "processed": 0, "skipped": 0, "enqueued": 0}
+        self._fanout: Optional[AlertFanout] = None
+
+    def baseline_ready(self) -> bool:
+        state = self.state_repo.get_state()
+        return bool(state.get("baseline_completed", False))
+
+    @staticmethod
+    def prepare(records: List[Dict[str, Any]]) -> List[PreparedRecord]:
+        # Pure CPU: normalize NDC keys and hash the change-relevant fields.
+        out: List[PreparedRecord] = []
+        keys = normalize_many(r.get("package_ndc") or r.get("package_ndc11") or r.get("ndc") or "" for r in records)
+        for ndc11, r in zip(keys, records):
+            if not ndc11:
+                continue
+            out.append((ndc11, r, snapshot_hash(r)))
+        return out
+
+    def process(self, prepared: List[PreparedRecord]) -> None:
+        for ndc11, r, _ in prepared:
+            lu = normalize_last_updated(r.get("last_updated"))
+            if lu > self.max_last_updated:
+                self.max_last_updated = lu
+            if self.seen_ndcs is not None:
+                self.seen_ndcs.add(ndc11)
+        for chunk in chunked(prepared, settings.SWEEP_BATCH_SIZE):
+            self._process_chunk(chunk)
+
+    def _load_hash_index(self) -> Optional[ShortageHashIndex]:
+        if self.skip_unchanged and self.hash_index is None:
+            self.hash_index = load_hash_index(self.shortage_repo)
+        return self.hash_index
+
+    def _process_chunk(self, chunk: List[PreparedRecord]) -> None:
+        idx = self._load_hash_index()
+        if idx is None:
+            # Full mode: one batched read for the chunk's current docs.
+            to_read = {ndc11 for ndc11, _, _ in chunk}
+        else:
+            # Records whose hash matches the index cost nothing. A repeated NDC in
+            # the chunk compares against the record before it, not the index.
+            pending: List[PreparedRecord] = []
+            chunk_hashes: Dict[str, Optional[str]] = {}
+            for ndc11, r, new_hash in chunk:
+                current = chunk_hashes[ndc11] if ndc11 in chunk_hashes else idx.get(ndc11)
+                chunk_hashes[ndc11] = new_hash
+                if current == new_hash:
+                    self.processed += 1
+                    self.unchanged_skipped += 1
+                    continue
+                pending.append((ndc11, r, new_hash))
+            chunk = pending
+            if not chunk:
+                return
+            # Only delta fan-out needs the previous doc (old_status). An index miss
+            # is not proof the NDC is new (the index can be older than the docs),
+            # so every NDC that reaches here is read.
+            to_read = {ndc11 for ndc11, _, _ in chunk} if self.mode == "delta" else set()
+
+        stored = self.shortage_repo.get_many(to_read) if to_read else {}
+        if to_read:
+            self.ops["shortage_reads"] += len(to_read)
+            self.ops["shortage_read_rpcs"] += 1
+
+        # Naming for the whole chunk: override + index lookups batched (and cached) in the resolver.
+        names = self.resolver.resolve_many([ndc11 for ndc11, _, _ in chunk], [r for _, r, _ in chunk])
+        self.ops["name_resolutions"] += len(chunk)
+
+        writes: Dict[str, Dict[str, Any]] = {}
+        changes: List[Tuple[str, Optional[Dict[str, Any]], Dict[str, Any]]] = []
+        for (ndc11, r, new_hash), resolved in zip(chunk, names):
+            # A later record for the same NDC in this chunk diffs against the earlier one.
+            existing = writes.get(ndc11) or stored.get(ndc11)
+            existing_hash = (existing or {}).get("snapshot_hash")
+            is_changed = (existing_hash is None) or (existing_hash != new_hash)
+
+            # Normalize stored shortage doc
+            doc = {
+                "ndc_digits": ndc11,
+                "status": r.get("status") or "",
+                "last_updated": r.get("last_updated") or "",
+                "shortage_start_date": r.get("shortage_start_date") or "",
+                "shortage_end_date": r.get("shortage_end_date") or "",
+                "presentation": r.get("presentation") or "",
+                "reason": r.get("reason") or "",
+                "resolution": r.get("resolution") or "",
+                "brand_name": resolved.get("brand_name") or "",
+                "generic_name": resolved.get("generic_name") or "",
+                "manufacturer": resolved.get("manufacturer") or "",
+                "source": "openfda",
+                "snapshot_hash": new_hash,
+                "updated_at": datetime.now(timezone.utc).isoformat(),
+            }
+            writes[ndc11] = doc
+            self.processed += 1
+            if is_changed:
+                self.changed += 1
+                changes.append((ndc11, existing, doc))
+
+        # Delta runs enqueue alerts (delivery is the outbox worker's job) before the
+        # new state is written: if the write never lands, the next sweep detects
+        # the change again and the outbox ignores the repeated (user, ndc, hash).
+        if self.mode == "delta":
+            for ndc11, existing, doc in changes:
+                self._fan_out(ndc11, existing, doc)
+
+        self.ops["shortage_write_rpcs"] += self.shortage_repo.upsert_many(writes.items())
+        self.ops["shortage_writes"] += len(writes)
+        if idx is not None:
+            idx.update((ndc11, doc["snapshot_hash"]) for ndc11, doc in writes.items())
+
+    def _fan_out(self, ndc11: str, existing: Optional[Dict[str, Any]], doc: Dict[str, Any]) -> None:
+        if self._fanout is None:
+            self._fanout = AlertFanout()
+        stats = self._fanout.enqueue(ndc11, existing, doc, now=self.started_epoch)
+        for k, v in stats.items():
+            self.alert_fanout[k] = self.alert_fanout.get(k, 0) + v
+        self.alerts_enqueued += stats["enqueued"]
+
+    def _resolver_cache_stats(self) -> Optional[Dict[str, Any]]:
+        # Cumulative per process (the cache outlives a sweep); null when caching is off.
+        stats = getattr(self.resolver, "cache_stats", None)
+        return stats() if stats else None
+
+    def finish(self, extra_metrics: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        missing_from_feed = None
+        if self.hash_index is not None:
+            if self.seen_ndcs is not None:
+                # Stored NDCs absent from a full feed: deleted upstream (reported, not purged).
+                missing_from_feed = sum(1 for n in self.hash_index.hashes if n not in self.seen_ndcs)
+            save_hash_index(self.hash_index)
+
+        now = datetime.now(timezone.utc).isoformat()
+        prev_hwm = str(self.state_repo.get_state().get("last_updated_hwm") or "")
+        hwm = max(prev_hwm, self.max_last_updated)
+        if hwm and (hwm != prev_hwm or self.sweep_kind == SWEEP_FULL):
+            self.state_repo.update_delta_cursor(hwm, full_sweep_at=now if self.sweep_kind == SWEEP_FULL else None)
+        if self.mode == "baseline":
+            self.state_repo.set_baseline_completed()
+
+        self.state_repo.update_sweep_metrics({
+            "last_sweep_started_at": self.started_at,
+            "last_sweep_mode": self.mode,
+            "last_sweep_kind": self.sweep_kind,
+            "last_sweep_missing_from_feed": missing_from_feed,
+            "last_sweep_total_processed": self.processed,
+            "last_sweep_changed": self.changed,
+            "last_sweep_completed_at": now,
+            "last_sweep_unchanged_skipped": self.unchanged_skipped,
+            "last_sweep_firestore_ops": dict(self.ops),
+            "last_sweep_resolver_cache": self._resolver_cache_stats(),
+            "last_sweep_alerts_enqueued": self.alerts_enqueued,
+            "last_sweep_alert_fanout": dict(self.alert_fanout),
+            **(extra_metrics or {}),
+        })
+
+        # Report real baseline state (not just whether this run was "baseline")
+        baseline_completed_out = self.baseline_ready()
+        return {"ok": True, "processed": self.processed, "changed": self.changed, "sweep_kind": self.sweep_kind, "unchanged_skipped": self.unchanged_skipped, "alerts_enqueued": self.alerts_enqueued, "baseline_completed": baseline_completed_out, "firestore_ops": dict(self.ops)}
+
+
+def _baseline_not_completed() -> Dict[str, Any]:
+    # Fail-closed: do not alert, do not process as delta before baseline
+    return {"ok": False, "error": "baseline_not_completed", "processed": 0, "changed": 0}
 
 
 def upsert_and_detect_changes(records: List[Dict[str, Any]], mode: str) -> Dict[str, Any]:
-    state_repo = IngestStateRepository()
-    shortage_repo = ShortageRepository()
-    resolver = NDCResolver()
+    proc = ShortageSweepProcessor(mode)
+    if mode == "delta" and not proc.baseline_ready():
+        return _baseline_not_completed()
+
+    proc.process(proc.prepare(records))
+    return proc.finish()
+
+
+def plan_sweep(mode: str, state: Dict[str, Any], now: Optional[datetime] = None) -> Tuple[str, Optional[str]]:
+    """Pick full vs incremental for this run; returns (sweep_kind, openFDA search or None).
+
+    Incremental (last_updated >= high-water mark) is only used for delta runs that
+    have a mark and a full reconciliation sweep within FULL_RECONCILE_INTERVAL_HOURS;
+    the periodic full sweep catches removals and edits made without a new timestamp.
+    """
+    hwm = str(state.get("last_updated_hwm") or "")
+    if mode != "delta" or not settings.SWEEP_INCREMENTAL_ENABLED or not hwm:
+        return SWEEP_FULL, None
+    last_full = state.get("last_full_sweep_at")
+    if not last_full:
+        return SWEEP_FULL, None
+    try:
+        last_full_dt = datetime.fromisoformat(str(last_full))
+    except ValueError:
+        return SWEEP_FULL, None
+    now = now or datetime.now(timezone.utc)
+    if (now - last_full_dt).total_seconds() >= settings.FULL_RECONCILE_INTERVAL_HOURS * 3600:
+        return SWEEP_FULL, None
+    return SWEEP_INCREMENTAL, last_updated_search(hwm)
+
 
+async def _streaming_sweep_async(proc: ShortageSweepProcessor, search: Optional[str] = None) -> Tuple[Dict[str, Any], Dict[str, int]]:
+    """fetch -> normalize/hash -> diff/upsert, one page at a time.
+
+    Stages are connected by bounded queues so the network keeps fetching while
+    Firestore work runs in a worker thread, but never more than
+    SWEEP_PIPELINE_QUEUE_PAGES pages are held between stages. When a stage
+    fails the others are cancelled and awaited, and a page already handed to
+    the worker thread is allowed to finish, so nothing writes after this returns.
+    """
+    qsize = max(1, settings.SWEEP_PIPELINE_QUEUE_PAGES)
+    raw_q: asyncio.Queue = asyncio.Queue(maxsize=qsize)
+    prepared_q: asyncio.Queue = asyncio.Queue(maxsize=qsize)
+    done = object()
+    timings = {"fetch": 0.0, "normalize": 0.0, "upsert": 0.0}
+    fetch_meta: Dict[str, Any] = {"meta": {}, "total_fetched": 0, "pages": 0}
+
+    async def _fetch_stage() -> None:
+        t = time.perf_counter()
+        pages = iter_shortage_pages_async(
+            limit=settings.OPENFDA_LIMIT,
+            max_items=settings.MAX_SWEEP_ITEMS,
+            concurrency=settings.OPENFDA_CONCURRENCY,
+            queue_pages=qsize,
+            search=search,
+        )
+        async for page, meta in pages:
+            timings["fetch"] += time.perf_counter() - t
+            fetch_meta["pages"] += 1
+            fetch_meta["total_fetched"] += len(page)
+            fetch_meta["meta"] = meta or fetch_meta["meta"]
+            await raw_q.put(page)
+            t = time.perf_counter()
+        timings["fetch"] += time.perf_counter() - t
+        await raw_q.put(done)
+
+    async def _normalize_stage() -> None:
+        while (page := await raw_q.get()) is not done:
+            t = time.perf_counter()
+            prepared = proc.prepare(page)
+            timings["normalize"] += time.perf_counter() - t
+            await prepared_q.put(prepared)
+        await prepared_q.put(done)
+
+    async def _upsert_stage() -> None:
+        while (prepared := await prepared_q.get()) is not done:
+            t = time.perf_counter()
+            fut = asyncio.ensure_future(asyncio.to_thread(proc.process, prepared))
+            try:
+                await asyncio.shield(fut)
+            except asyncio.CancelledError:
+                # The thread cannot be interrupted: let the in-flight page finish before unwinding.
+                await asyncio.gather(fut, return_exceptions=True)
+                raise
+            timings["upsert"] += time.perf_counter() - t
+
+    t0 = time.perf_counter()
+    tasks = [asyncio.create_task(c) for c in (_fetch_stage(), _normalize_stage(), _upsert_stage())]
+    try:
+        # Any stage failing (e.g. max_sweep_items_exceeded) aborts the others.
+        await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+    stage_ms = {k: int(v * 1000) for k, v in timings.items()}
+    stage_ms["total"] = int((time.perf_counter() - t0) * 1000)
+    return fetch_meta, stage_ms
+
+
+def sweep_and_upsert_streaming(mode: str) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """Streaming equivalent of sweep_all_shortages() + upsert_and_detect_changes().
+
+    Each page is normalized, hashed, diffed and upserted as soon as it arrives
+    instead of materializing the whole feed first. MAX_SWEEP_ITEMS stays
+    fail-closed: the feed is counted (reported total, or every page held when
+    openFDA omits it) before any page is processed. Any failure mid-stream
+    (openFDA or Firestore errors) leaves the pages processed so far written and
+    their alerts enqueued, but aborts before finish(), so the high-water mark,
+    baseline flag and metrics are not advanced and the next run covers the same
+    range again (repeats are dropped by snapshot_hash and the outbox item id). Delta runs fetch only records at or past the last_updated
+    high-water mark unless a full reconciliation is due (see plan_sweep).
+    Returns (fetch meta, result) like the two-step path.
+    """
+    state_repo = IngestStateRepository()
     state = state_repo.get_state()
-    baseline_completed = bool(state.get("baseline_completed", False))
-
-    if mode == "delta" and not baseline_completed:
-        # Fail-closed: do not alert, do not process as delta before baseline
-        return {"ok": False, "error": "baseline_not_completed", "processed": 0, "changed": 0}
-
-    changed = 0
-    processed = 0
-
-    for r in records:
-        package_ndc = r.get("package_ndc") or r.get("package_ndc11") or r.get("ndc") or ""
-        ndc11 = normalize_ndc_to_11(package_ndc)
-        if not ndc11:
-            continue
-
-        existing = shortage_repo.get(ndc11)
-        existing_hash = (existing or {}).get("snapshot_hash")
-
-        new_hash = snapshot_hash(r)
-        is_changed = (existing_hash is None) or (existing_hash != new_hash)
-
-        # Resolve naming
-        resolved = resolver.resolve_with_fallback(ndc11, fallback=r)
-
-        # Normalize stored shortage doc
-        doc = {
-            "ndc_digits": ndc11,
-            "status": r.get("status") or "",
-            "last_updated": r.get("last_updated") or "",
-            "shortage_start_date": r.get("shortage_start_date") or "",
-            "shortage_end_date": r.get("shortage_end_date") or "",
-            "presentation": r.get("presentation") or "",
-            "reason": r.get("reason") or "",
-            "resolution": r.get("resolution") or "",
-            "brand_name": resolved.get("brand_name") or "",
-            "generic_name": resolved.get("generic_name") or "",
-            "manufacturer": resolved.get("manufacturer") or "",
-            "source": "openfda",
-            "snapshot_hash": new_hash,
-            "updated_at": datetime.now(timezone.utc).isoformat(),
-        }
+    if mode == "delta" and not state.get("baseline_completed", False):
+        return {"meta": {}, "total_fetched": 0}, _baseline_not_completed()
 
-        shortage_repo.upsert(ndc11, doc)
-        processed += 1
-        if is_changed:
-            changed += 1
-
-            # Fan out alerts only during delta runs.
-            if mode == "delta":
-                watchers_repo = NDCWatchersRepository()
-                users_repo = UserRepository()
-                subs_repo = SubscriptionRepository()
-                rate_repo = RateLimitRepository()
-                alert_dispatcher = AlertDispatcher()
-
-                old_status = (existing or {}).get("status") if existing else None
-                new_status = doc.get("status")
-
-                for watcher_user_id in watchers_repo.iter_watchers(ndc11):
-                    # Entitlement + activation checks (fail-closed)
-                    sub = subs_repo.get_by_user(watcher_user_id) or {}
-                    if settings.PAYMENTS_ENABLED and sub.get("status") != "active":
-                        continue
-                    user = users_repo.get(watcher_user_id) or {}
-                    if not user.get("activated_at"):
-                        continue
-
-                    chat_id = user.get("telegram_chat_id")
-                    if not chat_id:
-                        continue
-
-                    # Rate limit reservation (transactional)
-                    day_key = utc_day_key()
-                    tx = rate_repo.db.transaction()
-                    ok, reason = rate_repo.reserve_quota(tx, watcher_user_id, ndc11, day_key, settings.MAX_ALERTS_PER_DAY, settings.MAX_ALERTS_PER_NDC_PER_DAY)
-                    if not ok:
-                        log.info("rate_limit_skip", extra={"extra": {"user_id": watcher_user_id, "ndc": ndc11, "reason": reason}})
-                        continue
-
-                    payload = {
-                        "ndc_digits": ndc11,
-                        "brand_name": doc.get("brand_name"),
-                        "generic_name": doc.get("generic_name"),
-                        "manufacturer": doc.get("manufacturer"),
-                        "old_status": old_status,
-                        "new_status": new_status,
-                        "last_updated": doc.get("last_updated"),
-                    }
-                    alert_dispatcher.dispatch_telegram(watcher_user_id, chat_id, payload)
-
-    if mode == "baseline":
-        state_repo.set_baseline_completed()
-
-    state_repo.update_sweep_metrics({
-        "last_sweep_started_at": datetime.now(timezone.utc).isoformat(),
-        "last_sweep_mode": mode,
-        "last_sweep_total_processed": processed,
-        "last_sweep_changed": changed,
-        "last_sweep_completed_at": datetime.now(timezone.utc).isoformat(),
+    sweep_kind, search = plan_sweep(mode, state)
+    proc = ShortageSweepProcessor(mode, state_repo=state_repo, sweep_kind=sweep_kind)
+    meta, stage_ms = asyncio.run(_streaming_sweep_async(proc, search=search))
+    meta["search"] = search
+    result = proc.finish({
+        "last_sweep_pages": meta.get("pages", 0),
+        "last_sweep_stage_timings_ms": stage_ms,
     })
-
-    # Report real baseline state (not just whether this run was "baseline")
-    baseline_completed_out = bool(state_repo.get_state().get("baseline_completed", False))
-    return {"ok": True, "processed": processed, "changed": changed, "baseline_completed": baseline_completed_out}
+    result["stage_timings_ms"] = stage_ms
+    return meta, result
@@ -0,0 +1,111 @@
+from __future__ import annotations
+
+import io
+import zipfile
+from typing import IO, Any, Dict, List, Tuple, Union
+from xml.etree import ElementTree as ET
+
+from ndc.normalizer import normalize_ndc_to_11
+
+# SPL → ndc_index records. Kept free of GCS/Firestore imports: this module is
+# what DailyMed parse worker processes load.
+#
+# Single streaming pass (iterparse) over the SPL, reading only the elements we
+# need and clearing everything behind us:
+#   document/author/assignedEntity/representedOrganization/name   → manufacturer (labeler)
+#   .../manufacturedProduct/manufacturedProduct/name               → brand_name
+#   .../asEntityWithGeneric/genericMedicine/name                   → generic_name
+#   .../containerPackagedProduct/code[@codeSystem=NDC]             → package NDC
+# Package codes nested inside kit parts are attributed to the enclosing product.
+
+NDC_CODE_SYSTEM = "2.16.840.1.113883.6.69"
+
+SplRecord = Dict[str, str]
+
+
+def _local(tag: Any) -> str:
+    tag = tag if isinstance(tag, str) else ""
+    return tag.rsplit("}", 1)[-1]
+
+
+def _text(elem: ET.Element) -> str:
+    return " ".join("".join(elem.itertext()).split())
+
+
+def extract_spl_records(source: Union[bytes, IO[bytes]]) -> List[SplRecord]:
+    """Return one record per package NDC: ndc_digits, brand_name, generic_name, manufacturer.
+
+    `source` may be the XML bytes or a binary file object (e.g. an open zip member,
+    which keeps the whole document out of memory). Malformed XML yields [].
+    """
+    if isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+
+    path: List[str] = []
+    open_products: List[Dict[str, Any]] = []
+    done_products: List[Dict[str, Any]] = []
+    manufacturer = ""
+    open_names = 0  # inside <name>: keep children (e.g. <suffix>) until the name's own end event
+
+    try:
+        for event, elem in ET.iterparse(source, events=("start", "end")):
+            tag = _local(elem.tag)
+            if event == "start":
+                path.append(tag)
+                if tag == "name":
+                    open_names += 1
+                parent = path[-2] if len(path) >= 2 else ""
+                if tag == "manufacturedProduct" and parent == "manufacturedProduct":
+                    open_products.append({"brand_name": "", "generic_name": "", "codes": []})
+                elif tag == "code" and parent == "containerPackagedProduct" and open_products \
+                        and elem.get("codeSystem") == NDC_CODE_SYSTEM and elem.get("code"):
+                    open_products[-1]["codes"].append(elem.get("code"))
+                continue
+
+            parent = path[-2] if len(path) >= 2 else ""
+            if tag == "name":
+                open_names -= 1
+                if parent == "manufacturedProduct" and open_products and not open_products[-1]["brand_name"]:
+                    open_products[-1]["brand_name"] = _text(elem)
+                elif parent == "genericMedicine" and open_products and not open_products[-1]["generic_name"]:
+                    open_products[-1]["generic_name"] = _text(elem)
+                elif parent == "representedOrganization" and not manufacturer and "author" in path:
+                    manufacturer = _text(elem)
+            elif tag == "manufacturedProduct" and parent == "manufacturedProduct" and open_products:
+                done_products.append(open_products.pop())
+            path.pop()
+            if not open_names:
+                elem.clear()
+    except ET.ParseError:
+        return []
+
+    records: Dict[str, SplRecord] = {}
+    for product in done_products:
+        for code in product["codes"]:
+            ndc11 = normalize_ndc_to_11(code)
+            if ndc11 and ndc11 not in records:
+                records[ndc11] = {
+                    "ndc_digits": ndc11,
+                    "brand_name": product["brand_name"],
+                    "generic_name": product["generic_name"],
+                    "manufacturer": manufacturer,
+                }
+    return list(records.values())
+
+
+def extract_ndcs_from_spl_xml(xml_bytes: bytes) -> List[str]:
+    return [r["ndc_digits"] for r in extract_spl_records(xml_bytes)]
+
+
+def extract_zip_members(zip_path: str, names: List[str]) -> List[Tuple[str, List[SplRecord]]]:
+    """Parse a batch of archive members. Runs in a worker process.
+
+    The worker opens the archive itself and streams each member into the parser,
+    so only member names and extracted records cross the process boundary.
+    """
+    out: List[Tuple[str, List[SplRecord]]] = []
+    with zipfile.ZipFile(zip_path) as z:
+        for name in names:
+            with z.open(name) as f:
+                out.append((name, extract_spl_records(f)))
+    return out
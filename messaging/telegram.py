@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 import logging
+import threading
 from typing import Any, Dict, Optional
 
 import httpx
@@ -9,6 +10,19 @@ from config.settings import settings
 
 log = logging.getLogger("glitch.telegram")
 
+# One keep-alive pool per process for one-off sends (welcome message, weekly
+# recap); bulk alert delivery goes through messaging/telegram_engine.py.
+_http: Optional[httpx.Client] = None
+_http_lock = threading.Lock()
+
+
+def _http_client() -> httpx.Client:
+    global _http
+    with _http_lock:
+        if _http is None:
+            _http = httpx.Client(timeout=settings.TELEGRAM_TIMEOUT_SECONDS)
+        return _http
+
 
 class TelegramClient:
     def __init__(self, token: Optional[str] = None):
@@ -19,7 +33,7 @@ class TelegramClient:
     def send_message(self, chat_id: str, text: str, parse_mode: str = "HTML") -> Dict[str, Any]:
         url = f"https://api.telegram.org/bot{self.token}/sendMessage"
         payload = {"chat_id": chat_id, "text": text, "parse_mode": parse_mode, "disable_web_page_preview": True}
-        r = httpx.post(url, json=payload, timeout=20.0)
+        r = _http_client().post(url, json=payload)
         try:
             data = r.json()
         except Exception:
@@ -0,0 +1,164 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import httpx
+
+from config.settings import settings
+
+log = logging.getLogger("glitch.telegram.engine")
+
+# Async bulk delivery for Telegram (used by the alert outbox worker).
+#
+# One httpx.AsyncClient (keep-alive pool) for the whole drain, and two kinds of
+# token bucket in front of every sendMessage:
+#   global    TELEGRAM_GLOBAL_RATE_PER_SECOND (Telegram: ~30 msg/s per bot)
+#   per chat  TELEGRAM_PER_CHAT_RATE_PER_SECOND (Telegram: ~1 msg/s per chat)
+# A 429 blocks the chat's bucket for retry_after and briefly pauses the global
+# one. Short waits are retried inline; a longer retry_after is handed back to
+# the caller (the outbox reschedules the item).
+
+
+class TokenBucket:
+    """Reservation-style bucket: reserve() takes a token now and returns how long to wait for it.
+
+    Tokens may go negative, so concurrent callers queue up behind each other
+    without a lock (all callers run on one event loop).
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None, clock: Callable[[], float] = time.monotonic):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._clock = clock
+        self.tokens = self.capacity
+        self.updated = clock()
+        self.blocked_until = 0.0
+
+    def reserve(self) -> float:
+        now = self._clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1
+        wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+        return max(wait, self.blocked_until - now)
+
+    def block(self, seconds: float) -> None:
+        self.blocked_until = max(self.blocked_until, self._clock() + seconds)
+
+    def idle(self) -> bool:
+        now = self._clock()
+        return now >= self.blocked_until and self.tokens + (now - self.updated) * self.rate >= self.capacity
+
+
+def _retry_after(data: Dict[str, Any]) -> Optional[float]:
+    value = (data.get("parameters") or {}).get("retry_after")
+    return float(value) if value else None
+
+
+class TelegramDeliveryEngine:
+    """Rate-aware concurrent sendMessage. Use as `async with TelegramDeliveryEngine() as engine`."""
+
+    MAX_IDLE_BUCKETS = 10000
+
+    def __init__(
+        self,
+        token: Optional[str] = None,
+        client: Optional[httpx.AsyncClient] = None,
+        base_url: str = "https://api.telegram.org",
+        global_rate: Optional[float] = None,
+        per_chat_rate: Optional[float] = None,
+        max_concurrency: Optional[int] = None,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], Any] = asyncio.sleep,
+    ):
+        self.token = token or settings.TELEGRAM_BOT_TOKEN
+        if not self.token:
+            raise RuntimeError("TELEGRAM_BOT_TOKEN not configured")
+        self.url = f"{base_url}/bot{self.token}/sendMessage"
+        self.max_concurrency = max_concurrency or settings.TELEGRAM_MAX_CONCURRENCY
+        self._client = client
+        self._owns_client = client is None
+        self._clock = clock
+        self._sleep = sleep
+        self.per_chat_rate = per_chat_rate or settings.TELEGRAM_PER_CHAT_RATE_PER_SECOND
+        self.global_bucket = TokenBucket(global_rate or settings.TELEGRAM_GLOBAL_RATE_PER_SECOND, clock=clock)
+        self.chat_buckets: Dict[str, TokenBucket] = {}
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self.stats = {"sent": 0, "failed": 0, "throttled_429": 0, "retries": 0}
+
+    async def __aenter__(self) -> "TelegramDeliveryEngine":
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=settings.TELEGRAM_TIMEOUT_SECONDS,
+                limits=httpx.Limits(max_connections=self.max_concurrency, max_keepalive_connections=self.max_concurrency),
+            )
+        return self
+
+    async def __aexit__(self, *exc: Any) -> None:
+        if self._owns_client and self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def _chat_bucket(self, chat_id: str) -> TokenBucket:
+        bucket = self.chat_buckets.get(chat_id)
+        if bucket is None:
+            if len(self.chat_buckets) >= self.MAX_IDLE_BUCKETS:
+                self.chat_buckets = {k: b for k, b in self.chat_buckets.items() if not b.idle()}
+            bucket = self.chat_buckets[chat_id] = TokenBucket(self.per_chat_rate, capacity=1.0, clock=self._clock)
+        return bucket
+
+    async def _wait_for(self, bucket: TokenBucket) -> None:
+        wait = bucket.reserve()
+        if wait > 0:
+            await self._sleep(wait)
+
+    async def _post(self, chat_id: str, text: str, parse_mode: str) -> Tuple[int, Dict[str, Any]]:
+        payload = {"chat_id": chat_id, "text": text, "parse_mode": parse_mode, "disable_web_page_preview": True}
+        try:
+            r = await self._client.post(self.url, json=payload)
+        except httpx.TransportError as e:
+            return 0, {"ok": False, "description": f"{type(e).__name__}: {e}"}
+        try:
+            return r.status_code, r.json()
+        except Exception:
+            return r.status_code, {"ok": False, "status_code": r.status_code, "text": r.text[:500]}
+
+    async def send(self, chat_id: str, text: str, parse_mode: str = "HTML") -> Dict[str, Any]:
+        """Telegram's response dict; failures carry error_code / parameters.retry_after for the caller."""
+        for attempt in range(settings.TELEGRAM_MAX_RETRIES + 1):
+            # Chat first, outside the concurrency slot: a message parked behind its
+            # chat's limit holds neither a slot nor a global token meanwhile.
+            await self._wait_for(self._chat_bucket(chat_id))
+            async with self._semaphore:
+                await self._wait_for(self.global_bucket)
+                status, data = await self._post(chat_id, text, parse_mode)
+            if data.get("ok"):
+                self.stats["sent"] += 1
+                return data
+
+            retry_after = _retry_after(data)
+            if status == 429 or data.get("error_code") == 429:
+                self.stats["throttled_429"] += 1
+                retry_after = retry_after or 1.0
+                self._chat_bucket(chat_id).block(retry_after)
+                self.global_bucket.block(min(retry_after, settings.TELEGRAM_FLOOD_PAUSE_MAX_SECONDS))
+                if retry_after > settings.TELEGRAM_INLINE_RETRY_MAX_SECONDS:
+                    break
+            elif not (status == 0 or status >= 500):
+                break  # 4xx other than 429: not retryable
+            if attempt < settings.TELEGRAM_MAX_RETRIES:
+                self.stats["retries"] += 1
+                if retry_after is None:
+                    await self._sleep(0.5 * (2 ** attempt))
+
+        self.stats["failed"] += 1
+        data.setdefault("error_code", status or None)
+        log.warning("telegram send failed", extra={"extra": {"status_code": status, "resp": data}})
+        return data
+
+    async def send_many(self, messages: Sequence[Tuple[str, str]]) -> List[Dict[str, Any]]:
+        """Send (chat_id, text) pairs concurrently; responses in input order."""
+        return list(await asyncio.gather(*(self.send(chat_id, text) for chat_id, text in messages)))
@@ -2,6 +2,7 @@
 
 COL_SYSTEM = "system"
 DOC_INGEST_STATE = "shortage_ingest_state"
+DOC_DAILYMED_JOB = "dailymed_ingest_job"  # cursor for the resumable DailyMed bulk ingest
 
 COL_USERS = "users"
 COL_SUBSCRIPTIONS = "subscriptions"
@@ -10,6 +11,8 @@ COL_NDC_INDEX = "ndc_index"
 COL_SHORTAGES = "shortages"
 COL_ALERTS = "alerts"
 COL_DELIVERY_LOGS = "delivery_logs"
+COL_ALERT_OUTBOX = "alert_outbox"  # alert_outbox/{item_id}; see alerts/outbox.py
+COL_ALERT_DELIVERIES = "alert_deliveries"  # alert_deliveries/{delivery_key}; see alerts/delivery_claims.py
 COL_WEEKLY_RECAPS = "weekly_recaps"
 
 
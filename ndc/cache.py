@@ -0,0 +1,115 @@
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+from config.settings import settings
+
+# In-process caches for NDCResolver. Two tiers, both keyed by NDC11:
+#   overrides - ndc_alias_overrides docs; almost always absent, so the negative
+#               entry ("no override") is the common case
+#   index     - ndc_index docs (negative = not in DailyMed)
+# Negative entries use a shorter TTL than positive ones. Writers in this process
+# invalidate through invalidate_overrides / invalidate_index; other processes
+# converge within the TTL.
+
+MISS = object()  # get() result when the key is absent or expired
+
+
+class TTLCache:
+    """Thread-safe LRU with per-entry expiry. A stored None is a negative entry."""
+
+    def __init__(self, max_entries: int, ttl_seconds: float, negative_ttl_seconds: float,
+                 clock: Callable[[], float] = time.monotonic):
+        self.max_entries = max(1, max_entries)
+        self.ttl_seconds = ttl_seconds
+        self.negative_ttl_seconds = negative_ttl_seconds
+        self._clock = clock
+        self._data: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.counters: Dict[str, int] = {
+            "hits": 0, "negative_hits": 0, "misses": 0, "evictions": 0, "expirations": 0, "invalidations": 0,
+        }
+
+    def get(self, key: str) -> Any:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.counters["misses"] += 1
+                return MISS
+            expires_at, value = entry
+            if expires_at <= self._clock():
+                del self._data[key]
+                self.counters["expirations"] += 1
+                self.counters["misses"] += 1
+                return MISS
+            self._data.move_to_end(key)
+            self.counters["negative_hits" if value is None else "hits"] += 1
+            return value
+
+    def put(self, key: str, value: Optional[Any]) -> None:
+        ttl = self.negative_ttl_seconds if value is None else self.ttl_seconds
+        with self._lock:
+            self._data[key] = (self._clock() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.counters["evictions"] += 1
+
+    def invalidate(self, keys: Optional[Iterable[str]] = None) -> None:
+        """Drop `keys` (or everything when None)."""
+        with self._lock:
+            if keys is None:
+                self.counters["invalidations"] += len(self._data)
+                self._data.clear()
+                return
+            for key in keys:
+                if self._data.pop(key, None) is not None:
+                    self.counters["invalidations"] += 1
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {**self.counters, "entries": len(self._data)}
+
+
+class ResolverCache:
+    def __init__(self, max_entries: Optional[int] = None, ttl_seconds: Optional[float] = None,
+                 negative_ttl_seconds: Optional[float] = None, clock: Callable[[], float] = time.monotonic):
+        max_entries = settings.RESOLVER_CACHE_MAX_ENTRIES if max_entries is None else max_entries
+        ttl = settings.RESOLVER_CACHE_TTL_SECONDS if ttl_seconds is None else ttl_seconds
+        neg_ttl = settings.RESOLVER_CACHE_NEGATIVE_TTL_SECONDS if negative_ttl_seconds is None else negative_ttl_seconds
+        self.overrides = TTLCache(max_entries, ttl, neg_ttl, clock)
+        self.index = TTLCache(max_entries, ttl, neg_ttl, clock)
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        return {"overrides": self.overrides.stats(), "index": self.index.stats()}
+
+
+_shared: Optional[ResolverCache] = None
+_shared_lock = threading.Lock()
+
+
+def shared_resolver_cache() -> Optional[ResolverCache]:
+    """Process-wide cache used by default resolvers (None when RESOLVER_CACHE_ENABLED is off)."""
+    global _shared
+    if not settings.RESOLVER_CACHE_ENABLED:
+        return None
+    with _shared_lock:
+        if _shared is None:
+            _shared = ResolverCache()
+        return _shared
+
+
+def invalidate_overrides(ndcs: Optional[Iterable[str]] = None) -> None:
+    if _shared is not None:
+        _shared.overrides.invalidate(ndcs)
+
+
+def invalidate_index(ndcs: Optional[Iterable[str]] = None) -> None:
+    if _shared is not None:
+        _shared.index.invalidate(ndcs)
@@ -0,0 +1,227 @@
+from __future__ import annotations
+
+import bisect
+import glob
+import logging
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+import uuid
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from google.api_core.exceptions import NotFound
+
+from config.settings import settings
+from storage.gcs_client import blob_generation, download_bytes, download_file, upload_bytes
+
+log = logging.getLogger("glitch.ndc.index_artifact")
+
+# Compact, read-only snapshot of ndc_index for in-process lookups.
+#
+# Layout (little-endian):
+#   header       magic "GNDX", version u32, count u32, nstrings u32
+#   keys         count x u64   NDC-11 as an integer, ascending
+#   refs         count x 3 x u32   string ids: brand_name, generic_name, manufacturer
+#   str_offsets  (nstrings + 1) x u32   byte offsets into str_data
+#   str_data     UTF-8 strings, deduplicated (id 0 is "")
+#
+# Lookups binary-search the mmapped key array through a memoryview, so the
+# loaded artifact costs no per-entry Python objects. Loaders keep the file at a
+# path named by the blob's GCS generation (ndc_index_<generation>.bin): every
+# process on the host maps that one file, so its pages are shared, and only the
+# first process to see a new generation downloads it.
+
+MAGIC = b"GNDX"
+VERSION = 1
+ARTIFACT_BLOB = "dailymed/ndc_index.bin"
+NAME_FIELDS = ("brand_name", "generic_name", "manufacturer")
+
+_HEADER = struct.Struct("<4sIII")
+
+
+def build_index_artifact(docs: Iterable[Tuple[str, Dict[str, Any]]]) -> bytes:
+    by_key: Dict[int, Tuple[str, str, str]] = {}
+    for ndc11, doc in docs:
+        if len(ndc11) != 11 or not ndc11.isdigit():
+            continue
+        by_key[int(ndc11)] = tuple(str(doc.get(f) or "") for f in NAME_FIELDS)  # type: ignore[assignment]
+
+    string_ids: Dict[str, int] = {"": 0}
+    keys = sorted(by_key)
+    refs: List[int] = []
+    for k in keys:
+        for value in by_key[k]:
+            refs.append(string_ids.setdefault(value, len(string_ids)))
+
+    data = bytearray()
+    offsets = [0]
+    for value in string_ids:  # insertion order == id order
+        data += value.encode("utf-8")
+        offsets.append(len(data))
+
+    return b"".join([
+        _HEADER.pack(MAGIC, VERSION, len(keys), len(string_ids)),
+        struct.pack(f"<{len(keys)}Q", *keys),
+        struct.pack(f"<{len(refs)}I", *refs),
+        struct.pack(f"<{len(offsets)}I", *offsets),
+        bytes(data),
+    ])
+
+
+class NDCIndexArtifact:
+    def __init__(self, buf: Union[bytes, mmap.mmap], source: str = "memory"):
+        magic, version, count, nstrings = _HEADER.unpack_from(buf, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"not an ndc index artifact (magic={magic!r} version={version})")
+        self.source = source
+        self.count = count
+        self._buf = buf
+        mv = memoryview(buf)
+        pos = _HEADER.size
+        self._keys = mv[pos: pos + 8 * count].cast("Q")
+        pos += 8 * count
+        self._refs = mv[pos: pos + 12 * count].cast("I")
+        pos += 12 * count
+        self._offsets = mv[pos: pos + 4 * (nstrings + 1)].cast("I")
+        pos += 4 * (nstrings + 1)
+        self._data = mv[pos:]
+
+    @classmethod
+    def open(cls, path: str) -> "NDCIndexArtifact":
+        with open(path, "rb") as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return cls(mm, source=path)
+
+    def __len__(self) -> int:
+        return self.count
+
+    def _string(self, sid: int) -> str:
+        return bytes(self._data[self._offsets[sid]: self._offsets[sid + 1]]).decode("utf-8")
+
+    def _doc(self, i: int) -> Dict[str, Any]:
+        doc: Dict[str, Any] = {"ndc_digits": f"{self._keys[i]:011d}", "source": "dailymed_bulk"}
+        for j, field in enumerate(NAME_FIELDS):
+            doc[field] = self._string(self._refs[3 * i + j])
+        return doc
+
+    def get(self, ndc11: str) -> Optional[Dict[str, Any]]:
+        if len(ndc11) != 11 or not ndc11.isdigit():
+            return None
+        key = int(ndc11)
+        i = bisect.bisect_left(self._keys, key)
+        if i < self.count and self._keys[i] == key:
+            return self._doc(i)
+        return None
+
+    def get_many(self, ndcs: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        out: Dict[str, Dict[str, Any]] = {}
+        for n in ndcs:
+            doc = self.get(n)
+            if doc:
+                out[n] = doc
+        return out
+
+    def items(self) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        for i in range(self.count):
+            doc = self._doc(i)
+            yield doc["ndc_digits"], doc
+
+
+# -- publishing (DailyMed ingest) ------------------------------------------------
+
+def publish_index_artifact(bucket: str, upserts: Iterable[Tuple[str, Dict[str, Any]]], removals: Iterable[str],
+                           repo: Any = None) -> Dict[str, Any]:
+    """Apply an ingest's delta to the published artifact and upload the result.
+
+    The previous artifact is the base; with none published yet, the base is
+    streamed from ndc_index (which already holds this ingest's writes).
+    """
+    raw = download_bytes(bucket, ARTIFACT_BLOB)
+    if raw:
+        base: Dict[str, Dict[str, Any]] = dict(NDCIndexArtifact(raw).items())
+        base_source = "artifact"
+    else:
+        if repo is None:
+            from repos.ndc_index_repo import NDCIndexRepository
+            repo = NDCIndexRepository()
+        base = dict(repo.iter_names())
+        base_source = "firestore"
+    for ndc11, doc in upserts:
+        base[ndc11] = doc
+    for ndc11 in removals:
+        base.pop(ndc11, None)
+
+    blob = build_index_artifact(base.items())
+    upload_bytes(bucket, ARTIFACT_BLOB, blob)
+    stats = {"artifact_entries": len(base), "artifact_bytes": len(blob), "artifact_base": base_source}
+    log.info("ndc index artifact published", extra={"extra": stats})
+    return stats
+
+
+# -- loading (resolvers) ---------------------------------------------------------
+
+_shared: Optional[NDCIndexArtifact] = None
+_shared_generation: Optional[int] = None
+_shared_loaded_at = 0.0
+_shared_lock = threading.Lock()
+
+
+def _artifact_path(generation: Any) -> str:
+    return os.path.join(settings.DAILYMED_TMP_DIR or tempfile.gettempdir(), f"ndc_index_{generation}.bin")
+
+
+def _download_artifact(generation: int) -> NDCIndexArtifact:
+    """Map the artifact for `generation`, downloading it only if no process on this host has yet."""
+    bucket = settings.NDC_INDEX_ARTIFACT_BUCKET
+    path = _artifact_path(generation)
+    if not os.path.exists(path):
+        # Written under a private name and renamed into place, so a reader never maps a partial file.
+        tmp = f"{path}.{uuid.uuid4().hex[:8]}.part"
+        try:
+            download_file(bucket, ARTIFACT_BLOB, tmp, generation=generation)
+            os.replace(tmp, path)
+        finally:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+        log.info("ndc index artifact downloaded", extra={"extra": {"bucket": bucket, "generation": generation, "path": path}})
+    artifact = NDCIndexArtifact.open(path)
+    # Older generations: existing mappings stay valid after unlink.
+    for stale in glob.glob(_artifact_path("*")):
+        if stale != path:
+            try:
+                os.unlink(stale)
+            except OSError:
+                pass
+    log.info("ndc index artifact loaded", extra={"extra": {"entries": len(artifact), "generation": generation}})
+    return artifact
+
+
+def shared_index_artifact() -> Optional[NDCIndexArtifact]:
+    """Process-wide artifact, re-checked every NDC_INDEX_ARTIFACT_REFRESH_SECONDS.
+
+    A refresh is one metadata read; the file is only mapped again when the
+    blob's generation changed. None when NDC_INDEX_ARTIFACT_BUCKET is unset or
+    nothing is published; a failed refresh keeps serving the previous copy.
+    """
+    global _shared, _shared_generation, _shared_loaded_at
+    if not settings.NDC_INDEX_ARTIFACT_BUCKET:
+        return None
+    with _shared_lock:
+        now = time.monotonic()
+        if _shared_loaded_at and now - _shared_loaded_at < settings.NDC_INDEX_ARTIFACT_REFRESH_SECONDS:
+            return _shared
+        _shared_loaded_at = now
+        try:
+            generation = blob_generation(settings.NDC_INDEX_ARTIFACT_BUCKET, ARTIFACT_BLOB)
+            if generation is not None and generation != _shared_generation:
+                _shared = _download_artifact(generation)
+                _shared_generation = generation
+        except NotFound:
+            # Replaced between the metadata read and the download; the next refresh picks up the new one.
+            pass
+        except Exception as e:
+            log.warning("ndc index artifact load failed; using previous copy", extra={"extra": {"error": str(e)}})
+        return _shared
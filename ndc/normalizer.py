@@ -1,15 +1,60 @@
 from __future__ import annotations
 
 import re
+from functools import lru_cache
+from typing import Dict, Iterable, List
 
 # NDC may come in 10-digit or 11-digit forms. openFDA package_ndc includes hyphens.
-# True 10→11 conversion depends on segment pattern; if unknown, we left-pad to 11.
-# Deterministic rule for Glitch: digits only, left-pad to 11 (matches prior behavior).
-def normalize_ndc_to_11(ndc: str) -> str:
-    digits = re.sub(r"\D", "", ndc or "")
+# True 10→11 conversion depends on the segment pattern, so when hyphens are
+# present the zero goes in front of the short segment (HIPAA 5-4-2 form):
+#   4-4-2  1234-5678-90  → 01234-5678-90
+#   5-3-2  12345-678-90  → 12345-0678-90
+#   5-4-1  12345-6789-0  → 12345-6789-00
+# Without hyphens the pattern is unknown; we keep the prior rule (digits only,
+# left-pad to 11), which is exact for 4-4-2 and for 11-digit input.
+
+_NON_DIGITS = re.compile(r"\D")
+_SEGMENTED = re.compile(r"^\s*(\d{4,5})[-\s](\d{3,4})[-\s](\d{1,2})\s*$")
+_SEGMENT_WIDTHS = (5, 4, 2)
+
+MEMO_SIZE = 65536
+
+
+def _legacy_pad(ndc: str) -> str:
+    digits = _NON_DIGITS.sub("", ndc or "")
     if not digits:
         return ""
     if len(digits) > 11:
         # Sometimes NDC appears embedded; keep last 11 as safest heuristic
         digits = digits[-11:]
     return digits.zfill(11)
+
+
+@lru_cache(maxsize=MEMO_SIZE)
+def normalize_ndc_to_11(ndc: str) -> str:
+    m = _SEGMENTED.match(ndc or "")
+    if m and sum(len(g) for g in m.groups()) == 10:
+        return "".join(g.zfill(w) for g, w in zip(m.groups(), _SEGMENT_WIDTHS))
+    return _legacy_pad(ndc)
+
+
+def normalize_many(ndcs: Iterable[str]) -> List[str]:
+    """Normalize a batch, in input order ("" for unusable input).
+
+    Repeats within the batch cost one dict lookup; distinct values go through
+    the process-wide memo behind normalize_ndc_to_11.
+    """
+    memo: Dict[str, str] = {}
+    out: List[str] = []
+    for ndc in ndcs:
+        ndc = ndc or ""
+        hit = memo.get(ndc)
+        if hit is None:
+            hit = memo[ndc] = normalize_ndc_to_11(ndc)
+        out.append(hit)
+    return out
+
+
+def legacy_ndc_key(ndc: str) -> str:
+    """The key the pre-segment-aware normalizer produced (used by the rekey migration)."""
+    return _legacy_pad(ndc)
@@ -1,9 +1,11 @@
 from __future__ import annotations
 
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional
 from repos.ndc_index_repo import NDCIndexRepository
 from repos.ndc_alias_override_repo import NDCAliasOverrideRepository
-from ndc.normalizer import normalize_ndc_to_11
+from ndc.normalizer import normalize_many, normalize_ndc_to_11
+from ndc.cache import MISS, ResolverCache, TTLCache, shared_resolver_cache
+from ndc.index_artifact import NDCIndexArtifact, shared_index_artifact
 
 
 class NDCResolver:
@@ -11,47 +13,139 @@ class NDCResolver:
 
     Primary: DailyMed index (Firestore ndc_index)
     Fallback: openFDA shortage record fields (brand/generic/manufacturer) when available
+
+    Override and index lookups go through `cache` (default: the process-wide
+    ResolverCache, see ndc/cache.py), including "not found" results. When an
+    mmapped index artifact is available (NDC_INDEX_ARTIFACT_BUCKET, see
+    ndc/index_artifact.py) it answers index lookups first; NDCs it lacks are
+    still read from Firestore, since the artifact can lag ndc_index.
     """
 
-    def __init__(self, repo: Optional[NDCIndexRepository] = None, overrides: Optional[NDCAliasOverrideRepository] = None):
+    def __init__(self, repo: Optional[NDCIndexRepository] = None, overrides: Optional[NDCAliasOverrideRepository] = None,
+                 cache: Optional[ResolverCache] = None, artifact: Optional[NDCIndexArtifact] = None):
         self.repo = repo or NDCIndexRepository()
         self.overrides = overrides or NDCAliasOverrideRepository()
+        self.cache = cache or shared_resolver_cache()
+        self.artifact = artifact or shared_index_artifact()
+
+    def _get_override(self, ndc11: str) -> Optional[Dict[str, Any]]:
+        if self.cache is None:
+            return self.overrides.get(ndc11)
+        hit = self.cache.overrides.get(ndc11)
+        if hit is MISS:
+            hit = self.overrides.get(ndc11)
+            self.cache.overrides.put(ndc11, hit)
+        return dict(hit) if hit else None
+
+    def _get_index(self, ndc11: str) -> Optional[Dict[str, Any]]:
+        if self.artifact is not None:
+            rec = self.artifact.get(ndc11)
+            if rec:
+                return rec
+        if self.cache is None:
+            return self.repo.get(ndc11)
+        hit = self.cache.index.get(ndc11)
+        if hit is MISS:
+            hit = self.repo.get(ndc11)
+            self.cache.index.put(ndc11, hit)
+        return dict(hit) if hit else None
+
+    def cache_stats(self) -> Optional[Dict[str, Dict[str, int]]]:
+        return self.cache.stats() if self.cache is not None else None
 
     def resolve_from_index(self, ndc: str) -> Optional[Dict[str, Any]]:
         ndc11 = normalize_ndc_to_11(ndc)
         if not ndc11:
             return None
-        return self.repo.get(ndc11)
+        return self._get_index(ndc11)
 
     def resolve_with_fallback(self, ndc: str, fallback: Dict[str, Any]) -> Dict[str, Any]:
         ndc11 = normalize_ndc_to_11(ndc)
         if not ndc11:
-            return {
-                "ndc_digits": "",
-                "brand_name": "",
-                "generic_name": "",
-                "manufacturer": "",
-                "source": "invalid_ndc",
-            }
-
-        ov = self.overrides.get(ndc11)
-        if ov:
-            return {
-                "ndc_digits": ndc11,
-                "brand_name": ov.get("brand_name", ""),
-                "generic_name": ov.get("generic_name", ""),
-                "manufacturer": ov.get("manufacturer", ""),
-                "source": "override",
-            }
-
-        rec = self.repo.get(ndc11)
-        if rec:
-            return rec
-        # fallback fields from openFDA shortage record, normalized to our schema
+            return _invalid()
+        ov = self._get_override(ndc11)
+        rec = None if ov else self._get_index(ndc11)
+        return _compose(ndc11, ov, rec, fallback)
+
+    def resolve_many(self, ndcs: List[str], fallbacks: Optional[List[Dict[str, Any]]] = None) -> List[Dict[str, Any]]:
+        """Batch form of resolve_with_fallback; results are in input order.
+
+        Same precedence (override, then index, then fallback). Cache misses are
+        fetched with one get_all per tier, and the index is only read for NDCs
+        without an override (from the artifact when one is loaded, then
+        Firestore for what the artifact lacks).
+        """
+        fallbacks = fallbacks or [{} for _ in ndcs]
+        if len(fallbacks) != len(ndcs):
+            raise ValueError("fallbacks must align with ndcs")
+        keys = normalize_many(ndcs)
+        unique = [k for k in dict.fromkeys(keys) if k]
+
+        overrides = self._get_many(unique, self.overrides, self.cache.overrides if self.cache else None)
+        need_index = [k for k in unique if not overrides.get(k)]
+        index: Dict[str, Optional[Dict[str, Any]]] = {}
+        if self.artifact is not None:
+            index.update(self.artifact.get_many(need_index))
+            need_index = [k for k in need_index if k not in index]
+        index.update(self._get_many(need_index, self.repo, self.cache.index if self.cache else None))
+
+        out: List[Dict[str, Any]] = []
+        for ndc11, fallback in zip(keys, fallbacks):
+            if not ndc11:
+                out.append(_invalid())
+                continue
+            ov = overrides.get(ndc11)
+            out.append(_compose(ndc11, ov, None if ov else index.get(ndc11), fallback or {}))
+        return out
+
+    @staticmethod
+    def _get_many(keys: List[str], repo: Any, tier: Optional[TTLCache]) -> Dict[str, Optional[Dict[str, Any]]]:
+        found: Dict[str, Optional[Dict[str, Any]]] = {}
+        missing = keys
+        if tier is not None:
+            missing = []
+            for k in keys:
+                hit = tier.get(k)
+                if hit is MISS:
+                    missing.append(k)
+                else:
+                    found[k] = dict(hit) if hit else None
+        if missing:
+            fetched = repo.get_many(missing)
+            for k in missing:
+                doc = fetched.get(k)
+                if tier is not None:
+                    tier.put(k, doc)
+                found[k] = dict(doc) if doc else None
+        return found
+
+
+def _invalid() -> Dict[str, Any]:
+    return {
+        "ndc_digits": "",
+        "brand_name": "",
+        "generic_name": "",
+        "manufacturer": "",
+        "source": "invalid_ndc",
+    }
+
+
+def _compose(ndc11: str, ov: Optional[Dict[str, Any]], rec: Optional[Dict[str, Any]], fallback: Dict[str, Any]) -> Dict[str, Any]:
+    if ov:
         return {
             "ndc_digits": ndc11,
-            "brand_name": fallback.get("brand_name") or fallback.get("proprietary_name") or "",
-            "generic_name": fallback.get("generic_name") or fallback.get("nonproprietary_name") or "",
-            "manufacturer": fallback.get("manufacturer") or fallback.get("labeler_name") or "",
-            "source": "openfda_fallback",
+            "brand_name": ov.get("brand_name", ""),
+            "generic_name": ov.get("generic_name", ""),
+            "manufacturer": ov.get("manufacturer", ""),
+            "source": "override",
         }
+    if rec:
+        return rec
+    # fallback fields from openFDA shortage record, normalized to our schema
+    return {
+        "ndc_digits": ndc11,
+        "brand_name": fallback.get("brand_name") or fallback.get("proprietary_name") or "",
+        "generic_name": fallback.get("generic_name") or fallback.get("nonproprietary_name") or "",
+        "manufacturer": fallback.get("manufacturer") or fallback.get("labeler_name") or "",
+        "source": "openfda_fallback",
+    }
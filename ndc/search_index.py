@@ -0,0 +1,334 @@
+from __future__ import annotations
+
+import bisect
+import heapq
+import logging
+import re
+import threading
+import time
+from array import array
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from config.settings import settings
+
+log = logging.getLogger("glitch.ndc.search")
+
+# In-memory NDC search for the watchlist UI.
+#
+# SearchSnapshot is immutable and built in one pass:
+#   keys      array('Q') of NDC-11 integers, ascending; entry id = position
+#   columns   brand / generic / manufacturer / status lists, aligned with keys
+#   postings  name token -> array('I') of entry ids (ascending)
+#   vocab     sorted tokens, for prefix expansion of the last query token
+# All keys are 11 digits, so an NDC prefix is a contiguous integer range.
+# Results are always in NDC order, which makes keyset pagination (cursor = last
+# NDC returned) exact.
+#
+# NDCSearchService layers a small delta (entries changed since the snapshot)
+# on top, refreshed from updated_at watermarks, and folds it into a new
+# snapshot once it grows past NDC_SEARCH_DELTA_MAX. Writers stamp many docs
+# with one updated_at (a whole batch), so the watermark query is inclusive and
+# the docs already applied at the watermark are skipped by key.
+
+Entry = Tuple[str, str, str, str]  # brand_name, generic_name, manufacturer, status
+FIELDS = ("brand_name", "generic_name", "manufacturer", "status")
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+_NDC_QUERY = re.compile(r"^[\d\-\s]+$")
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN.findall((text or "").lower())
+
+
+def ndc_prefix(query: str) -> str:
+    """Digits to prefix-match, padding segments the user has finished typing.
+
+    "12345" → "12345"; "1234-" → "01234"; "1234-567-" → "012340567".
+    """
+    parts = re.split(r"[-\s]+", query.strip())
+    if len(parts) == 1:
+        return parts[0]
+    out = parts[0].zfill(5)
+    if len(parts) >= 3:
+        return out + parts[1].zfill(4) + "".join(parts[2:])
+    return out + parts[1]
+
+
+def _entry_tokens(entry: Entry) -> List[str]:
+    return tokenize(entry[0]) + tokenize(entry[1])
+
+
+class SearchSnapshot:
+    def __init__(self, entries: Dict[str, Entry]):
+        ndcs = sorted(n for n in entries if len(n) == 11 and n.isdigit())
+        self.keys = array("Q", (int(n) for n in ndcs))
+        intern: Dict[str, str] = {}
+        self.columns: List[List[str]] = [[], [], [], []]
+        postings: Dict[str, array] = {}
+        for i, ndc in enumerate(ndcs):
+            entry = entries[ndc]
+            for col, value in zip(self.columns, entry):
+                col.append(intern.setdefault(value, value))
+            for tok in set(_entry_tokens(entry)):
+                p = postings.get(tok)
+                if p is None:
+                    p = postings[tok] = array("I")
+                p.append(i)
+        self.postings = postings
+        self.vocab = sorted(postings)
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def entry(self, i: int) -> Entry:
+        return (self.columns[0][i], self.columns[1][i], self.columns[2][i], self.columns[3][i])
+
+    def ndc(self, i: int) -> str:
+        return f"{self.keys[i]:011d}"
+
+    def entries(self) -> Iterator[Tuple[str, Entry]]:
+        for i in range(len(self.keys)):
+            yield self.ndc(i), self.entry(i)
+
+    # -- queries: yield entry ids in NDC order, starting after `after` ----------
+
+    def iter_prefix(self, prefix: str, after: int = -1) -> Iterator[int]:
+        if not prefix.isdigit() or len(prefix) > 11:
+            return
+        scale = 10 ** (11 - len(prefix))
+        lo, hi = int(prefix) * scale, (int(prefix) + 1) * scale
+        start = bisect.bisect_left(self.keys, max(lo, after + 1))
+        end = bisect.bisect_left(self.keys, hi)
+        yield from range(start, end)
+
+    def iter_names(self, tokens: List[str], after: int = -1) -> Iterator[int]:
+        """All tokens must match; the last one as a prefix (search-as-you-type)."""
+        if not tokens:
+            return
+        full = [self.postings.get(t) for t in tokens[:-1]]
+        if any(p is None for p in full):
+            return
+        last = tokens[-1]
+        lo = bisect.bisect_left(self.vocab, last)
+        expansions = []
+        for tok in self.vocab[lo: lo + settings.NDC_SEARCH_MAX_PREFIX_EXPANSION]:
+            if not tok.startswith(last):
+                break
+            expansions.append(self.postings[tok])
+
+        # Drive from the smallest exact posting when there is one (cheap to
+        # walk), checking the rest by bisect; otherwise merge the expansions.
+        start_key = after + 1
+        if full:
+            full.sort(key=len)
+            driver, others = full[0], full[1:]
+            for i in driver[bisect.bisect_left(driver, self._first_id_at(start_key)):]:
+                if all(_contains(p, i) for p in others) and any(t.startswith(last) for t in _entry_tokens(self.entry(i))):
+                    yield i
+        else:
+            first = self._first_id_at(start_key)
+            prev = -1
+            for i in heapq.merge(*(p[bisect.bisect_left(p, first):] for p in expansions)):
+                if i != prev:
+                    prev = i
+                    yield i
+
+    def _first_id_at(self, key: int) -> int:
+        return bisect.bisect_left(self.keys, key)
+
+
+def _contains(posting: array, i: int) -> bool:
+    j = bisect.bisect_left(posting, i)
+    return j < len(posting) and posting[j] == i
+
+
+def _entry_matches(entry: Entry, ndc: str, prefix: Optional[str], tokens: List[str]) -> bool:
+    if prefix is not None:
+        return ndc.startswith(prefix)
+    toks = _entry_tokens(entry)
+    *full, last = tokens
+    return all(t in toks for t in full) and any(t.startswith(last) for t in toks)
+
+
+def _to_item(ndc: str, entry: Entry) -> Dict[str, Any]:
+    return {"ndc_digits": ndc, **dict(zip(FIELDS, entry))}
+
+
+Loader = Callable[[Optional[str]], Iterable[Tuple[str, Dict[str, Any]]]]
+
+
+class NDCSearchService:
+    """Snapshot + delta, refreshed from ndc_index and shortages by updated_at.
+
+    `index_loader` / `shortage_loader` take an updated_at watermark (None = all)
+    and yield (ndc11, doc) for docs updated at or after it. Index docs supply names; shortage docs supply status
+    and fill in names the index lacks.
+
+    The searchable state is one (snapshot, delta) tuple that maintenance replaces
+    wholesale and never mutates, so a search reads it once and sees a consistent
+    pair without taking the lock.
+    """
+
+    def __init__(self, index_loader: Loader, shortage_loader: Loader, clock: Callable[[], float] = time.monotonic):
+        self.index_loader = index_loader
+        self.shortage_loader = shortage_loader
+        self._clock = clock
+        self._state: Tuple[Optional[SearchSnapshot], Dict[str, Entry]] = (None, {})
+        self.watermarks: Dict[str, Optional[str]] = {"index": None, "shortages": None}
+        # NDCs already applied whose updated_at equals the watermark.
+        self._at_watermark: Dict[str, Set[str]] = {"index": set(), "shortages": set()}
+        self.refreshed_at = 0.0
+        self.rebuilt_at = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def snapshot(self) -> Optional[SearchSnapshot]:
+        return self._state[0]
+
+    @property
+    def delta(self) -> Dict[str, Entry]:
+        return self._state[1]
+
+    # -- maintenance -------------------------------------------------------------
+
+    @staticmethod
+    def _current(state: Tuple[Optional[SearchSnapshot], Dict[str, Entry]], ndc: str) -> Optional[Entry]:
+        snap, delta = state
+        if ndc in delta:
+            return delta[ndc]
+        if snap is None:
+            return None
+        i = bisect.bisect_left(snap.keys, int(ndc))
+        return snap.entry(i) if i < len(snap.keys) and snap.keys[i] == int(ndc) else None
+
+    def _pull(self, since: Dict[str, Optional[str]],
+              state: Tuple[Optional[SearchSnapshot], Dict[str, Entry]]) -> Dict[str, Entry]:
+        changed: Dict[str, Entry] = {}
+        for source, loader in (("index", self.index_loader), ("shortages", self.shortage_loader)):
+            applied = set(self._at_watermark[source]) if since[source] else set()
+            for ndc, doc in loader(since[source]):
+                if len(ndc) != 11 or not ndc.isdigit():
+                    continue
+                ts = str(doc.get("updated_at") or "")
+                if ts == since[source] and ndc in applied:
+                    continue
+                base = changed.get(ndc) or self._current(state, ndc) or ("", "", "", "")
+                brand, generic, manufacturer, status = base
+                if source == "index":
+                    brand = doc.get("brand_name") or brand
+                    generic = doc.get("generic_name") or generic
+                    manufacturer = doc.get("manufacturer") or manufacturer
+                else:
+                    status = doc.get("status") or status
+                    brand = brand or doc.get("brand_name") or ""
+                    generic = generic or doc.get("generic_name") or ""
+                    manufacturer = manufacturer or doc.get("manufacturer") or ""
+                changed[ndc] = (brand, generic, manufacturer, status)
+                if ts > (self.watermarks[source] or ""):
+                    self.watermarks[source] = ts
+                    self._at_watermark[source] = {ndc}
+                elif ts == self.watermarks[source]:
+                    self._at_watermark[source].add(ndc)
+        return changed
+
+    def rebuild(self) -> None:
+        t0 = time.perf_counter()
+        self.watermarks = {"index": None, "shortages": None}
+        self._at_watermark = {"index": set(), "shortages": set()}
+        # Built from scratch, not layered on the current state; searches keep using that meanwhile.
+        self._state = (SearchSnapshot(self._pull({"index": None, "shortages": None}, (None, {}))), {})
+        self.refreshed_at = self.rebuilt_at = self._clock()
+        log.info("ndc search index built", extra={"extra": {"entries": len(self.snapshot), "tokens": len(self.snapshot.vocab),
+                                                            "build_ms": int((time.perf_counter() - t0) * 1000)}})
+
+    def refresh(self) -> int:
+        """Fold docs updated since the watermarks into the delta; compact when it is large."""
+        snap, delta = self._state
+        changed = self._pull(dict(self.watermarks), (snap, delta))
+        delta = {**delta, **changed}
+        if len(delta) > settings.NDC_SEARCH_DELTA_MAX:
+            merged = dict(snap.entries()) if snap else {}
+            merged.update(delta)
+            snap, delta = SearchSnapshot(merged), {}
+        self._state = (snap, delta)
+        self.refreshed_at = self._clock()
+        return len(changed)
+
+    def ensure_fresh(self) -> None:
+        # Never inside the request: due maintenance runs on one background thread
+        # and searches keep using the current state until it is swapped (no
+        # results at all before the first build).
+        now = self._clock()
+        if self.snapshot is not None and now - self.refreshed_at < settings.NDC_SEARCH_REFRESH_SECONDS:
+            return
+        if not self._lock.acquire(blocking=False):
+            return
+        try:
+            threading.Thread(target=self._maintain, args=(now,), name="ndc-search-maintain", daemon=True).start()
+        except BaseException:
+            self._lock.release()
+            raise
+
+    def _maintain(self, now: float) -> None:
+        try:
+            if self.snapshot is None or now - self.rebuilt_at >= settings.NDC_SEARCH_FULL_REBUILD_SECONDS:
+                # Periodic full rebuild also drops NDCs deleted from ndc_index.
+                self.rebuild()
+            else:
+                self.refresh()
+        except Exception:
+            log.exception("ndc search index maintenance failed")
+        finally:
+            self._lock.release()
+
+    # -- query -------------------------------------------------------------------
+
+    def search(self, query: str, limit: int = 20, cursor: Optional[str] = None) -> Dict[str, Any]:
+        """Up to `limit` matches in NDC order after `cursor` (an NDC from a previous page)."""
+        snap, delta = self._state
+        query = (query or "").strip()
+        is_ndc = bool(_NDC_QUERY.match(query)) and any(c.isdigit() for c in query)
+        prefix = ndc_prefix(query) if is_ndc else None
+        tokens = [] if prefix is not None else tokenize(query)
+        if (prefix is None and not tokens) or (prefix is not None and not prefix.isdigit()) or snap is None:
+            return {"items": [], "next_cursor": None}
+        after = int(cursor) if cursor and cursor.isdigit() else -1
+
+        base = snap.iter_prefix(prefix, after) if prefix is not None else snap.iter_names(tokens, after)
+        base_hits = ((snap.ndc(i), snap.entry(i)) for i in base)
+        base_hits = ((n, e) for n, e in base_hits if n not in delta)
+        delta_hits = sorted(
+            (n, e) for n, e in delta.items()
+            if int(n) > after and _entry_matches(e, n, prefix, tokens)
+        )
+
+        items: List[Dict[str, Any]] = []
+        for ndc, entry in heapq.merge(base_hits, delta_hits):
+            if len(items) == limit:
+                return {"items": items, "next_cursor": items[-1]["ndc_digits"]}
+            items.append(_to_item(ndc, entry))
+        return {"items": items, "next_cursor": None}
+
+
+_service: Optional[NDCSearchService] = None
+_service_lock = threading.Lock()
+
+
+def _index_loader(since: Optional[str]) -> Iterable[Tuple[str, Dict[str, Any]]]:
+    from repos.ndc_index_repo import NDCIndexRepository
+    return NDCIndexRepository().iter_names(updated_after=since)
+
+
+def _shortage_loader(since: Optional[str]) -> Iterable[Tuple[str, Dict[str, Any]]]:
+    from repos.shortage_repo import ShortageRepository
+    return ShortageRepository().iter_search_fields(updated_after=since)
+
+
+def get_search_service() -> NDCSearchService:
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = NDCSearchService(_index_loader, _shortage_loader)
+    _service.ensure_fresh()
+    return _service
@@ -0,0 +1,182 @@
+"""Re-key Firestore docs stored under pre-segment-aware NDC-11 keys.
+
+Run: python -m ops.ndc_rekey [--dailymed-zip PATH] [--raw-file PATH] [--no-openfda] [--apply]
+
+Older code left-padded every NDC to 11 digits, so 5-3-2 and 5-4-1 codes were
+stored under the wrong key (see ndc/normalizer.py). The stored key alone can't
+say which product it was, so the tool rebuilds the mapping from raw hyphenated
+NDCs: the openFDA shortage feed, optionally a DailyMed bulk zip, and optionally
+a newline-separated file. It then moves docs in shortages, ndc_index,
+ndc_alias_overrides, watchlists/*/items and ndc_watchers from the legacy key to
+the correct one.
+
+A legacy key that more than one raw NDC maps to (e.g. 1234-5678-90 and
+12345-678-90 both padded to 01234567890) is ambiguous: it is reported and left
+in place, and the next sweep / ingest writes the correct keys.
+
+Dry run by default (counts only). After --apply, run a full DailyMed ingest
+(`full=true`) and delete dailymed/ndc_index.bin first so the manifest and the
+index artifact are rebuilt with the new keys.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import logging
+import re
+import zipfile
+from collections import defaultdict
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from google.cloud.firestore import Client
+
+from ingest.hash_index import invalidate_hash_index
+from ingest.openfda_client import fetch_all_shortages_async
+from models.schema import COL_NDC_ALIAS_OVERRIDES, COL_NDC_INDEX, COL_NDC_WATCHERS, COL_SHORTAGES
+from ndc.cache import invalidate_index, invalidate_overrides
+from ndc.normalizer import legacy_ndc_key, normalize_ndc_to_11
+from storage.firestore_client import get_firestore_client
+from utils.batching import FIRESTORE_BATCH_LIMIT, WriteBatcher, chunked
+
+log = logging.getLogger("glitch.ops.ndc_rekey")
+
+# Hyphenated NDC codes as they appear in SPL XML (package codes have 3 segments).
+_SPL_NDC = re.compile(rb'code="(\d{4,5}-\d{3,4}-\d{1,2})"')
+_IN_QUERY_LIMIT = 30  # Firestore "in" filter cap
+
+
+def build_rekey_map(raw_ndcs: Iterable[str]) -> Tuple[Dict[str, str], Set[str]]:
+    """Return ({legacy_key: new_key} for keys that moved, ambiguous legacy keys)."""
+    targets: Dict[str, Set[str]] = defaultdict(set)
+    for raw in raw_ndcs:
+        old, new = legacy_ndc_key(raw), normalize_ndc_to_11(raw)
+        if old and new:
+            targets[old].add(new)
+    mapping: Dict[str, str] = {}
+    ambiguous: Set[str] = set()
+    for old, news in targets.items():
+        if len(news) > 1:
+            ambiguous.add(old)
+        elif old not in news:
+            mapping[old] = next(iter(news))
+    # A target that is itself being moved would chain two moves through one doc.
+    chained = {old for old, new in mapping.items() if new in mapping}
+    for old in chained:
+        del mapping[old]
+    return mapping, ambiguous | chained
+
+
+def raw_ndcs_from_openfda() -> Iterator[str]:
+    records, _ = asyncio.run(fetch_all_shortages_async())
+    for r in records:
+        raw = r.get("package_ndc") or r.get("package_ndc11") or r.get("ndc")
+        if raw:
+            yield raw
+
+
+def raw_ndcs_from_dailymed_zip(path: str) -> Iterator[str]:
+    with zipfile.ZipFile(path) as z:
+        for info in z.infolist():
+            if info.filename.lower().endswith(".xml"):
+                for m in _SPL_NDC.finditer(z.read(info)):
+                    yield m.group(1).decode("ascii")
+
+
+def raw_ndcs_from_file(path: str) -> Iterator[str]:
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield line.strip()
+
+
+def _move_top_level(db: Client, batcher: WriteBatcher, collection: str, mapping: Dict[str, str]) -> Dict[str, int]:
+    """Move collection/{old} → collection/{new}; an existing new doc wins (it was written by fixed code)."""
+    col = db.collection(collection)
+    moved = dropped = 0
+    for chunk in chunked(list(mapping.items()), FIRESTORE_BATCH_LIMIT):
+        refs = [col.document(old) for old, _ in chunk] + [col.document(new) for _, new in chunk]
+        snaps = {s.id: s for s in db.get_all(refs)}
+        for old, new in chunk:
+            old_snap = snaps.get(old)
+            if old_snap is None or not old_snap.exists:
+                continue
+            new_snap = snaps.get(new)
+            if new_snap is None or not new_snap.exists:
+                batcher.set(col.document(new), {**(old_snap.to_dict() or {}), "ndc_digits": new})
+                moved += 1
+            else:
+                dropped += 1
+            batcher.delete(col.document(old))
+    return {"moved": moved, "dropped_superseded": dropped}
+
+
+def _move_watchlist_items(db: Client, batcher: WriteBatcher, mapping: Dict[str, str]) -> Dict[str, int]:
+    # Collection-group query over watchlists/{user_id}/items on the stored ndc_digits field.
+    moved = 0
+    for keys in chunked(list(mapping), _IN_QUERY_LIMIT):
+        for snap in db.collection_group("items").where("ndc_digits", "in", keys).stream():
+            user_ref = snap.reference.parent.parent
+            new = mapping[snap.id]
+            batcher.set(user_ref.collection("items").document(new), {**(snap.to_dict() or {}), "ndc_digits": new})
+            batcher.delete(snap.reference)
+            moved += 1
+    return {"moved": moved}
+
+
+def _move_watchers(db: Client, batcher: WriteBatcher, mapping: Dict[str, str]) -> Dict[str, int]:
+    moved = 0
+    col = db.collection(COL_NDC_WATCHERS)
+    for old, new in mapping.items():
+        for snap in col.document(old).collection("watchers").stream():
+            batcher.set(col.document(new).collection("watchers").document(snap.id), snap.to_dict() or {"user_id": snap.id})
+            batcher.delete(snap.reference)
+            moved += 1
+    return {"moved": moved}
+
+
+def run_rekey(raw_ndcs: Iterable[str], apply: bool = False, db: Optional[Client] = None) -> Dict[str, Any]:
+    mapping, ambiguous = build_rekey_map(raw_ndcs)
+    report: Dict[str, Any] = {"apply": apply, "keys_to_move": len(mapping), "ambiguous_keys": len(ambiguous),
+                              "ambiguous_sample": sorted(ambiguous)[:20]}
+    if not mapping:
+        return report
+
+    db = db or get_firestore_client()
+    batcher = WriteBatcher(db, apply)
+    for collection in (COL_SHORTAGES, COL_NDC_INDEX, COL_NDC_ALIAS_OVERRIDES):
+        report[collection] = _move_top_level(db, batcher, collection, mapping)
+    report["watchlist_items"] = _move_watchlist_items(db, batcher, mapping)
+    report[COL_NDC_WATCHERS] = _move_watchers(db, batcher, mapping)
+    batcher.flush()
+
+    if apply:
+        # Keys changed underneath the hash index and resolver caches.
+        invalidate_hash_index()
+        invalidate_index()
+        invalidate_overrides()
+    log.info("ndc rekey finished", extra={"extra": report})
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--dailymed-zip", help="DailyMed bulk zip to harvest raw package NDCs from")
+    parser.add_argument("--raw-file", help="newline-separated raw (hyphenated) NDCs")
+    parser.add_argument("--no-openfda", action="store_true", help="skip harvesting the openFDA shortage feed")
+    parser.add_argument("--apply", action="store_true", help="write changes (default: dry run)")
+    args = parser.parse_args()
+
+    sources: List[Iterable[str]] = []
+    if not args.no_openfda:
+        sources.append(raw_ndcs_from_openfda())
+    if args.dailymed_zip:
+        sources.append(raw_ndcs_from_dailymed_zip(args.dailymed_zip))
+    if args.raw_file:
+        sources.append(raw_ndcs_from_file(args.raw_file))
+    raw = (n for src in sources for n in src)
+    print(json.dumps(run_rekey(raw, apply=args.apply), indent=2))
+
+
+if __name__ == "__main__":
+    main()
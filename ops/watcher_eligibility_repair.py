@@ -0,0 +1,105 @@
+"""Reconcile ndc_watchers entries with watchlists, users and subscriptions.
+
+Run: python -m ops.watcher_eligibility_repair [--apply]
+
+Watcher entries carry denormalized alert eligibility (alerts/eligibility.py).
+The write paths keep them in sync, but a failed sync, a manual console edit or
+a Stripe change made outside checkout leaves drift. This job recomputes every
+entry from the sources of truth:
+  - watchlists/*/items decide which (ndc, user) entries should exist
+    (missing ones are created, orphans are deleted)
+  - users/{id} and subscriptions/{id} decide chat_id / activated /
+    subscription_status (stale entries are rewritten)
+Dry run by default (counts only).
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+from typing import Any, Dict, Iterable, Optional, Set, Tuple
+
+from google.cloud.firestore import Client
+
+from alerts.eligibility import ELIGIBILITY_FIELDS, eligibility_fields
+from models.schema import COL_NDC_WATCHERS, COL_SUBSCRIPTIONS, COL_USERS
+from repos.ndc_watchers_repo import NDCWatchersRepository
+from storage.firestore_client import get_firestore_client
+from utils.batching import FIRESTORE_BATCH_LIMIT, WriteBatcher, chunked
+
+log = logging.getLogger("glitch.ops.watcher_eligibility_repair")
+
+Pair = Tuple[str, str]  # (ndc_digits, user_id)
+
+
+def _expected_pairs(db: Client) -> Set[Pair]:
+    # Collection-group scan over watchlists/{user_id}/items/{ndc_digits}; ids only.
+    return {(snap.id, snap.reference.parent.parent.id) for snap in db.collection_group("items").select([]).stream()}
+
+
+def _get_docs(db: Client, collection: str, ids: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+    col = db.collection(collection)
+    out: Dict[str, Dict[str, Any]] = {}
+    for chunk in chunked(sorted(ids), FIRESTORE_BATCH_LIMIT):
+        for snap in db.get_all([col.document(i) for i in chunk]):
+            if snap.exists:
+                out[snap.id] = snap.to_dict() or {}
+    return out
+
+
+def plan_repair(
+    expected: Set[Pair],
+    actual: Dict[Pair, Dict[str, Any]],
+    users: Dict[str, Dict[str, Any]],
+    subs: Dict[str, Dict[str, Any]],
+) -> Dict[str, Any]:
+    """Pure diff: {"write": {pair: fields}, "delete": [pairs], counts...}."""
+    wanted: Dict[str, Dict[str, Any]] = {}
+    write: Dict[Pair, Dict[str, Any]] = {}
+    missing = stale = 0
+    for ndc, user_id in sorted(expected):
+        fields = wanted.get(user_id)
+        if fields is None:
+            fields = wanted[user_id] = eligibility_fields(users.get(user_id) or {}, subs.get(user_id) or {})
+        entry = actual.get((ndc, user_id))
+        if entry is None:
+            missing += 1
+        elif any(entry.get(f) != fields[f] for f in ELIGIBILITY_FIELDS):
+            stale += 1
+        else:
+            continue
+        write[(ndc, user_id)] = fields
+    delete = sorted(pair for pair in actual if pair not in expected)
+    return {"write": write, "delete": delete, "entries": len(actual), "missing": missing, "stale": stale, "orphaned": len(delete)}
+
+
+def run_repair(apply: bool = False, db: Optional[Client] = None) -> Dict[str, Any]:
+    db = db or get_firestore_client()
+    watchers = NDCWatchersRepository(db)
+    expected = _expected_pairs(db)
+    actual = {(ndc, user_id): entry for ndc, user_id, entry in watchers.iter_all()}
+    user_ids = {user_id for _, user_id in expected}
+    plan = plan_repair(expected, actual, _get_docs(db, COL_USERS, user_ids), _get_docs(db, COL_SUBSCRIPTIONS, user_ids))
+
+    batcher = WriteBatcher(db, apply)
+    col = db.collection(COL_NDC_WATCHERS)
+    for (ndc, user_id), fields in plan["write"].items():
+        batcher.set(col.document(ndc).collection("watchers").document(user_id), {"user_id": user_id, **fields}, merge=True)
+    for ndc, user_id in plan["delete"]:
+        batcher.delete(col.document(ndc).collection("watchers").document(user_id))
+    batcher.flush()
+
+    report = {"apply": apply, "expected": len(expected), **{k: plan[k] for k in ("entries", "missing", "stale", "orphaned")}}
+    log.info("watcher eligibility repair finished", extra={"extra": report})
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--apply", action="store_true", help="write changes (default: dry run)")
+    args = parser.parse_args()
+    print(json.dumps(run_repair(apply=args.apply), indent=2))
+
+
+if __name__ == "__main__":
+    main()
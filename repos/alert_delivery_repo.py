@@ -0,0 +1,93 @@
+from __future__ import annotations
+
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional
+
+from google.api_core.exceptions import AlreadyExists, FailedPrecondition
+from google.cloud.firestore import Client
+
+from alerts.delivery_claims import (
+    CLAIM_IN_FLIGHT,
+    CLAIM_OK,
+    STATE_FAILED,
+    STATE_SENT,
+    BaseDeliveryClaims,
+    claim_record,
+    claim_verdict,
+)
+from config.settings import settings
+from models.schema import COL_ALERT_DELIVERIES
+from storage.firestore_client import get_firestore_client
+from utils.batching import FIRESTORE_BATCH_LIMIT, chunked
+
+
+class AlertDeliveryRepository(BaseDeliveryClaims):
+    """Firestore delivery claims (alert_deliveries/{key}); see alerts/delivery_claims.py."""
+
+    def __init__(self, db: Optional[Client] = None, stale_seconds: Optional[float] = None):
+        self.db = db or get_firestore_client()
+        self.stale_seconds = settings.ALERT_DELIVERY_CLAIM_STALE_SECONDS if stale_seconds is None else stale_seconds
+
+    def _col(self):
+        return self.db.collection(COL_ALERT_DELIVERIES)
+
+    def _create_many(self, claims: List[Dict[str, str]], owner: str, now: float) -> Dict[str, str]:
+        out: Dict[str, str] = {}
+        records = [claim_record(c["key"], c["user_id"], c["ndc_digits"], owner, now) for c in claims]
+        batch = self.db.batch()
+        for record in records:
+            batch.create(self._col().document(record["key"]), record)
+        try:
+            batch.commit()
+            return {record["key"]: CLAIM_OK for record in records}
+        except AlreadyExists:
+            pass
+        # Someone claimed one of them since the read; the batch was rolled back as a whole.
+        for record in records:
+            try:
+                self._col().document(record["key"]).create(record)
+                out[record["key"]] = CLAIM_OK
+            except AlreadyExists:
+                out[record["key"]] = CLAIM_IN_FLIGHT
+        return out
+
+    def claim_many(self, claims: Iterable[Dict[str, str]], owner: str, now: Optional[float] = None) -> Dict[str, str]:
+        now = time.time() if now is None else now
+        out: Dict[str, str] = {}
+        for chunk in chunked(claims, FIRESTORE_BATCH_LIMIT):
+            snaps = {s.id: s for s in self.db.get_all([self._col().document(c["key"]) for c in chunk])}
+            absent = [c for c in chunk if c["key"] not in snaps or not snaps[c["key"]].exists]
+            if absent:
+                out.update(self._create_many(absent, owner, now))
+            for c in chunk:
+                snap = snaps.get(c["key"])
+                if snap is None or not snap.exists:
+                    continue
+                existing = snap.to_dict() or {}
+                verdict = claim_verdict(existing, now, self.stale_seconds)
+                if verdict == CLAIM_OK:
+                    # Re-claim a failed or stale key only if nobody else did since the read.
+                    record = claim_record(c["key"], c["user_id"], c["ndc_digits"], owner, now,
+                                          int(existing.get("attempts", 0)) + 1)
+                    try:
+                        snap.reference.update(record, option=self.db.write_option(last_update_time=snap.update_time))
+                    except FailedPrecondition:
+                        verdict = CLAIM_IN_FLIGHT
+                out[c["key"]] = verdict
+        return out
+
+    def finish_many(self, outcomes: Dict[str, bool], now: Optional[float] = None) -> None:
+        now = time.time() if now is None else now
+        # Firestore TTL policy on expire_at removes old claims; keep them as long as the outbox items.
+        expire_at = datetime.now(timezone.utc) + timedelta(days=settings.ALERT_OUTBOX_RETENTION_DAYS)
+        for chunk in chunked(sorted(outcomes.items()), FIRESTORE_BATCH_LIMIT):
+            batch = self.db.batch()
+            for key, ok in chunk:
+                batch.update(self._col().document(key), {"state": STATE_SENT if ok else STATE_FAILED,
+                                                         "finished_at": now, "expire_at": expire_at})
+            batch.commit()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        snap = self._col().document(key).get()
+        return snap.to_dict() if snap.exists else None
@@ -0,0 +1,100 @@
+from __future__ import annotations
+
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional
+
+from google.api_core.exceptions import AlreadyExists
+from google.cloud import firestore
+from google.cloud.firestore import Client, Transaction
+
+from alerts.outbox import STATUS_DEAD, STATUS_DONE, STATUS_PENDING, BaseOutbox
+from config.settings import settings
+from models.schema import COL_ALERT_OUTBOX
+from storage.firestore_client import get_firestore_client
+from utils.batching import FIRESTORE_BATCH_LIMIT, chunked
+
+
+class AlertOutboxRepository(BaseOutbox):
+    """Firestore backend of the alert outbox (alert_outbox/{item_id}); see alerts/outbox.py."""
+
+    def __init__(self, db: Optional[Client] = None):
+        self.db = db or get_firestore_client()
+
+    def _col(self):
+        return self.db.collection(COL_ALERT_OUTBOX)
+
+    def enqueue_many(self, items: Iterable[Dict[str, Any]]) -> int:
+        col = self._col()
+        created = 0
+        for chunk in chunked(items, FIRESTORE_BATCH_LIMIT):
+            refs = [col.document(i["item_id"]) for i in chunk]
+            existing = {s.id for s in self.db.get_all(refs, field_paths=["status"]) if s.exists}
+            fresh = [i for i in chunk if i["item_id"] not in existing]
+            if not fresh:
+                continue
+            batch = self.db.batch()
+            for item in fresh:
+                batch.create(col.document(item["item_id"]), item)
+            try:
+                batch.commit()
+                created += len(fresh)
+            except AlreadyExists:
+                # Another enqueuer created one of them in between; the batch was
+                # rolled back as a whole, so create one by one.
+                for item in fresh:
+                    try:
+                        col.document(item["item_id"]).create(item)
+                        created += 1
+                    except AlreadyExists:
+                        pass
+        return created
+
+    def lease(self, owner: str, limit: int, lease_seconds: float, now: Optional[float] = None) -> List[Dict[str, Any]]:
+        # Candidates come from a plain query; the claim re-checks each doc inside
+        # one transaction, so two workers never lease the same item.
+        now = time.time() if now is None else now
+        q = (self._col().where("status", "==", STATUS_PENDING).where("available_at", "<=", now)
+             .order_by("available_at").order_by("user_id").limit(limit))
+        snaps = list(q.select(["available_at", "user_id"]).stream())
+        if not snaps:
+            return []
+        refs = [snap.reference for snap in snaps]
+        # Complete the last user's group from this sweep (see BaseOutbox.lease).
+        last = snaps[-1].to_dict() or {}
+        seen = {snap.id for snap in snaps}
+        tail = (self._col().where("status", "==", STATUS_PENDING).where("available_at", "==", last.get("available_at"))
+                .where("user_id", "==", last.get("user_id")).limit(2 * limit))
+        refs += [snap.reference for snap in tail.select([]).stream() if snap.id not in seen][:limit]
+
+        @firestore.transactional
+        def _claim(transaction: Transaction) -> List[Dict[str, Any]]:
+            claimed: List[Dict[str, Any]] = []
+            for snap in self.db.get_all(refs, transaction=transaction):
+                data = snap.to_dict() if snap.exists else None
+                if not data or data.get("status") != STATUS_PENDING or data.get("available_at", 0) > now:
+                    continue
+                update = {"attempts": int(data.get("attempts", 0)) + 1, "lease_owner": owner,
+                          "available_at": now + lease_seconds}
+                transaction.update(snap.reference, update)
+                claimed.append({**data, **update, "item_id": snap.id})
+            return claimed
+
+        return _claim(self.db.transaction())
+
+    def get(self, item_id: str) -> Optional[Dict[str, Any]]:
+        snap = self._col().document(item_id).get()
+        return {**(snap.to_dict() or {}), "item_id": snap.id} if snap.exists else None
+
+    def counts(self) -> Dict[str, int]:
+        out: Dict[str, int] = {}
+        for status in (STATUS_PENDING, STATUS_DONE, STATUS_DEAD):
+            result = self._col().where("status", "==", status).count().get()
+            out[status] = int(result[0][0].value)
+        return out
+
+    def _update(self, item_id: str, fields: Dict[str, Any]) -> None:
+        if fields.get("status") in (STATUS_DONE, STATUS_DEAD):
+            # Firestore TTL policy on expire_at removes finished items.
+            fields = {**fields, "expire_at": datetime.now(timezone.utc) + timedelta(days=settings.ALERT_OUTBOX_RETENTION_DAYS)}
+        self._col().document(item_id).update(fields)
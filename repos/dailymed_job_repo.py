@@ -0,0 +1,130 @@
+from __future__ import annotations
+
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Optional
+
+from google.cloud import firestore
+from google.cloud.firestore import Client, Transaction
+from storage.firestore_client import get_firestore_client
+from models.schema import COL_SYSTEM, DOC_DAILYMED_JOB
+
+STATUS_RUNNING = "running"
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+
+
+class LeaseLostError(RuntimeError):
+    """Another runner holds the job lease; the caller's slice must not be recorded."""
+
+
+class DailyMedJobRepository:
+    """Cursor doc for the resumable DailyMed ingest (system/dailymed_ingest_job).
+
+    start, claim, checkpoint, release and abandon each read and write the cursor
+    in one transaction, so the running check and the lease owner check cannot race.
+    """
+
+    def __init__(self, db: Optional[Client] = None):
+        self.db = db or get_firestore_client()
+
+    def _ref(self):
+        return self.db.collection(COL_SYSTEM).document(DOC_DAILYMED_JOB)
+
+    def get(self) -> Optional[Dict[str, Any]]:
+        snap = self._ref().get()
+        return (snap.to_dict() or {}) if snap.exists else None
+
+    def start(self, cursor: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Write a fresh cursor unless a job is still running; returns that job's cursor if so."""
+        ref = self._ref()
+
+        @firestore.transactional
+        def _start(transaction: Transaction) -> Optional[Dict[str, Any]]:
+            snap = ref.get(transaction=transaction)
+            data = (snap.to_dict() or {}) if snap.exists else {}
+            if data.get("status") == STATUS_RUNNING:
+                return data
+            transaction.set(ref, cursor)
+            return None
+
+        return _start(self.db.transaction())
+
+    def checkpoint(self, updates: Dict[str, Any], owner: str, lease_seconds: int) -> Dict[str, Any]:
+        """Record a finished slice and extend the lease; returns the cursor as written.
+
+        Raises LeaseLostError (writing nothing) when `owner` no longer holds the lease.
+        """
+        ref = self._ref()
+
+        @firestore.transactional
+        def _checkpoint(transaction: Transaction) -> Dict[str, Any]:
+            snap = ref.get(transaction=transaction)
+            data = (snap.to_dict() or {}) if snap.exists else {}
+            if data.get("lease_owner") != owner:
+                raise LeaseLostError(f"dailymed job lease held by {data.get('lease_owner')!r}, not {owner!r}")
+            now = datetime.now(timezone.utc)
+            fields = {
+                **updates,
+                "slices": int(data.get("slices") or 0) + 1,
+                "lease_until": (now + timedelta(seconds=lease_seconds)).isoformat(),
+                "updated_at": now.isoformat(),
+            }
+            transaction.update(ref, fields)
+            return {**data, **fields}
+
+        return _checkpoint(self.db.transaction())
+
+    def claim(self, job_id: str, owner: str, lease_seconds: int) -> bool:
+        # One runner at a time: the lease is taken only if free, expired, or already ours.
+        ref = self._ref()
+
+        @firestore.transactional
+        def _claim(transaction: Transaction) -> bool:
+            snap = ref.get(transaction=transaction)
+            data = snap.to_dict() if snap.exists else {}
+            if data.get("job_id") != job_id:
+                return False
+            now = datetime.now(timezone.utc)
+            lease_until = data.get("lease_until") or ""
+            if data.get("lease_owner") not in (None, owner) and lease_until > now.isoformat():
+                return False
+            transaction.update(ref, {
+                "lease_owner": owner,
+                "lease_until": (now + timedelta(seconds=lease_seconds)).isoformat(),
+            })
+            return True
+
+        return _claim(self.db.transaction())
+
+    def release(self, owner: str) -> None:
+        # Best effort; an unreleased lease simply expires.
+        ref = self._ref()
+
+        @firestore.transactional
+        def _release(transaction: Transaction) -> None:
+            snap = ref.get(transaction=transaction)
+            if snap.exists and (snap.to_dict() or {}).get("lease_owner") == owner:
+                transaction.update(ref, {"lease_owner": None, "lease_until": None})
+
+        _release(self.db.transaction())
+
+    def abandon(self, reason: str) -> Optional[Dict[str, Any]]:
+        """Mark a running job failed and drop its lease; returns the cursor as written, or None if none was running.
+
+        A runner still working on it gets LeaseLostError at its next checkpoint.
+        """
+        ref = self._ref()
+
+        @firestore.transactional
+        def _abandon(transaction: Transaction) -> Optional[Dict[str, Any]]:
+            snap = ref.get(transaction=transaction)
+            data = (snap.to_dict() or {}) if snap.exists else {}
+            if data.get("status") != STATUS_RUNNING:
+                return None
+            now = datetime.now(timezone.utc).isoformat()
+            fields = {"status": STATUS_FAILED, "last_error": reason, "finished_at": now, "updated_at": now,
+                      "lease_owner": None, "lease_until": None}
+            transaction.update(ref, fields)
+            return {**data, **fields}
+
+        return _abandon(self.db.transaction())
@@ -28,3 +28,18 @@ class IngestStateRepository:
     def update_sweep_metrics(self, metrics: Dict[str, Any]) -> None:
         ref = self.db.collection(COL_SYSTEM).document(DOC_INGEST_STATE)
         ref.set(metrics, merge=True)
+
+    def update_delta_cursor(self, last_updated_hwm: str, full_sweep_at: Optional[str] = None) -> None:
+        # High-water mark for incremental openFDA queries; full_sweep_at marks a reconciliation sweep.
+        data: Dict[str, Any] = {"last_updated_hwm": last_updated_hwm}
+        if full_sweep_at:
+            data["last_full_sweep_at"] = full_sweep_at
+        ref = self.db.collection(COL_SYSTEM).document(DOC_INGEST_STATE)
+        ref.set(data, merge=True)
+
+    def record_poll_decision(self, data: Dict[str, Any], skipped: bool) -> None:
+        ref = self.db.collection(COL_SYSTEM).document(DOC_INGEST_STATE)
+        payload = dict(data)
+        if skipped:
+            payload["poll_skips_total"] = firestore.Increment(1)
+        ref.set(payload, merge=True)
@@ -1,9 +1,10 @@
 from __future__ import annotations
 
-from typing import Any, Dict, Optional
+from typing import Any, Dict, Iterable, Optional
 from google.cloud.firestore import Client
 from storage.firestore_client import get_firestore_client
 from models.schema import COL_NDC_ALIAS_OVERRIDES
+from ndc.cache import invalidate_overrides
 
 
 class NDCAliasOverrideRepository:
@@ -18,5 +19,21 @@ class NDCAliasOverrideRepository:
         d["ndc_digits"] = ndc_digits
         return d
 
+    def get_many(self, ndcs: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        # One BatchGetDocuments round trip per call; missing docs are omitted.
+        col = self.db.collection(COL_NDC_ALIAS_OVERRIDES)
+        refs = [col.document(n) for n in dict.fromkeys(ndcs)]
+        if not refs:
+            return {}
+        out: Dict[str, Dict[str, Any]] = {}
+        for snap in self.db.get_all(refs):
+            if not snap.exists:
+                continue
+            d = snap.to_dict() or {}
+            d["ndc_digits"] = snap.id
+            out[snap.id] = d
+        return out
+
     def upsert(self, ndc_digits: str, data: Dict[str, Any]) -> None:
         self.db.collection(COL_NDC_ALIAS_OVERRIDES).document(ndc_digits).set(data, merge=True)
+        invalidate_overrides([ndc_digits])
@@ -1,9 +1,12 @@
 from __future__ import annotations
 
-from typing import Any, Dict, Optional
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
 from google.cloud.firestore import Client
+from google.cloud.firestore_v1.bulk_writer import BulkRetry, BulkWriterOptions
 from storage.firestore_client import get_firestore_client
 from models.schema import COL_NDC_INDEX
+from utils.batching import chunked
+from ndc.cache import invalidate_index
 
 
 class NDCIndexRepository:
@@ -18,5 +21,101 @@ class NDCIndexRepository:
         d["ndc_digits"] = ndc_digits
         return d
 
+    def get_many(self, ndcs: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        # One BatchGetDocuments round trip per call; missing docs are omitted.
+        col = self.db.collection(COL_NDC_INDEX)
+        refs = [col.document(n) for n in dict.fromkeys(ndcs)]
+        if not refs:
+            return {}
+        out: Dict[str, Dict[str, Any]] = {}
+        for snap in self.db.get_all(refs):
+            if not snap.exists:
+                continue
+            d = snap.to_dict() or {}
+            d["ndc_digits"] = snap.id
+            out[snap.id] = d
+        return out
+
+    def iter_names(self, updated_after: Optional[str] = None) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        # Projection query: only the name fields (and updated_at) come over the wire.
+        q = self.db.collection(COL_NDC_INDEX).select(["brand_name", "generic_name", "manufacturer", "updated_at"])
+        if updated_after:
+            # Inclusive: a writer stamps a whole batch with one updated_at (see ndc/search_index.py).
+            q = q.where("updated_at", ">=", updated_after)
+        for snap in q.stream():
+            yield snap.id, snap.to_dict() or {}
+
     def upsert(self, ndc_digits: str, data: Dict[str, Any]) -> None:
         self.db.collection(COL_NDC_INDEX).document(ndc_digits).set(data, merge=True)
+        invalidate_index([ndc_digits])
+
+    def upsert_many(
+        self,
+        items: Iterable[Tuple[str, Dict[str, Any]]],
+        flush_every: int = 500,
+        max_ops_per_second: int = 500,
+        max_attempts: int = 5,
+    ) -> Dict[str, Any]:
+        """Merge-upsert through a BulkWriter (parallel batched commits, 500/50/5 ramp-up throttling).
+
+        Failed writes are retried with exponential backoff up to `max_attempts`;
+        the writer is flushed every `flush_every` docs to bound in-flight memory.
+        Returns {"written": int, "failed": int, "failed_ndcs": [...]}.
+        """
+        opts = BulkWriterOptions(
+            initial_ops_per_second=min(500, max_ops_per_second),
+            max_ops_per_second=max_ops_per_second,
+            retry=BulkRetry.exponential,
+        )
+        bw = self.db.bulk_writer(options=opts)
+        failed: List[str] = []
+
+        def _on_error(failure, _writer) -> bool:
+            if failure.attempts < max_attempts:
+                return True
+            failed.append(failure.operation.reference.id)
+            return False
+
+        bw.on_write_error(_on_error)
+        col = self.db.collection(COL_NDC_INDEX)
+        total = 0
+        for chunk in chunked(items, flush_every):
+            for ndc_digits, data in chunk:
+                bw.set(col.document(ndc_digits), data, merge=True)
+            total += len(chunk)
+            bw.flush()
+            invalidate_index(ndc for ndc, _ in chunk)
+        bw.close()
+        return {"written": total - len(failed), "failed": len(failed), "failed_ndcs": failed[:50]}
+
+    def delete_many(self, ndcs: Iterable[str], max_ops_per_second: int = 500, max_attempts: int = 5) -> Dict[str, Any]:
+        """Delete through a BulkWriter, retrying like upsert_many.
+
+        Only docs actually deleted leave the lookup cache.
+        Returns {"deleted": int, "failed": int, "failed_ndcs": [...]}.
+        """
+        opts = BulkWriterOptions(
+            initial_ops_per_second=min(500, max_ops_per_second),
+            max_ops_per_second=max_ops_per_second,
+            retry=BulkRetry.exponential,
+        )
+        bw = self.db.bulk_writer(options=opts)
+        failed: List[str] = []
+
+        def _on_error(failure, _writer) -> bool:
+            if failure.attempts < max_attempts:
+                return True
+            failed.append(failure.operation.reference.id)
+            return False
+
+        bw.on_write_error(_on_error)
+        col = self.db.collection(COL_NDC_INDEX)
+        requested: List[str] = []
+        for ndc_digits in ndcs:
+            bw.delete(col.document(ndc_digits))
+            requested.append(ndc_digits)
+        bw.close()
+        failed_set = set(failed)
+        deleted = [ndc for ndc in requested if ndc not in failed_set]
+        invalidate_index(deleted)
+        return {"deleted": len(deleted), "failed": len(failed), "failed_ndcs": failed[:50]}
@@ -1,9 +1,12 @@
 from __future__ import annotations
 
-from typing import Any, Dict, Iterable, Optional
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
 from google.cloud.firestore import Client
+from google.cloud.firestore_v1.field_path import FieldPath
+from config.settings import settings
 from storage.firestore_client import get_firestore_client
 from models.schema import COL_NDC_WATCHERS
+from utils.batching import FIRESTORE_BATCH_LIMIT, chunked
 
 
 class NDCWatchersRepository:
@@ -14,11 +17,53 @@ class NDCWatchersRepository:
         return self.db.collection(COL_NDC_WATCHERS).document(ndc_digits).collection("watchers")
 
     def add_watcher(self, ndc_digits: str, user_id: str, data: Dict[str, Any] | None = None) -> None:
-        self._watchers_col(ndc_digits).document(user_id).set(data or {"user_id": user_id}, merge=True)
+        self._watchers_col(ndc_digits).document(user_id).set({"user_id": user_id, **(data or {})}, merge=True)
 
     def remove_watcher(self, ndc_digits: str, user_id: str) -> None:
         self._watchers_col(ndc_digits).document(user_id).delete()
 
-    def iter_watchers(self, ndc_digits: str, limit: int = 5000) -> Iterable[str]:
-        for snap in self._watchers_col(ndc_digits).limit(limit).stream():
-            yield snap.id
+    def iter_watcher_pages(self, ndc_digits: str, page_size: Optional[int] = None) -> Iterator[List[Tuple[str, Dict[str, Any]]]]:
+        """Every watcher entry for an NDC, one page at a time, in user_id order.
+
+        Cursor-paginated (start_after the last snapshot of the previous page), so a
+        hot NDC is never truncated and no single query holds more than a page.
+        Entries carry denormalized eligibility (see alerts/eligibility.py).
+        """
+        page_size = max(1, page_size or settings.ALERT_FANOUT_PAGE_SIZE)
+        query = self._watchers_col(ndc_digits).order_by(FieldPath.document_id()).limit(page_size)
+        last = None
+        while True:
+            snaps = list((query.start_after(last) if last is not None else query).stream())
+            if snaps:
+                yield [(snap.id, snap.to_dict() or {}) for snap in snaps]
+            if len(snaps) < page_size:
+                return
+            last = snaps[-1]
+
+    def iter_watcher_docs(self, ndc_digits: str, limit: Optional[int] = None) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        seen = 0
+        for page in self.iter_watcher_pages(ndc_digits):
+            for user_id, entry in page:
+                if limit is not None and seen >= limit:
+                    return
+                seen += 1
+                yield user_id, entry
+
+    def iter_watchers(self, ndc_digits: str, limit: Optional[int] = None) -> Iterable[str]:
+        for user_id, _ in self.iter_watcher_docs(ndc_digits, limit):
+            yield user_id
+
+    def iter_all(self) -> Iterator[Tuple[str, str, Dict[str, Any]]]:
+        """(ndc_digits, user_id, entry) for every watcher entry (collection-group scan)."""
+        for snap in self.db.collection_group("watchers").stream():
+            yield snap.reference.parent.parent.id, snap.id, snap.to_dict() or {}
+
+    def set_eligibility_many(self, user_id: str, ndcs: Iterable[str], fields: Dict[str, Any]) -> int:
+        written = 0
+        for chunk in chunked(ndcs, FIRESTORE_BATCH_LIMIT):
+            batch = self.db.batch()
+            for ndc in chunk:
+                batch.set(self._watchers_col(ndc).document(user_id), {"user_id": user_id, **fields}, merge=True)
+            batch.commit()
+            written += len(chunk)
+        return written
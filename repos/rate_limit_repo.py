@@ -1,12 +1,14 @@
 from __future__ import annotations
 
+from dataclasses import dataclass, field
 from datetime import datetime, timezone
-from typing import Any, Dict, Optional, Tuple
+from typing import Any, Dict, Iterable, Optional
 
-from google.cloud.firestore import Client, Transaction
-from google.cloud import firestore
+from google.api_core.exceptions import AlreadyExists, FailedPrecondition
+from google.cloud.firestore import Client
 
 from storage.firestore_client import get_firestore_client
+from utils.batching import FIRESTORE_BATCH_LIMIT, chunked
 
 
 def utc_day_key(ts: datetime | None = None) -> str:
@@ -14,32 +16,74 @@ def utc_day_key(ts: datetime | None = None) -> str:
     return ts.strftime("%Y%m%d")
 
 
+@dataclass
+class RateCounter:
+    """One users/{id}/rate_limits/{day} doc; version is its update_time (None = doc absent)."""
+    total: int = 0
+    by_ndc: Dict[str, int] = field(default_factory=dict)
+    version: Any = None
+
+
 class RateLimitRepository:
+    """Daily alert counters, read in bulk and written with compare-and-set (see alerts/rate_ledger.py)."""
+
     def __init__(self, db: Optional[Client] = None):
         self.db = db or get_firestore_client()
 
     def _doc_ref(self, user_id: str, day_key: str):
         return self.db.collection("users").document(user_id).collection("rate_limits").document(day_key)
 
-    @firestore.transactional
-    def reserve_quota(self, transaction: Transaction, user_id: str, ndc_digits: str, day_key: str,
-                      max_total: int, max_per_ndc: int) -> Tuple[bool, str]:
+    def load_many(self, user_ids: Iterable[str], day_key: str) -> Dict[str, RateCounter]:
+        out: Dict[str, RateCounter] = {}
+        for chunk in chunked(sorted(set(user_ids)), FIRESTORE_BATCH_LIMIT):
+            for snap in self.db.get_all([self._doc_ref(u, day_key) for u in chunk]):
+                user_id = snap.reference.parent.parent.id
+                if not snap.exists:
+                    out[user_id] = RateCounter()
+                    continue
+                data = snap.to_dict() or {}
+                out[user_id] = RateCounter(
+                    total=int(data.get("alerts_sent_total", 0)),
+                    by_ndc={k: int(v) for k, v in (data.get("alerts_sent_by_ndc") or {}).items()},
+                    version=snap.update_time,
+                )
+        return out
+
+    def _stage(self, batch: Any, user_id: str, day_key: str, counter: RateCounter) -> None:
         ref = self._doc_ref(user_id, day_key)
-        snap = ref.get(transaction=transaction)
-        data = snap.to_dict() if snap.exists else {}
-        total = int(data.get("alerts_sent_total", 0))
-        by_ndc = dict(data.get("alerts_sent_by_ndc", {}) or {})
-
-        if total >= max_total:
-            return False, "daily_limit"
-        ndc_count = int(by_ndc.get(ndc_digits, 0))
-        if ndc_count >= max_per_ndc:
-            return False, "ndc_limit"
-
-        by_ndc[ndc_digits] = ndc_count + 1
-        transaction.set(ref, {
-            "alerts_sent_total": total + 1,
-            "alerts_sent_by_ndc": by_ndc,
+        data = {
+            "alerts_sent_total": counter.total,
+            "alerts_sent_by_ndc": counter.by_ndc,
             "updated_at": datetime.now(timezone.utc).isoformat(),
-        }, merge=True)
-        return True, "ok"
+        }
+        if counter.version is None:
+            batch.create(ref, data)  # fails if another run created the doc since it was read
+        else:
+            batch.update(ref, data, option=self.db.write_option(last_update_time=counter.version))
+
+    def commit_many(self, day_key: str, counters: Dict[str, RateCounter]) -> Dict[str, Any]:
+        """Write counters whose doc is unchanged since it was read; returns {user_id: new version}.
+
+        Users missing from the result lost the compare-and-set and must be re-read.
+        """
+        committed: Dict[str, Any] = {}
+        for chunk in chunked(sorted(counters.items()), FIRESTORE_BATCH_LIMIT):
+            batch = self.db.batch()
+            for user_id, counter in chunk:
+                self._stage(batch, user_id, day_key, counter)
+            try:
+                results = batch.commit()
+                committed.update({user_id: r.update_time for (user_id, _), r in zip(chunk, results)})
+                continue
+            except (AlreadyExists, FailedPrecondition):
+                pass
+            # One stale counter rejects the whole batch: find the losers one by one.
+            for user_id, counter in chunk:
+                batch = self.db.batch()
+                self._stage(batch, user_id, day_key, counter)
+                try:
+                    (result,) = batch.commit()
+                    committed[user_id] = result.update_time
+                except (AlreadyExists, FailedPrecondition):
+                    pass
+        return committed
@@ -1,9 +1,10 @@
 from __future__ import annotations
 
-from typing import Any, Dict, Optional
+from typing import Any, Dict, Iterable, Iterator, Optional, Tuple
 from google.cloud.firestore import Client
 from storage.firestore_client import get_firestore_client
 from models.schema import COL_SHORTAGES
+from utils.batching import FIRESTORE_BATCH_LIMIT, chunked
 
 
 class ShortageRepository:
@@ -18,5 +19,48 @@ class ShortageRepository:
         d["ndc_digits"] = ndc_digits
         return d
 
+    def get_many(self, ndcs: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        # One BatchGetDocuments round trip per call; missing docs are omitted.
+        col = self.db.collection(COL_SHORTAGES)
+        refs = [col.document(n) for n in dict.fromkeys(ndcs)]
+        if not refs:
+            return {}
+        out: Dict[str, Dict[str, Any]] = {}
+        for snap in self.db.get_all(refs):
+            if not snap.exists:
+                continue
+            d = snap.to_dict() or {}
+            d["ndc_digits"] = snap.id
+            out[snap.id] = d
+        return out
+
+    def iter_snapshot_hashes(self) -> Iterator[Tuple[str, str]]:
+        # Projection query: only snapshot_hash comes over the wire.
+        for snap in self.db.collection(COL_SHORTAGES).select(["snapshot_hash"]).stream():
+            h = (snap.to_dict() or {}).get("snapshot_hash")
+            if h:
+                yield snap.id, h
+
+    def iter_search_fields(self, updated_after: Optional[str] = None) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        # Projection query for the NDC search index.
+        q = self.db.collection(COL_SHORTAGES).select(["brand_name", "generic_name", "manufacturer", "status", "updated_at"])
+        if updated_after:
+            # Inclusive: a writer stamps a whole batch with one updated_at (see ndc/search_index.py).
+            q = q.where("updated_at", ">=", updated_after)
+        for snap in q.stream():
+            yield snap.id, snap.to_dict() or {}
+
     def upsert(self, ndc_digits: str, data: Dict[str, Any]) -> None:
         self.db.collection(COL_SHORTAGES).document(ndc_digits).set(data, merge=True)
+
+    def upsert_many(self, items: Iterable[Tuple[str, Dict[str, Any]]], chunk_size: int = FIRESTORE_BATCH_LIMIT) -> int:
+        """Merge-upsert in WriteBatch commits of up to 500 docs. Returns the commit count."""
+        col = self.db.collection(COL_SHORTAGES)
+        commits = 0
+        for chunk in chunked(items, min(chunk_size, FIRESTORE_BATCH_LIMIT)):
+            batch = self.db.batch()
+            for ndc_digits, data in chunk:
+                batch.set(col.document(ndc_digits), data, merge=True)
+            batch.commit()
+            commits += 1
+        return commits
@@ -18,5 +18,11 @@ class SubscriptionRepository:
         d["user_id"] = user_id
         return d
 
+    def find_user_by_stripe_subscription(self, stripe_subscription_id: str) -> Optional[str]:
+        q = self.db.collection(COL_SUBSCRIPTIONS).where("stripe_subscription_id", "==", stripe_subscription_id).limit(1)
+        for snap in q.stream():
+            return snap.id
+        return None
+
     def upsert(self, user_id: str, data: Dict[str, Any]) -> None:
         self.db.collection(COL_SUBSCRIPTIONS).document(user_id).set(data, merge=True)
@@ -1,7 +1,8 @@
 from __future__ import annotations
 
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, Iterator, List, Optional
 from google.cloud.firestore import Client
+from google.cloud.firestore_v1.field_path import FieldPath
 from storage.firestore_client import get_firestore_client
 from models.schema import COL_WATCHLISTS
 
@@ -22,6 +23,18 @@ class WatchlistRepository:
             out.append(item)
         return out
 
+    def iter_ndcs(self, user_id: str, page_size: int = 500) -> Iterator[Dict[str, Any]]:
+        """Every watchlist item, cursor-paginated; list_ndcs stops at its limit."""
+        query = self._items_col(user_id).order_by(FieldPath.document_id()).limit(page_size)
+        last = None
+        while True:
+            snaps = list((query.start_after(last) if last is not None else query).stream())
+            for d in snaps:
+                yield {**(d.to_dict() or {}), "ndc_digits": d.id}
+            if len(snaps) < page_size:
+                return
+            last = snaps[-1]
+
     def count(self, user_id: str) -> int:
         # Firestore count aggregation is available but varies; use stream for simplicity.
         return sum(1 for _ in self._items_col(user_id).stream())
@@ -1,5 +1,8 @@
 from __future__ import annotations
 
+from typing import List, Optional
+
+from google.api_core.exceptions import NotFound
 from google.cloud import storage
 from config.settings import settings
 
@@ -14,3 +17,62 @@ def upload_bytes(bucket_name: str, blob_name: str, content: bytes, content_type:
     blob = bucket.blob(blob_name)
     blob.upload_from_string(content, content_type=content_type)
     return f"gs://{bucket_name}/{blob_name}"
+
+
+def upload_file(bucket_name: str, blob_name: str, path: str, content_type: str = "application/octet-stream",
+                chunk_size_mb: Optional[int] = None) -> str:
+    # Setting chunk_size makes the library do a chunked resumable upload straight
+    # from disk, so large archives never need to be buffered in memory.
+    chunk_mb = chunk_size_mb or settings.GCS_UPLOAD_CHUNK_MB
+    client = get_gcs_client()
+    blob = client.bucket(bucket_name).blob(blob_name, chunk_size=max(1, chunk_mb) * 1024 * 1024)
+    blob.upload_from_filename(path, content_type=content_type)
+    return f"gs://{bucket_name}/{blob_name}"
+
+
+def download_bytes(bucket_name: str, blob_name: str) -> Optional[bytes]:
+    client = get_gcs_client()
+    try:
+        return client.bucket(bucket_name).blob(blob_name).download_as_bytes()
+    except NotFound:
+        return None
+
+
+def download_file(bucket_name: str, blob_name: str, path: str, generation: Optional[int] = None) -> str:
+    # Streams to disk; used to resume jobs from an archived copy without buffering it.
+    # `generation` pins the object version (NotFound once it has been replaced).
+    get_gcs_client().bucket(bucket_name).blob(blob_name, generation=generation).download_to_filename(path)
+    return path
+
+
+def blob_generation(bucket_name: str, blob_name: str) -> Optional[int]:
+    # One metadata read; the generation changes on every overwrite of the object.
+    blob = get_gcs_client().bucket(bucket_name).get_blob(blob_name)
+    return blob.generation if blob is not None else None
+
+
+def blob_exists(bucket_name: str, blob_name: str) -> bool:
+    return get_gcs_client().bucket(bucket_name).blob(blob_name).exists()
+
+
+# GCS composes at most 32 source objects per request.
+COMPOSE_MAX_SOURCES = 32
+
+
+def compose_blobs(bucket_name: str, sources: List[str], blob_name: str,
+                  content_type: str = "application/octet-stream") -> str:
+    # Server-side concatenation: nothing is downloaded or re-uploaded. Longer
+    # source lists are folded into the destination 31 at a time.
+    bucket = get_gcs_client().bucket(bucket_name)
+    dest = bucket.blob(blob_name)
+    dest.content_type = content_type
+    dest.compose([bucket.blob(n) for n in sources[:COMPOSE_MAX_SOURCES]])
+    for i in range(COMPOSE_MAX_SOURCES, len(sources), COMPOSE_MAX_SOURCES - 1):
+        dest.compose([dest] + [bucket.blob(n) for n in sources[i: i + COMPOSE_MAX_SOURCES - 1]])
+    return f"gs://{bucket_name}/{blob_name}"
+
+
+def delete_blobs(bucket_name: str, blob_names: List[str]) -> None:
+    # Missing blobs are ignored, so a retried cleanup is harmless.
+    bucket = get_gcs_client().bucket(bucket_name)
+    bucket.delete_blobs([bucket.blob(n) for n in blob_names], on_error=lambda blob: None)
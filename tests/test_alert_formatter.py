@@ -0,0 +1,35 @@
+from alerts.formatter import format_shortage_change_alert, format_shortage_change_digest
+
+
+def _payload(i):
+    return {"ndc_digits": f"{i:011d}", "brand_name": f"Drug {i}", "manufacturer": "Acme Pharma",
+            "old_status": "Current", "new_status": "Resolved"}
+
+
+def test_single_change_keeps_the_single_alert_format():
+    assert format_shortage_change_digest([_payload(1)]) == [(format_shortage_change_alert(_payload(1)), [0])]
+
+
+def test_digest_splits_at_the_limit_without_splitting_an_ndc():
+    payloads = [_payload(i) for i in range(120)]
+    parts = format_shortage_change_digest(payloads)
+    assert len(parts) > 1
+    assert all(len(text) <= 4096 for text, _ in parts)
+    assert [i for _, covered in parts for i in covered] == list(range(120))
+    for text, covered in parts:
+        assert all(f"<code>{i:011d}</code>" in text for i in covered)
+    assert parts[0][0].startswith("<b>Glitch Alert</b>: 120 watched NDCs changed")
+    assert parts[1][0].startswith("<b>Glitch Alert</b> (continued)")
+
+
+def test_an_oversized_section_is_shortened_without_cutting_markup():
+    huge = {**_payload(1), "brand_name": "Drug & Co " * 600, "manufacturer": "<Acme> " * 600}
+    for payloads in ([huge], [huge, _payload(2)]):
+        parts = format_shortage_change_digest(payloads)
+        assert [i for _, covered in parts for i in covered] == list(range(len(payloads)))
+        for text, _ in parts:
+            assert len(text) <= 4096
+            assert text.count("<b>") == text.count("</b>") and text.count("<code>") == text.count("</code>")
+            assert "<Acme>" not in text and "&amp;" in text
+            assert not any(text[i:].startswith("&") and not text[i:].startswith(("&amp;", "&lt;", "&gt;"))
+                           for i in range(len(text)))
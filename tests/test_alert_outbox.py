@@ -0,0 +1,249 @@
+import pytest
+
+from alerts.delivery_claims import MemoryDeliveryClaims
+from alerts.fanout import AlertFanout
+from alerts.outbox import MemoryOutbox, SQLiteOutbox, new_outbox_item
+from alerts.outbox_worker import OutboxWorker
+from config.settings import settings
+from repos.rate_limit_repo import RateCounter
+
+
+def _item(user="u1", ndc="00000000001", h="h1", now=0.0):
+    return new_outbox_item(user, f"chat-{user}", {"ndc_digits": ndc, "new_status": "Current"}, h, now=now)
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def outbox(request):
+    return MemoryOutbox() if request.param == "memory" else SQLiteOutbox(":memory:")
+
+
+def test_enqueue_is_idempotent_per_user_ndc_and_hash(outbox):
+    assert outbox.enqueue_many([_item(), _item("u2")]) == 2
+    assert outbox.enqueue_many([_item(), _item(h="h2")]) == 1
+    assert outbox.counts() == {"pending": 3, "done": 0, "dead": 0}
+
+
+def test_lease_hides_items_until_the_lease_expires(outbox):
+    outbox.enqueue_many([_item(), _item("u2", now=5.0)])
+    first = outbox.lease("w1", limit=10, lease_seconds=60, now=1.0)
+    assert [i["user_id"] for i in first] == ["u1"] and first[0]["attempts"] == 1
+    assert [i["user_id"] for i in outbox.lease("w2", limit=10, lease_seconds=60, now=10.0)] == ["u2"]
+    assert outbox.lease("w2", limit=10, lease_seconds=60, now=30.0) == []
+    # w1 never acked: the item comes back after its lease.
+    again = outbox.lease("w2", limit=10, lease_seconds=60, now=61.0)
+    assert [i["user_id"] for i in again] == ["u1"] and again[0]["attempts"] == 2
+
+
+def test_lease_completes_the_last_users_sweep_group(outbox):
+    outbox.enqueue_many([_item("a")] + [_item("b", ndc=f"0000000000{n}") for n in range(3)] + [_item("c")])
+    assert [i["user_id"] for i in outbox.lease("w", limit=2, lease_seconds=60, now=1.0)] == ["a", "b", "b", "b"]
+    assert [i["user_id"] for i in outbox.lease("w", limit=2, lease_seconds=60, now=1.0)] == ["c"]
+
+
+def test_ack_retry_and_dead_letter(outbox):
+    a, b, c = _item("a"), _item("b"), _item("c")
+    outbox.enqueue_many([a, b, c])
+    outbox.lease("w", limit=10, lease_seconds=60, now=1.0)
+    outbox.ack(a["item_id"], "sent")
+    outbox.retry(b["item_id"], available_at=100.0, error="timeout", quota_reserved=True)
+    outbox.dead_letter(c["item_id"], "telegram 403")
+    assert outbox.counts() == {"pending": 1, "done": 1, "dead": 1}
+    assert outbox.lease("w", limit=10, lease_seconds=60, now=99.0) == []
+    retried = outbox.lease("w", limit=10, lease_seconds=60, now=100.0)
+    assert retried[0]["item_id"] == b["item_id"] and retried[0]["quota_reserved"] is True
+    assert outbox.get(c["item_id"])["last_error"] == "telegram 403"
+
+
+class FakeEngine:
+    def __init__(self, responses):
+        self.responses = responses
+        self.sent = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        pass
+
+    async def send_many(self, messages):
+        self.sent += [chat_id for chat_id, _ in messages]
+        return [self.responses[chat_id.removeprefix("chat-")] for chat_id, _ in messages]
+
+
+class FakeAudit:
+    def __init__(self):
+        self.records = []
+
+    def record(self, user_id, payload, resp, alert_id=None):
+        self.records.append((user_id, bool(resp.get("ok"))))
+
+    def flush(self):
+        return 0
+
+
+class FakeRateRepo:
+    def __init__(self, blocked=(), down=False):
+        self.blocked = set(blocked)
+        self.down = down
+        self.reservations = []
+
+    def load_many(self, user_ids, day_key):
+        if self.down:
+            raise RuntimeError("firestore unavailable")
+        return {u: RateCounter(total=10**6 if u in self.blocked else 0) for u in user_ids}
+
+    def commit_many(self, day_key, counters):
+        self.reservations += list(counters)
+        self.committed = dict(counters)
+        return {u: object() for u in counters}
+
+
+def test_worker_outcomes(monkeypatch):
+    monkeypatch.setattr(settings, "ALERT_OUTBOX_MAX_ATTEMPTS", 3)
+    monkeypatch.setattr(settings, "ALERT_OUTBOX_RETRY_BASE_SECONDS", 10.0)
+    now = [0.0]
+    outbox = MemoryOutbox()
+    outbox.enqueue_many([_item(u) for u in ("ok", "flood", "blocked", "gone", "down")])
+    engine = FakeEngine({
+        "ok": {"ok": True},
+        "flood": {"ok": False, "error_code": 429, "parameters": {"retry_after": 7}},
+        "gone": {"ok": False, "error_code": 403, "description": "bot was blocked by the user"},
+        "down": {"ok": False, "error_code": 502},
+    })
+    rate = FakeRateRepo(blocked={"blocked"})
+    audit = FakeAudit()
+    worker = OutboxWorker(outbox, audit, rate, concurrency=4, clock=lambda: now[0], engine_factory=lambda: engine,
+                          deliveries=MemoryDeliveryClaims())
+
+    counts = worker.run_once()
+    assert {k: counts[k] for k in ("leased", "sent", "rate_limited", "retry", "dead")} == \
+        {"leased": 5, "sent": 1, "rate_limited": 1, "retry": 2, "dead": 1}
+    assert outbox.counts() == {"pending": 2, "done": 2, "dead": 1}
+    assert "chat-blocked" not in engine.sent
+    assert len(audit.records) == 4  # every send attempt is recorded
+
+    # 429 honours retry_after; the 502 backs off from the base.
+    now[0] = 7.0
+    assert [i["user_id"] for i in outbox.lease("x", 10, 0, now=now[0])] == ["flood"]
+    now[0] = 10.0
+    engine.responses["flood"] = {"ok": True}
+    assert worker.run_once()["sent"] == 1
+    # Quota is reserved once per item, not once per attempt.
+    assert rate.reservations.count("flood") == 1
+
+    for t in (100.0, 1000.0):  # "down" keeps failing until attempts are exhausted
+        now[0] = t
+        worker.run_once()
+    assert outbox.counts() == {"pending": 0, "done": 3, "dead": 2}
+
+
+def test_worker_coalesces_a_users_alerts_into_one_message():
+    outbox = MemoryOutbox()
+    outbox.enqueue_many([_item("u1", ndc=f"0000000000{n}") for n in range(3)] + [_item("u2")])
+    engine = FakeEngine({"u1": {"ok": True}, "u2": {"ok": True}})
+    rate, audit = FakeRateRepo(), FakeAudit()
+    worker = OutboxWorker(outbox, audit, rate, clock=lambda: 0.0, engine_factory=lambda: engine, coalesce=True,
+                          deliveries=MemoryDeliveryClaims())
+
+    counts = worker.run_once()
+    assert counts["messages"] == 2 and counts["sent"] == 4
+    assert sorted(engine.sent) == ["chat-u1", "chat-u2"]
+    assert len(audit.records) == 4  # one alert row per NDC
+    assert rate.committed["u1"].total == 1 and len(rate.committed["u1"].by_ndc) == 3
+
+
+def test_worker_charges_the_daily_cap_per_message_sent(monkeypatch):
+    monkeypatch.setattr(settings, "MAX_ALERTS_PER_DAY", 5)
+    outbox = MemoryOutbox()
+    # Two sections this long do not fit one 4096-character message: the digest is split in two.
+    big = [new_outbox_item("u1", "chat-u1", {"ndc_digits": f"0000000000{n}", "manufacturer": "m" * 3000}, "h1", now=0.0)
+           for n in range(2)]
+    outbox.enqueue_many(big + [_item("u1", ndc="00000000009")])
+    engine = FakeEngine({"u1": {"ok": True}})
+    rate = FakeRateRepo()
+    worker = OutboxWorker(outbox, FakeAudit(), rate, clock=lambda: 0.0, engine_factory=lambda: engine, coalesce=True,
+                          deliveries=MemoryDeliveryClaims())
+
+    counts = worker.run_once()
+    assert counts["messages"] == 2 and counts["sent"] == 3
+    assert rate.committed["u1"].total == 2 and len(rate.committed["u1"].by_ndc) == 3
+
+
+def test_worker_fails_closed_when_quota_is_unavailable():
+    outbox = MemoryOutbox()
+    outbox.enqueue_many([_item("a"), _item("b")])
+    engine = FakeEngine({})
+    worker = OutboxWorker(outbox, FakeAudit(), FakeRateRepo(down=True), clock=lambda: 0.0, engine_factory=lambda: engine,
+                          deliveries=MemoryDeliveryClaims())
+
+    assert worker.run_once()["retry"] == 2
+    assert engine.sent == [] and outbox.counts()["pending"] == 2
+
+
+class FakeWatcherDocs:
+    def __init__(self, entries):
+        self.entries = entries
+
+    def iter_watcher_pages(self, ndc, page_size):
+        entries = sorted(self.entries.get(ndc, {}).items())
+        for i in range(0, len(entries), page_size):
+            yield entries[i:i + page_size]
+
+
+class FakeDocs:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def get(self, user_id):
+        return self.docs.get(user_id)
+
+    get_by_user = get
+
+
+def test_fanout_enqueues_eligible_watchers_once(monkeypatch):
+    monkeypatch.setattr(settings, "PAYMENTS_ENABLED", True)
+    users = FakeDocs({
+        "paid": {"activated_at": "x", "telegram_chat_id": "1"},
+        "unpaid": {"activated_at": "x", "telegram_chat_id": "2"},
+        "inactive": {"telegram_chat_id": "3"},
+        "nochat": {"activated_at": "x"},
+    })
+    subs = FakeDocs({u: {"status": "active"} for u in ("paid", "inactive", "nochat")})
+    watchers = FakeWatcherDocs({"00000000001": {u: {"user_id": u} for u in ("paid", "unpaid", "inactive", "nochat")}})
+    outbox = MemoryOutbox()
+    fanout = AlertFanout(watchers, users, subs, outbox)
+
+    doc = {"status": "Resolved", "snapshot_hash": "h2", "brand_name": "X"}
+    assert fanout.enqueue("00000000001", {"status": "Current"}, doc) == {"pages": 1, "processed": 4, "skipped": 3, "enqueued": 1}
+    assert fanout.enqueue("00000000001", {"status": "Current"}, doc)["enqueued"] == 0
+    (item,) = outbox.lease("w", 10, 60)
+    assert item["user_id"] == "paid" and item["chat_id"] == "1"
+    assert item["payload"]["old_status"] == "Current" and item["payload"]["new_status"] == "Resolved"
+
+
+def test_fanout_uses_denormalized_eligibility_and_falls_back_for_legacy_entries(monkeypatch):
+    monkeypatch.setattr(settings, "PAYMENTS_ENABLED", True)
+    entries = {"00000000001": {
+        "ok": {"user_id": "ok", "chat_id": "1", "activated": True, "subscription_status": "active"},
+        "lapsed": {"user_id": "lapsed", "chat_id": "2", "activated": True, "subscription_status": "canceled"},
+        "legacy": {"user_id": "legacy"},
+    }}
+    users = FakeDocs({"legacy": {"activated_at": "x", "telegram_chat_id": "3"}})
+    subs = FakeDocs({"legacy": {"status": "active"}})
+    outbox = MemoryOutbox()
+    fanout = AlertFanout(FakeWatcherDocs(entries), users, subs, outbox)
+
+    items = fanout.plan("00000000001", None, {"status": "Current", "snapshot_hash": "h"})
+    assert sorted((i["user_id"], i["chat_id"]) for i in items) == [("legacy", "3"), ("ok", "1")]
+    assert fanout.legacy_lookups == 1
+
+
+def test_fanout_pages_through_hot_ndcs_without_truncation(monkeypatch):
+    monkeypatch.setattr(settings, "PAYMENTS_ENABLED", False)
+    entries = {f"u{i:05d}": {"user_id": f"u{i:05d}", "chat_id": str(i), "activated": i % 10 != 0} for i in range(12_345)}
+    outbox = MemoryOutbox()
+    fanout = AlertFanout(FakeWatcherDocs({"00000000001": entries}), outbox=outbox, page_size=1000, workers=4)
+
+    stats = fanout.enqueue("00000000001", None, {"status": "Current", "snapshot_hash": "h"})
+    assert stats == {"pages": 13, "processed": 12_345, "skipped": 1_235, "enqueued": 11_110}
+    assert outbox.counts()["pending"] == 11_110
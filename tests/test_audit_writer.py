@@ -0,0 +1,87 @@
+import time
+
+from alerts.audit_writer import AuditWriter, alert_writes, trim_response
+from alerts.dispatch import AlertDispatcher
+
+
+class FakeBatch:
+    def __init__(self, db):
+        self.db = db
+        self.docs = []
+
+    def set(self, ref, data):
+        self.docs.append((ref, data))
+
+    def commit(self):
+        if self.db.fail:
+            raise RuntimeError("unavailable")
+        self.db.commits.append(self.docs)
+
+
+class FakeDB:
+    def __init__(self):
+        self.commits = []
+        self.fail = False
+
+    def batch(self):
+        return FakeBatch(self)
+
+    def collection(self, name):
+        return self
+
+    def document(self, doc_id):
+        return doc_id
+
+
+def _record(i):
+    return alert_writes(f"a{i}", {"i": i}, f"l{i}", {"i": i})
+
+
+def test_flushes_by_size_age_and_on_demand():
+    db, now = FakeDB(), [0.0]
+    writer = AuditWriter(db, max_records=3, max_age_seconds=10.0, clock=lambda: now[0])
+    for i in range(3):
+        writer.add(_record(i))
+    assert [len(c) for c in db.commits] == [6]  # size threshold: one batch for 3 attempts
+
+    writer.add(_record(3))
+    now[0] = 10.0
+    writer.add(_record(4))
+    assert [len(c) for c in db.commits] == [6, 4]  # age threshold
+
+    writer.add(_record(5))
+    assert writer.flush() == 2 and writer.flush() == 0
+    assert writer.stats == {"records": 6, "writes": 12, "commits": 3, "dropped": 0}
+
+
+def test_failed_commit_is_dropped_not_raised():
+    db = FakeDB()
+    writer = AuditWriter(db, max_records=100)
+    writer.add(_record(0))
+    db.fail = True
+    assert writer.flush() == 0
+    assert writer.stats["dropped"] == 2
+
+
+def test_dispatcher_buffers_trimmed_responses():
+    db = FakeDB()
+    dispatcher = AlertDispatcher(dispatcher=object(), audit=AuditWriter(db, max_records=100))
+    resp = {"ok": True, "result": {"message_id": 7, "chat": {"id": 1}, "text": "long alert text"}}
+    dispatcher.record("u1", {"ndc_digits": "00000000001", "new_status": "Current"}, resp)
+    assert db.commits == []
+    assert dispatcher.flush() == 2
+    (alert_ref, alert), (_, delivery_log) = db.commits[0]
+    assert alert["alert_id"] == alert_ref and alert["ok"] is True
+    assert delivery_log["resp"] == {"ok": True, "message_id": 7}
+    assert trim_response({"ok": False, "error_code": 429, "parameters": {"retry_after": 3}}) == \
+        {"ok": False, "error_code": 429, "retry_after": 3}
+
+
+def test_idle_writer_flushes_on_its_age_timer():
+    db = FakeDB()
+    writer = AuditWriter(db, max_records=100, max_age_seconds=0.05)
+    writer.add(_record(0))
+    deadline = time.monotonic() + 2.0
+    while not db.commits and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert [len(c) for c in db.commits] == [2]
@@ -0,0 +1,178 @@
+import hashlib
+import io
+import os
+import zipfile
+
+import pytest
+
+import ingest.dailymed_bulk as dailymed_bulk
+import ndc.index_artifact as index_artifact
+
+
+class FakeResponse:
+    def __init__(self, payload):
+        self.payload = payload
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def raise_for_status(self):
+        pass
+
+    def iter_content(self, chunk_size):
+        for i in range(0, len(self.payload), chunk_size):
+            yield self.payload[i:i + chunk_size]
+
+
+def _zip_bytes(members):
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w") as z:
+        for name, data in members.items():
+            z.writestr(name, data)
+    return buf.getvalue()
+
+
+def test_download_streams_to_disk_and_iterates_members(monkeypatch, tmp_path):
+    payload = _zip_bytes({"a/one.xml": b"<doc/>", "two.XML": b"<doc/>", "img.jpg": b"x"})
+    monkeypatch.setattr(dailymed_bulk.requests, "get", lambda url, stream, timeout: FakeResponse(payload))
+    monkeypatch.setattr(dailymed_bulk, "DOWNLOAD_CHUNK_BYTES", 7)
+
+    path, sha256, size = dailymed_bulk.download_bulk_zip("https://example.test/bulk.zip", dest_dir=str(tmp_path))
+    try:
+        assert size == len(payload)
+        assert sha256 == hashlib.sha256(payload).hexdigest()
+        assert sorted(name for name, _ in dailymed_bulk.iter_xml_files_from_zip(path)) == ["a/one.xml", "two.XML"]
+    finally:
+        os.unlink(path)
+
+
+def test_parallel_extraction_matches_serial(tmp_path):
+    spl = (
+        '<document xmlns="urn:hl7-org:v3"><manufacturedProduct><manufacturedProduct><name>Brand{i}</name>'
+        '<asContent><containerPackagedProduct><code code="12345-{i:04d}-01" codeSystem="2.16.840.1.113883.6.69"/>'
+        '</containerPackagedProduct></asContent></manufacturedProduct></manufacturedProduct></document>'
+    )
+    members = {f"spl/{i}.xml": spl.format(i=i).encode() for i in range(30)}
+    path = tmp_path / "bulk.zip"
+    path.write_bytes(_zip_bytes(members))
+
+    serial = dict(dailymed_bulk.iter_extracted_records(str(path), workers=1, batch_size=4))
+    parallel = dict(dailymed_bulk.iter_extracted_records(str(path), workers=2, batch_size=4))
+    assert parallel == serial
+    assert [r["ndc_digits"] for r in serial["spl/7.xml"]] == ["12345000701"]
+
+
+def _spl(*codes):
+    pkgs = "".join(
+        f'<asContent><containerPackagedProduct><code code="{c}" codeSystem="2.16.840.1.113883.6.69"/>'
+        f'</containerPackagedProduct></asContent>' for c in codes
+    )
+    return (
+        '<document xmlns="urn:hl7-org:v3"><manufacturedProduct><manufacturedProduct><name>B</name>'
+        f'{pkgs}</manufacturedProduct></manufacturedProduct></document>'
+    ).encode()
+
+
+class FakeIndexRepo:
+    def __init__(self):
+        self.upserted = []
+        self.deleted = []
+
+    def upsert_many(self, items, **kwargs):
+        self.upserted.extend(ndc for ndc, _ in items)
+        return {"written": len(items), "failed": 0, "failed_ndcs": []}
+
+    def delete_many(self, ndcs, **kwargs):
+        self.deleted.extend(ndcs)
+        return {"deleted": len(ndcs), "failed": 0, "failed_ndcs": []}
+
+    def iter_names(self):
+        return iter([])
+
+
+def test_incremental_reingest_writes_only_deltas(monkeypatch, tmp_path):
+    store = {}
+    repos = []
+    monkeypatch.setattr(dailymed_bulk, "blob_exists", lambda bucket, blob: blob in store)
+    monkeypatch.setattr(dailymed_bulk, "upload_file", lambda bucket, blob, path, content_type: store.setdefault(blob, b"zip"))
+    monkeypatch.setattr(dailymed_bulk, "load_manifest", lambda bucket: store.get("manifest") or dailymed_bulk.DailyMedManifest())
+    monkeypatch.setattr(dailymed_bulk, "save_manifest", lambda bucket, m: store.__setitem__("manifest", m))
+    monkeypatch.setattr(dailymed_bulk, "parse_workers", lambda: 1)
+    monkeypatch.setattr(index_artifact, "download_bytes", lambda bucket, blob: store.get(blob))
+    monkeypatch.setattr(index_artifact, "upload_bytes", lambda bucket, blob, content: store.__setitem__(blob, content))
+
+    real_writer = dailymed_bulk.NDCIndexWriter
+
+    def _writer():
+        repos.append(FakeIndexRepo())
+        return real_writer(repo=repos[-1])
+    monkeypatch.setattr(dailymed_bulk, "NDCIndexWriter", _writer)
+
+    def _run(members, full=False):
+        path = tmp_path / "bulk.zip"
+        payload = _zip_bytes(members)
+        path.write_bytes(payload)
+        return dailymed_bulk._index_zip(str(path), hashlib.sha256(payload).hexdigest(), len(payload), "bucket", full=full)
+
+    v1 = {"a.xml": _spl("11111-1111-11"), "b.xml": _spl("22222-2222-22", "33333-3333-33"), "c.xml": _spl("44444-4444-44")}
+    first = _run(v1)
+    assert first["members_changed"] == 3 and sorted(repos[-1].upserted) == ["11111111111", "22222222222", "33333333333", "44444444444"]
+
+    assert _run(v1)["skipped"] == "archive_unchanged"
+
+    # b drops one NDC and c disappears; 22222 is now also listed by a new member d.
+    v2 = {"a.xml": v1["a.xml"], "b.xml": _spl("22222-2222-22"), "d.xml": _spl("22222-2222-22")}
+    second = _run(v2)
+    assert (second["members_changed"], second["members_removed"]) == (2, 1)
+    assert repos[-1].upserted == ["22222222222"]
+    assert sorted(repos[-1].deleted) == ["33333333333", "44444444444"]
+    assert sorted(store["manifest"].members) == ["a.xml", "b.xml", "d.xml"]
+    assert len([k for k in store if k.startswith("dailymed/sha256/")]) == 2
+    artifact = index_artifact.NDCIndexArtifact(store[index_artifact.ARTIFACT_BLOB])
+    assert [ndc for ndc, _ in artifact.items()] == ["11111111111", "22222222222"]
+
+    # A full run re-parses every member but still deletes what a removed member listed.
+    v3 = {"b.xml": v2["b.xml"], "d.xml": v2["d.xml"]}
+    third = _run(v3, full=True)
+    assert (third["members_changed"], third["members_removed"]) == (2, 1)
+    assert repos[-1].upserted == ["22222222222"] and repos[-1].deleted == ["11111111111"]
+
+
+
+def test_failed_artifact_publish_keeps_the_old_manifest(monkeypatch, tmp_path):
+    store = {}
+    real_writer = dailymed_bulk.NDCIndexWriter
+    monkeypatch.setattr(dailymed_bulk, "blob_exists", lambda bucket, blob: blob in store)
+    monkeypatch.setattr(dailymed_bulk, "upload_file", lambda bucket, blob, path, content_type: store.setdefault(blob, b"zip"))
+    monkeypatch.setattr(dailymed_bulk, "load_manifest", lambda bucket: dailymed_bulk.DailyMedManifest())
+    monkeypatch.setattr(dailymed_bulk, "save_manifest", lambda bucket, m: store.__setitem__("manifest", m))
+    monkeypatch.setattr(dailymed_bulk, "parse_workers", lambda: 1)
+    monkeypatch.setattr(dailymed_bulk, "NDCIndexWriter", lambda: real_writer(repo=FakeIndexRepo()))
+    monkeypatch.setattr(index_artifact, "download_bytes", lambda bucket, blob: None)
+
+    def _upload(bucket, blob, content):
+        raise RuntimeError("gcs unavailable")
+    monkeypatch.setattr(index_artifact, "upload_bytes", _upload)
+
+    path = tmp_path / "bulk.zip"
+    payload = _zip_bytes({"a.xml": _spl("11111-1111-11")})
+    path.write_bytes(payload)
+    with pytest.raises(RuntimeError):
+        dailymed_bulk._index_zip(str(path), hashlib.sha256(payload).hexdigest(), len(payload), "bucket")
+    assert "manifest" not in store
+
+
+def test_download_range_leaves_an_oversized_whole_file_reply_unread(monkeypatch, tmp_path):
+    class WholeFile(FakeResponse):
+        status_code = 200
+        headers = {"Content-Length": "5000"}
+
+        def iter_content(self, chunk_size):
+            raise AssertionError("body read")
+
+    monkeypatch.setattr(dailymed_bulk.requests, "get", lambda url, headers, stream, timeout: WholeFile(b""))
+    res = dailymed_bulk.download_range("https://example.test/bulk.zip", str(tmp_path / "part"), 0, 1000)
+    assert (res["ranged"], res["bytes"], res["total"]) == (False, 0, 5000)
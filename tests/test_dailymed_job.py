@@ -0,0 +1,207 @@
+import hashlib
+import io
+import os
+import zipfile
+
+import pytest
+
+import ingest.dailymed_bulk as dailymed_bulk
+import ingest.dailymed_job as dailymed_job
+import ndc.index_artifact as index_artifact
+from config.settings import settings
+from repos.dailymed_job_repo import LeaseLostError
+
+
+def _spl(*codes):
+    pkgs = "".join(
+        f'<asContent><containerPackagedProduct><code code="{c}" codeSystem="2.16.840.1.113883.6.69"/>'
+        f'</containerPackagedProduct></asContent>' for c in codes
+    )
+    return (
+        '<document xmlns="urn:hl7-org:v3"><manufacturedProduct><manufacturedProduct><name>B</name>'
+        f'{pkgs}</manufacturedProduct></manufacturedProduct></document>'
+    ).encode()
+
+
+class FakeJobRepo:
+    def __init__(self):
+        self.doc = None
+
+    def get(self):
+        return dict(self.doc) if self.doc else None
+
+    def start(self, cursor):
+        if self.doc and self.doc["status"] == "running":
+            return dict(self.doc)
+        self.doc = dict(cursor)
+        return None
+
+    def checkpoint(self, updates, owner, lease_seconds):
+        if self.doc.get("lease_owner") != owner:
+            raise LeaseLostError(owner)
+        self.doc.update(updates, slices=self.doc["slices"] + 1)
+        return dict(self.doc)
+
+    def claim(self, job_id, owner, lease_seconds):
+        if self.doc["job_id"] != job_id or self.doc.get("lease_owner") not in (None, owner):
+            return False
+        self.doc["lease_owner"] = owner
+        return True
+
+    def release(self, owner):
+        if self.doc.get("lease_owner") == owner:
+            self.doc["lease_owner"] = None
+
+    def abandon(self, reason):
+        if not self.doc or self.doc["status"] != "running":
+            return None
+        self.doc.update(status="failed", last_error=reason, lease_owner=None)
+        return dict(self.doc)
+
+
+class FakeIndexRepo:
+    def __init__(self):
+        self.docs = {}
+
+    def upsert_many(self, items, **kwargs):
+        self.docs.update(items)
+        return {"written": len(items), "failed": 0, "failed_ndcs": []}
+
+    def delete_many(self, ndcs, **kwargs):
+        for n in ndcs:
+            self.docs.pop(n, None)
+        return {"deleted": len(ndcs), "failed": 0, "failed_ndcs": []}
+
+    def iter_names(self):
+        return iter(list(self.docs.items()))
+
+
+def _patch_job(monkeypatch, tmp_path, payload, gcs, index):
+    def _download_range(url, path, offset, max_bytes, etag=None):
+        # A server that caps range responses at 300 bytes, so the zip takes several slices.
+        body = payload[offset: offset + min(max_bytes, 300)]
+        with open(path, "wb") as f:
+            f.write(body)
+        return {"start": offset, "bytes": len(body), "total": len(payload),
+                "complete": offset + len(body) >= len(payload), "etag": '"v1"', "ranged": True}
+
+    def _download_file(b, blob, path):
+        with open(path, "wb") as f:
+            f.write(gcs[blob])
+
+    def _upload_file(b, blob, path, content_type="application/octet-stream"):
+        with open(path, "rb") as f:
+            gcs[blob] = f.read()
+
+    monkeypatch.setattr(settings, "DAILYMED_TMP_DIR", str(tmp_path))
+    monkeypatch.setattr(settings, "DAILYMED_PARSE_BATCH_SIZE", 2)
+    monkeypatch.setattr(settings, "NDC_INDEX_WRITE_BATCH_SIZE", 2)
+    monkeypatch.setattr(dailymed_job, "parse_workers", lambda: 1)
+    monkeypatch.setattr(dailymed_job, "download_range", _download_range)
+    monkeypatch.setattr(dailymed_job, "upload_file", _upload_file)
+    monkeypatch.setattr(dailymed_job, "delete_blobs", lambda b, names: [gcs.pop(n) for n in names])
+    monkeypatch.setattr(dailymed_job, "upload_bytes", lambda b, blob, content, content_type: gcs.__setitem__(blob, content))
+    monkeypatch.setattr(dailymed_job, "download_bytes", lambda b, blob: gcs.get(blob))
+    monkeypatch.setattr(dailymed_job, "download_file", _download_file)
+    monkeypatch.setattr(dailymed_job, "save_manifest", lambda b, m: gcs.__setitem__("manifest", m))
+    monkeypatch.setattr(index_artifact, "download_bytes", lambda b, blob: gcs.get(blob))
+    monkeypatch.setattr(index_artifact, "upload_bytes", lambda b, blob, content: gcs.__setitem__(blob, content))
+    monkeypatch.setattr(dailymed_bulk, "blob_exists", lambda b, blob: blob in gcs)
+    monkeypatch.setattr(dailymed_bulk, "compose_blobs",
+                        lambda b, sources, blob, content_type: gcs.__setitem__(blob, b"".join(gcs[s] for s in sources)))
+    real_writer = dailymed_job.NDCIndexWriter
+    monkeypatch.setattr(dailymed_job, "NDCIndexWriter", lambda: real_writer(repo=index))
+
+
+def _bulk_zip():
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w") as z:
+        for i in range(5):
+            z.writestr(f"spl/{i}.xml", _spl(f"12345-{i:04d}-01", "99999-9999-99"))
+    return buf.getvalue()
+
+
+def test_job_resumes_across_invocations_without_local_files(monkeypatch, tmp_path):
+    gcs = {}
+    index = FakeIndexRepo()
+    payload = _bulk_zip()
+    sha = hashlib.sha256(payload).hexdigest()
+    _patch_job(monkeypatch, tmp_path, payload, gcs, index)
+
+    repo = FakeJobRepo()
+    started = dailymed_job.start_job("https://example.test/bulk.zip", "bucket", repo=repo)
+    assert started["started"] and started["phase"] == "download"
+    refused = dailymed_job.start_job("https://example.test/bulk.zip", "bucket", repo=repo)
+    assert not refused["started"] and refused["job_id"] == started["job_id"]
+
+    invocations = 0
+    while repo.doc["status"] != "done":
+        # Each invocation is a "fresh instance": no local download or zip, no in-memory state.
+        for p in tmp_path.glob("dailymed_*"):
+            os.unlink(p)
+        progress = dailymed_job.run_job(budget_seconds=0, repo=repo)
+        invocations += 1
+        assert invocations < 50
+
+    assert len(payload) > 600 and repo.doc["download_offset"] == len(payload)
+    assert invocations > 5  # one checkpointed step per invocation
+    assert progress["status"] == "done" and progress["eta_seconds"] == 0.0
+    assert progress["sha256"] == sha and progress["members_total"] == 5
+    assert gcs[f"dailymed/sha256/{sha}.zip"] == payload
+    assert not [b for b in gcs if "/download/" in b]
+    assert sorted(index.docs) == ["12345000001", "12345000101", "12345000201", "12345000301", "12345000401", "99999999999"]
+    assert index.docs["99999999999"]["spl_xml_source"] == "spl/0.xml"
+    assert sorted(gcs["manifest"].members) == [f"spl/{i}.xml" for i in range(5)]
+    assert len(index_artifact.NDCIndexArtifact(gcs[index_artifact.ARTIFACT_BLOB])) == 6
+
+
+def test_step_is_discarded_when_lease_is_lost(monkeypatch, tmp_path):
+    gcs = {}
+    payload = _bulk_zip()
+    _patch_job(monkeypatch, tmp_path, payload, gcs, FakeIndexRepo())
+    repo = FakeJobRepo()
+    dailymed_job.start_job("https://example.test/bulk.zip", "bucket", repo=repo)
+
+    def _claim_then_lose(job_id, owner, lease_seconds):
+        # Our lease "expires" right after the claim and another runner takes it.
+        repo.doc["lease_owner"] = "other"
+        return True
+
+    monkeypatch.setattr(repo, "claim", _claim_then_lose)
+    progress = dailymed_job.run_job(budget_seconds=0, repo=repo)
+    assert progress["reason"] == "lease_lost"
+    assert repo.doc["download_offset"] == 0 and repo.doc["slices"] == 0
+
+
+def test_job_fails_after_repeated_step_errors_and_can_be_abandoned(monkeypatch, tmp_path):
+    gcs = {}
+    _patch_job(monkeypatch, tmp_path, _bulk_zip(), gcs, FakeIndexRepo())
+    monkeypatch.setattr(settings, "DAILYMED_JOB_MAX_CONSECUTIVE_ERRORS", 2)
+
+    def _broken(url, path, offset, max_bytes, etag=None):
+        raise OSError("connection reset")
+    monkeypatch.setattr(dailymed_job, "download_range", _broken)
+    repo = FakeJobRepo()
+    dailymed_job.start_job("https://example.test/bulk.zip", "bucket", repo=repo)
+
+    for _ in range(2):
+        with pytest.raises(OSError):
+            dailymed_job.run_job(budget_seconds=0, repo=repo)
+    assert repo.doc["status"] == "failed" and repo.doc["consecutive_errors"] == 2
+    assert dailymed_job.start_job("https://example.test/bulk.zip", "bucket", repo=repo)["started"]
+
+    assert dailymed_job.abandon_job("stuck", repo=repo)["abandoned"]
+    assert repo.doc["status"] == "failed" and repo.doc["last_error"] == "stuck"
+    assert not dailymed_job.abandon_job(repo=repo)["abandoned"]
+
+
+def test_job_fails_instead_of_downloading_a_whole_file_reply(monkeypatch, tmp_path):
+    gcs = {}
+    _patch_job(monkeypatch, tmp_path, _bulk_zip(), gcs, FakeIndexRepo())
+    monkeypatch.setattr(dailymed_job, "download_range", lambda url, path, offset, max_bytes, etag=None: {
+        "start": 0, "bytes": 0, "total": 10 ** 10, "complete": False, "etag": None, "ranged": False})
+    repo = FakeJobRepo()
+    dailymed_job.start_job("https://example.test/bulk.zip", "bucket", repo=repo)
+
+    progress = dailymed_job.run_job(budget_seconds=None, repo=repo)
+    assert progress["status"] == "failed" and "Range" in progress["last_error"]
@@ -0,0 +1,94 @@
+import pytest
+
+from alerts.delivery_claims import (
+    CLAIM_ALREADY_SENT,
+    CLAIM_IN_FLIGHT,
+    CLAIM_OK,
+    MemoryDeliveryClaims,
+    SQLiteDeliveryClaims,
+    claims_for,
+    delivery_key,
+)
+from alerts.outbox import MemoryOutbox, new_outbox_item
+from alerts.outbox_worker import OutboxWorker
+from repos.rate_limit_repo import RateCounter
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def claims(request):
+    if request.param == "memory":
+        return MemoryDeliveryClaims(stale_seconds=60)
+    return SQLiteDeliveryClaims(":memory:", stale_seconds=60)
+
+
+def _claim(key):
+    return [{"key": key, "user_id": "u1", "ndc_digits": "00000000001"}]
+
+
+def test_claim_lifecycle(claims):
+    key = delivery_key("u1", "00000000001", "h1")
+    assert key == delivery_key("u1", "00000000001", "h1") != delivery_key("u1", "00000000001", "h2")
+
+    assert claims.claim_many(_claim(key), "w1", now=0.0) == {key: CLAIM_OK}
+    assert claims.claim_many(_claim(key), "w2", now=10.0) == {key: CLAIM_IN_FLIGHT}
+    claims.finish_many({key: False}, now=11.0)  # failed sends can be claimed by the retry
+    assert claims.claim_many(_claim(key), "w2", now=12.0) == {key: CLAIM_OK}
+    claims.finish_many({key: True}, now=13.0)
+    assert claims.claim_many(_claim(key), "w3", now=1000.0) == {key: CLAIM_ALREADY_SENT}
+    assert claims.get(key)["attempts"] == 2 and claims.get(key)["owner"] == "w2"
+
+
+def test_a_claimer_that_died_mid_send_goes_stale(claims):
+    key = delivery_key("u1", "00000000001", "h1")
+    claims.claim_many(_claim(key), "w1", now=0.0)
+    assert claims.claim_many(_claim(key), "w2", now=59.0) == {key: CLAIM_IN_FLIGHT}
+    assert claims.claim_many(_claim(key), "w2", now=60.0) == {key: CLAIM_OK}
+
+
+class CountingEngine:
+    def __init__(self):
+        self.sent = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        pass
+
+    async def send_many(self, messages):
+        self.sent += [chat_id for chat_id, _ in messages]
+        return [{"ok": True} for _ in messages]
+
+
+class NoAudit:
+    def record(self, user_id, payload, resp, alert_id=None):
+        pass
+
+    def flush(self):
+        return 0
+
+
+class NoQuota:
+    def load_many(self, user_ids, day_key):
+        return {u: RateCounter() for u in user_ids}
+
+    def commit_many(self, day_key, counters):
+        return {u: object() for u in counters}
+
+
+def test_items_released_by_an_expired_lease_are_not_sent_twice():
+    outbox, claims, engine = MemoryOutbox(), MemoryDeliveryClaims(stale_seconds=600), CountingEngine()
+    items = [new_outbox_item(u, f"chat-{u}", {"ndc_digits": "00000000001"}, "h1", now=0.0) for u in ("a", "b", "c")]
+    outbox.enqueue_many(items)
+    # Worker "w1" claimed a and b; it delivered a and is still sending b when its lease runs out.
+    claims.claim_many(claims_for(items[:2]), "w1", now=0.0)
+    claims.finish_many({items[0]["item_id"]: True}, now=1.0)
+
+    worker = OutboxWorker(outbox, NoAudit(), NoQuota(), owner="w2", clock=lambda: 130.0,
+                          engine_factory=lambda: engine, deliveries=claims)
+    counts = worker.run_once()
+    assert engine.sent == ["chat-c"]
+    assert {k: counts[k] for k in ("duplicate", "retry", "sent")} == {"duplicate": 1, "retry": 1, "sent": 1}
+    assert outbox.counts() == {"pending": 1, "done": 2, "dead": 0}
+    assert claims.get(items[2]["item_id"])["state"] == "sent"
+    assert outbox.get(items[0]["item_id"])["outcome"] == "duplicate"
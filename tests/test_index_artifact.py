@@ -0,0 +1,89 @@
+import ndc.index_artifact as index_artifact
+from config.settings import settings
+from ndc.cache import ResolverCache
+from ndc.index_artifact import NDCIndexArtifact, build_index_artifact
+from ndc.resolver import NDCResolver
+
+
+class NoReads:
+    def get(self, ndc):
+        raise AssertionError("firestore read")
+
+    def get_many(self, ndcs):
+        return {}
+
+
+def test_artifact_roundtrip_via_mmap_and_resolver(tmp_path):
+    docs = [
+        ("00002322730", {"brand_name": "Humalog", "generic_name": "insulin lispro", "manufacturer": "Eli Lilly"}),
+        ("00002751001", {"brand_name": "Humalog Mix", "generic_name": "insulin lispro", "manufacturer": "Eli Lilly"}),
+        ("12345678901", {"brand_name": "", "generic_name": "épinéphrine", "manufacturer": None}),
+        ("bad", {"brand_name": "ignored"}),
+    ]
+    path = tmp_path / "ndc_index.bin"
+    path.write_bytes(build_index_artifact(docs))
+    art = NDCIndexArtifact.open(str(path))
+
+    assert len(art) == 3
+    assert art.get("00002751001")["brand_name"] == "Humalog Mix"
+    assert art.get("12345678901") == {"ndc_digits": "12345678901", "source": "dailymed_bulk",
+                                      "brand_name": "", "generic_name": "épinéphrine", "manufacturer": ""}
+    assert art.get("00002322731") is None and art.get("99999999999") is None and art.get("1") is None
+
+    resolver = NDCResolver(repo=NoReads(), overrides=NoReads(), artifact=art)
+    out = resolver.resolve_many(["00002322730", "55555555555"], [{}, {"brand_name": "FDA"}])
+    assert [r["brand_name"] for r in out] == ["Humalog", "FDA"]
+
+
+def test_shared_artifact_maps_one_file_per_generation(monkeypatch, tmp_path):
+    blob = build_index_artifact([("00002322730", {"brand_name": "Humalog"})])
+    downloads = []
+    generation = {"value": 7}
+
+    def _download(bucket, name, path, generation=None):
+        downloads.append(generation)
+        with open(path, "wb") as f:
+            f.write(blob)
+
+    monkeypatch.setattr(settings, "NDC_INDEX_ARTIFACT_BUCKET", "bucket")
+    monkeypatch.setattr(settings, "NDC_INDEX_ARTIFACT_REFRESH_SECONDS", 0)
+    monkeypatch.setattr(settings, "DAILYMED_TMP_DIR", str(tmp_path))
+    monkeypatch.setattr(index_artifact, "blob_generation", lambda bucket, name: generation["value"])
+    monkeypatch.setattr(index_artifact, "download_file", _download)
+    monkeypatch.setattr(index_artifact, "_shared", None)
+    monkeypatch.setattr(index_artifact, "_shared_generation", None)
+    monkeypatch.setattr(index_artifact, "_shared_loaded_at", 0.0)
+
+    first = index_artifact.shared_index_artifact()
+    assert first.source == str(tmp_path / "ndc_index_7.bin")
+    # Another process on the host (simulated by forgetting the loaded copy) maps the same file.
+    monkeypatch.setattr(index_artifact, "_shared_generation", None)
+    assert index_artifact.shared_index_artifact().source == first.source
+    assert downloads == [7]
+
+    generation["value"] = 8
+    assert index_artifact.shared_index_artifact().get("00002322730")["brand_name"] == "Humalog"
+    assert downloads == [7, 8]
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["ndc_index_8.bin"]
+
+
+class IndexDocs:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def get(self, ndc):
+        return self.docs.get(ndc)
+
+    def get_many(self, ndcs):
+        return {n: self.docs[n] for n in ndcs if n in self.docs}
+
+
+def test_resolver_reads_firestore_for_artifact_misses():
+    art = NDCIndexArtifact(build_index_artifact([("00002322730", {"brand_name": "Humalog"})]))
+    repo = IndexDocs({"00002322730": {"brand_name": "stale"},
+                      "55555555555": {"ndc_digits": "55555555555", "brand_name": "Newer", "source": "dailymed_bulk"}})
+    resolver = NDCResolver(repo=repo, overrides=NoReads(), cache=ResolverCache(), artifact=art)
+
+    out = resolver.resolve_many(["00002322730", "55555555555"])
+    assert [r["brand_name"] for r in out] == ["Humalog", "Newer"]
+    assert resolver.resolve_from_index("55555555555")["brand_name"] == "Newer"
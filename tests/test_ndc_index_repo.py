@@ -0,0 +1,42 @@
+from types import SimpleNamespace
+
+import repos.ndc_index_repo as ndc_index_repo
+
+
+class FakeBulkWriter:
+    def __init__(self, failing):
+        self.failing = failing
+        self.on_error = None
+
+    def on_write_error(self, callback):
+        self.on_error = callback
+
+    def delete(self, ref):
+        if ref.id in self.failing:
+            failure = SimpleNamespace(attempts=5, operation=SimpleNamespace(reference=ref))
+            assert self.on_error(failure, self) is False
+
+    def close(self):
+        pass
+
+
+class FakeDb:
+    def __init__(self, writer):
+        self.writer = writer
+
+    def bulk_writer(self, options=None):
+        return self.writer
+
+    def collection(self, name):
+        return SimpleNamespace(document=lambda doc_id: SimpleNamespace(id=doc_id))
+
+
+def test_delete_many_reports_failures_and_keeps_them_cached(monkeypatch):
+    invalidated = []
+    monkeypatch.setattr(ndc_index_repo, "invalidate_index", lambda ndcs: invalidated.extend(ndcs))
+    repo = ndc_index_repo.NDCIndexRepository(db=FakeDb(FakeBulkWriter({"22222222222"})))
+
+    res = repo.delete_many(["11111111111", "22222222222", "33333333333"])
+
+    assert res == {"deleted": 2, "failed": 1, "failed_ndcs": ["22222222222"]}
+    assert invalidated == ["11111111111", "33333333333"]
@@ -0,0 +1,54 @@
+from config.settings import settings
+from ingest.ndc_index_writer import NDCIndexWriter, merge_index_records
+
+
+class FakeIndexRepo:
+    def __init__(self):
+        self.calls = []
+
+    def upsert_many(self, items, flush_every, max_ops_per_second, max_attempts):
+        items = list(items)
+        self.calls.append(items)
+        return {"written": len(items), "failed": 0, "failed_ndcs": []}
+
+
+def _rec(ndc, brand="", generic="", mfg=""):
+    return {"ndc_digits": ndc, "brand_name": brand, "generic_name": generic, "manufacturer": mfg}
+
+
+def test_merge_prefers_complete_then_stable_source():
+    a = {**_rec("1", brand="A"), "spl_xml_source": "b.xml"}
+    b = {**_rec("1", brand="B", generic="g"), "spl_xml_source": "z.xml"}
+    c = {**_rec("1", brand="C", generic="g"), "spl_xml_source": "a.xml"}
+    assert merge_index_records(merge_index_records(a, b), c) is c
+    assert merge_index_records(merge_index_records(c, b), a) is c
+
+
+def test_writer_dedupes_and_writes_once():
+    repo = FakeIndexRepo()
+    w = NDCIndexWriter(repo=repo)
+    w.add(_rec("00000000001", brand="X"), "one.xml")
+    w.add(_rec("00000000001", brand="X", generic="x"), "two.xml")
+    w.add(_rec("00000000002"), "two.xml")
+    stats = w.close()
+
+    assert len(repo.calls) == 1
+    written = dict(repo.calls[0])
+    assert written["00000000001"]["spl_xml_source"] == "two.xml"
+    assert len({d["updated_at"] for d in written.values()}) == 1
+    assert stats["records_seen"] == 3
+    assert stats["unique_ndcs"] == 2
+    assert stats["duplicates_merged"] == 1
+
+
+def test_updated_at_is_stamped_per_flush_batch(monkeypatch):
+    monkeypatch.setattr(settings, "NDC_INDEX_WRITE_BATCH_SIZE", 2)
+    repo = FakeIndexRepo()
+    w = NDCIndexWriter(repo=repo)
+    for i in range(5):
+        w.add(_rec(f"0000000000{i}", brand="X"), "one.xml")
+    w.close()
+
+    stamps = [doc["updated_at"] for _, doc in repo.calls[0]]
+    assert stamps[0] == stamps[1] and stamps[2] == stamps[3]
+    assert stamps == sorted(stamps)
@@ -1,5 +1,22 @@
-from ndc.normalizer import normalize_ndc_to_11
+from ndc.normalizer import legacy_ndc_key, normalize_many, normalize_ndc_to_11
+from ops.ndc_rekey import build_rekey_map
 
 def test_normalize_ndc_to_11():
     assert normalize_ndc_to_11("1234-5678-90") == "01234567890"
     assert normalize_ndc_to_11("01234567890") == "01234567890"
+
+
+def test_segment_aware_conversion_and_batch():
+    assert normalize_ndc_to_11("12345-678-90") == "12345067890"
+    assert normalize_ndc_to_11("12345-6789-0") == "12345678900"
+    assert normalize_ndc_to_11("12345-6789-01") == "12345678901"
+    assert legacy_ndc_key("12345-678-90") == "01234567890"
+    assert normalize_many(["1234-5678-90", "", "12345-678-90", "1234-5678-90", "x"]) == [
+        "01234567890", "", "12345067890", "01234567890", "",
+    ]
+
+
+def test_rekey_map_moves_unambiguous_keys_only():
+    assert build_rekey_map(["12345-678-90", "1234-5678-91"]) == ({"01234567890": "12345067890"}, set())
+    # 1234-5678-90 already lives under 01234567890, so that legacy key is ambiguous.
+    assert build_rekey_map(["12345-678-90", "1234-5678-90"]) == ({}, {"01234567890"})
@@ -0,0 +1,13 @@
+from ops.ndc_rekey import build_rekey_map
+
+
+def test_rekey_map_moves_only_unambiguous_keys():
+    mapping, ambiguous = build_rekey_map([
+        "12345-678-90",   # legacy 01234567890, but 1234-5678-90 below claims the same legacy key
+        "1234-5678-90",
+        "54321-9876-5",   # 5-4-1: legacy 05432198765 → 54321987605
+        "54321-9876-5",
+        "11111-2222-33",  # already 11 digits: unchanged
+    ])
+    assert mapping == {"05432198765": "54321987605"}
+    assert ambiguous == {"01234567890"}
@@ -0,0 +1,128 @@
+import threading
+
+from config.settings import settings
+from ndc.search_index import NDCSearchService, ndc_prefix
+
+
+class Source:
+    """Loader fake: returns docs with updated_at at or after the watermark."""
+
+    def __init__(self, docs):
+        self.docs = docs
+
+    def __call__(self, since):
+        return [(n, d) for n, d in self.docs.items() if since is None or d["updated_at"] >= since]
+
+
+INDEX = {
+    "00002143480": {"brand_name": "Humalog", "generic_name": "insulin lispro", "manufacturer": "Lilly", "updated_at": "t1"},
+    "00002751001": {"brand_name": "Humalog Mix75/25", "generic_name": "insulin lispro protamine", "manufacturer": "Lilly", "updated_at": "t1"},
+    "00169750111": {"brand_name": "Novolog", "generic_name": "insulin aspart", "manufacturer": "Novo", "updated_at": "t1"},
+    "12345067890": {"brand_name": "Adderall", "generic_name": "amphetamine", "manufacturer": "Teva", "updated_at": "t1"},
+}
+SHORTAGES = {
+    "12345067890": {"brand_name": "", "generic_name": "amphetamine", "status": "Current", "updated_at": "t1"},
+    "55555000101": {"brand_name": "Rare", "generic_name": "orphanol", "status": "Resolved", "updated_at": "t1"},
+}
+
+
+def _service(index=None, shortages=None):
+    svc = NDCSearchService(Source(dict(index or INDEX)), Source(dict(shortages or SHORTAGES)))
+    svc.rebuild()
+    return svc
+
+
+def _ndcs(result):
+    return [i["ndc_digits"] for i in result["items"]]
+
+
+def test_ndc_prefix_pads_finished_segments():
+    assert ndc_prefix("12345") == "12345"
+    assert ndc_prefix("2-") == "00002"
+    assert ndc_prefix("0002-7510") == "000027510"
+    assert ndc_prefix("2-751-") == "000020751"
+
+
+def test_prefix_and_labeler_search_merge_index_and_shortages():
+    svc = _service()
+    assert _ndcs(svc.search("00002")) == ["00002143480", "00002751001"]
+    assert _ndcs(svc.search("0002-7")) == ["00002751001"]
+    hit = svc.search("1234506")["items"][0]
+    assert hit["brand_name"] == "Adderall" and hit["status"] == "Current"
+    assert _ndcs(svc.search("55555")) == ["55555000101"]  # shortage-only NDC
+    assert svc.search("99")["items"] == []
+
+
+def test_name_search_requires_all_words_with_last_as_prefix():
+    svc = _service()
+    assert _ndcs(svc.search("insulin")) == ["00002143480", "00002751001", "00169750111"]
+    assert _ndcs(svc.search("insulin lis")) == ["00002143480", "00002751001"]
+    assert _ndcs(svc.search("HUMALOG mix")) == ["00002751001"]
+    assert svc.search("insulin zzz")["items"] == []
+    assert svc.search("  ")["items"] == []
+
+
+def test_keyset_pagination_walks_all_results_once():
+    svc = _service()
+    seen, cursor = [], None
+    while True:
+        page = svc.search("insulin", limit=2, cursor=cursor)
+        seen += _ndcs(page)
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert seen == ["00002143480", "00002751001", "00169750111"]
+
+
+def test_refresh_applies_delta_then_compacts(monkeypatch):
+    index = dict(INDEX)
+    svc = NDCSearchService(Source(index), Source(dict(SHORTAGES)))
+    svc.rebuild()
+    snapshot = svc.snapshot
+    published = svc.delta
+
+    index["00169750111"] = {**index["00169750111"], "brand_name": "Novolog Flexpen", "updated_at": "t2"}
+    index["00002999901"] = {"brand_name": "Lyumjev", "generic_name": "insulin lispro-aabc", "manufacturer": "Lilly", "updated_at": "t2"}
+    assert svc.refresh() == 2
+    assert svc.snapshot is snapshot and len(svc.delta) == 2
+    assert published == {}  # a search still holding the old state never sees it change
+    assert _ndcs(svc.search("flex")) == ["00169750111"]
+    assert _ndcs(svc.search("insulin lispro")) == ["00002143480", "00002751001", "00002999901"]
+    assert _ndcs(svc.search("0000", limit=2, cursor="00002751001")) == ["00002999901"]
+    assert svc.refresh() == 0  # watermark advanced
+
+    monkeypatch.setattr(settings, "NDC_SEARCH_DELTA_MAX", 0)
+    index["12345067890"] = {**index["12345067890"], "updated_at": "t3"}
+    svc.refresh()
+    assert svc.snapshot is not snapshot and svc.delta == {}
+    assert len(svc.snapshot) == 6
+    assert _ndcs(svc.search("flex")) == ["00169750111"]
+
+
+def test_refresh_picks_up_docs_written_later_with_the_watermark_timestamp():
+    index = {"00002143480": {"brand_name": "Humalog", "updated_at": "t1"}}
+    svc = NDCSearchService(Source(index), Source({}))
+    svc.rebuild()
+
+    # The rest of the same batch lands after the refresh that saw its first doc.
+    index["00169750111"] = {"brand_name": "Novolog", "updated_at": "t1"}
+    assert svc.refresh() == 1
+    assert _ndcs(svc.search("novolog")) == ["00169750111"]
+    assert svc.refresh() == 0 and svc.delta.keys() == {"00169750111"}
+
+
+def test_ensure_fresh_builds_off_the_request_thread(monkeypatch):
+    release = threading.Event()
+    index = Source(dict(INDEX))
+
+    def slow_index(since):
+        release.wait(5)
+        return index(since)
+
+    svc = NDCSearchService(slow_index, Source(dict(SHORTAGES)))
+    svc.ensure_fresh()
+    assert svc.search("humalog")["items"] == []  # not built yet; the call did not wait
+    release.set()
+    with svc._lock:
+        pass
+    assert _ndcs(svc.search("humalog")) == ["00002143480", "00002751001"]
@@ -0,0 +1,33 @@
+import asyncio
+
+import httpx
+
+from ingest.openfda_client import fetch_shortages_page_async
+
+
+def _run(handler, skip=0):
+    async def go():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            return await fetch_shortages_page_async(client, skip=skip, limit=100, max_retries=3, backoff_base=0)
+    return asyncio.run(go())
+
+
+def test_retries_429_then_succeeds():
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        if len(calls) < 3:
+            return httpx.Response(429)
+        return httpx.Response(200, json={"meta": {"results": {"total": 1}}, "results": [{"package_ndc": "1"}]})
+
+    results, meta = _run(handler)
+    assert len(calls) == 3
+    assert results == [{"package_ndc": "1"}]
+    assert meta["results"]["total"] == 1
+
+
+def test_404_is_end_of_results():
+    results, meta = _run(lambda request: httpx.Response(404), skip=500)
+    assert results == []
+    assert meta["status"] == "eof_404"
@@ -0,0 +1,29 @@
+from datetime import datetime, timedelta, timezone
+
+from config.settings import settings
+from ingest.poll_scheduler import feed_fingerprint, is_due, next_interval
+
+
+def test_interval_backs_off_and_resets(monkeypatch):
+    monkeypatch.setattr(settings, "POLL_INTERVAL_FLOOR_SECONDS", 300)
+    monkeypatch.setattr(settings, "POLL_INTERVAL_CEILING_SECONDS", 3600)
+    monkeypatch.setattr(settings, "POLL_INTERVAL_BACKOFF_FACTOR", 2.0)
+    assert next_interval(None, changed=False) == 300
+    assert next_interval(300, changed=False) == 600
+    assert next_interval(2400, changed=False) == 3600
+    assert next_interval(3600, changed=True) == 300
+
+
+def test_is_due():
+    now = datetime(2024, 3, 1, tzinfo=timezone.utc)
+    assert is_due({}, now)
+    assert not is_due({"next_poll_due_at": (now + timedelta(minutes=5)).isoformat()}, now)
+    assert is_due({"next_poll_due_at": (now - timedelta(seconds=1)).isoformat()}, now)
+
+
+def test_fingerprint_tracks_newest_record_and_total():
+    meta = {"last_updated": "2024-03-01", "results": {"total": 10}}
+    a = feed_fingerprint({"last_updated": "2024-02-28"}, meta)
+    assert a == feed_fingerprint({"last_updated": "2024-02-28"}, dict(meta))
+    assert a != feed_fingerprint({"last_updated": "2024-02-29"}, meta)
+    assert a != feed_fingerprint({"last_updated": "2024-02-28"}, {"last_updated": "2024-03-01", "results": {"total": 11}})
@@ -0,0 +1,112 @@
+import random
+import threading
+import time
+
+from alerts.rate_ledger import REASON_CONTENTION, RateLimitLedger
+from repos.rate_limit_repo import RateCounter
+
+
+class MemoryRateStore:
+    """RateLimitRepository semantics: bulk reads, compare-and-set writes on a version."""
+
+    def __init__(self, jitter=0.0):
+        self.docs = {}  # user_id -> (total, by_ndc, version)
+        self.lock = threading.Lock()
+        self.jitter = jitter
+        self.loads = 0
+
+    def _pause(self):
+        if self.jitter:
+            time.sleep(random.random() * self.jitter)
+
+    def load_many(self, user_ids, day_key):
+        self._pause()
+        with self.lock:
+            self.loads += 1
+            out = {}
+            for u in user_ids:
+                total, by_ndc, version = self.docs.get(u, (0, {}, None))
+                out[u] = RateCounter(total, dict(by_ndc), version)
+            return out
+
+    def commit_many(self, day_key, counters):
+        self._pause()
+        committed = {}
+        with self.lock:
+            for u, c in counters.items():
+                current = self.docs.get(u, (0, {}, None))[2]
+                if current != c.version:
+                    continue
+                version = (current or 0) + 1
+                self.docs[u] = (c.total, dict(c.by_ndc), version)
+                committed[u] = version
+        return committed
+
+
+def test_limits_are_enforced_in_memory_and_counters_are_preloaded_once():
+    store = MemoryRateStore()
+    ledger = RateLimitLedger(store, max_total=3, max_per_ndc=2)
+
+    first = ledger.reserve_many([("u1", "A"), ("u1", "A"), ("u1", "A"), ("u2", "A")], day_key="20260101")
+    assert first == [(True, "ok"), (True, "ok"), (False, "ndc_limit"), (True, "ok")]
+    second = ledger.reserve_many([("u1", "B"), ("u1", "B")], day_key="20260101")
+    assert second == [(True, "ok"), (False, "daily_limit")]
+    assert store.loads == 1  # the second batch ran on the cached counters
+    assert store.docs["u1"][:2] == (3, {"A": 2, "B": 1})
+
+
+def test_grouped_reservations_charge_the_daily_cap_once_per_message():
+    store = MemoryRateStore()
+    ledger = RateLimitLedger(store, max_total=2, max_per_ndc=1)
+    batch = [("u1", "A"), ("u1", "B"), ("u1", "A"), ("u1", "C")]
+    # "A" twice is over the per-NDC limit; the rest are two messages, charged once each.
+    assert ledger.reserve_many(batch, "d", groups=[0, 0, 1, 1]) == [(True, "ok"), (True, "ok"), (False, "ndc_limit"), (True, "ok")]
+    assert store.docs["u1"][:2] == (2, {"A": 1, "B": 1, "C": 1})
+    assert ledger.reserve_many([("u1", "D")], "d", groups=["next"]) == [(False, "daily_limit")]
+
+
+def test_a_run_that_loses_the_compare_and_set_rereads_and_decides_again():
+    store = MemoryRateStore()
+    mine, theirs = RateLimitLedger(store, 2, 2), RateLimitLedger(store, 2, 2)
+    assert mine.reserve_many([("u1", "A")], "d") == [(True, "ok")]
+    assert theirs.reserve_many([("u1", "B")], "d") == [(True, "ok")]  # mine's cache is now stale
+    # mine still sees total=1 and grants, loses the compare-and-set, re-reads total=2.
+    assert mine.reserve_many([("u1", "C")], "d") == [(False, "daily_limit")]
+    assert mine.stats["conflicts"] == 1
+    assert store.docs["u1"][0] == 2
+
+
+def test_persistent_contention_fails_closed():
+    class AlwaysStale(MemoryRateStore):
+        def commit_many(self, day_key, counters):
+            return {}
+
+    ledger = RateLimitLedger(AlwaysStale(), 10, 10, max_attempts=3)
+    assert ledger.reserve_many([("u1", "A"), ("u2", "A")], "d") == [(False, REASON_CONTENTION)] * 2
+    assert ledger.stats["conflicts"] == 6
+
+
+def test_concurrent_runs_never_exceed_the_limits():
+    store = MemoryRateStore(jitter=0.002)
+    max_total, max_per_ndc = 25, 4
+    granted = []
+
+    def run(seed):
+        rnd = random.Random(seed)
+        ledger = RateLimitLedger(store, max_total, max_per_ndc, max_attempts=100)
+        for _ in range(10):
+            batch = [(f"u{rnd.randrange(3)}", "ABCDEFGH"[rnd.randrange(8)]) for _ in range(6)]
+            for req, (ok, _) in zip(batch, ledger.reserve_many(batch, "d")):
+                if ok:
+                    granted.append(req)
+
+    threads = [threading.Thread(target=run, args=(seed,)) for seed in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    for user, (total, by_ndc, _) in store.docs.items():
+        mine = [ndc for u, ndc in granted if u == user]
+        assert len(mine) == total <= max_total  # every grant is stored, none over the limit
+        assert all(mine.count(ndc) == n <= max_per_ndc for ndc, n in by_ndc.items())
@@ -0,0 +1,73 @@
+import ndc.cache as ndc_cache
+from ndc.cache import MISS, ResolverCache, TTLCache
+from ndc.resolver import NDCResolver
+
+
+class CountingRepo:
+    def __init__(self, docs):
+        self.docs = docs
+        self.reads = 0
+
+        self.get_many_calls = 0
+
+    def get(self, ndc):
+        self.reads += 1
+        d = self.docs.get(ndc)
+        return dict(d, ndc_digits=ndc) if d else None
+
+    def get_many(self, ndcs):
+        self.get_many_calls += 1
+        self.reads += len(ndcs)
+        return {n: dict(self.docs[n], ndc_digits=n) for n in ndcs if n in self.docs}
+
+
+def test_ttl_cache_lru_negative_entries_and_expiry():
+    now = [0.0]
+    c = TTLCache(max_entries=2, ttl_seconds=100, negative_ttl_seconds=10, clock=lambda: now[0])
+    c.put("a", {"x": 1})
+    c.put("b", None)
+    assert c.get("b") is None and c.get("a") == {"x": 1}
+    c.put("c", {"x": 3})  # evicts b (least recently used)
+    assert c.get("b") is MISS
+    now[0] = 50
+    c.put("n", None)  # evicts a
+    now[0] = 61
+    assert c.get("n") is MISS and c.get("c") == {"x": 3}
+    s = c.stats()
+    assert (s["evictions"], s["expirations"], s["negative_hits"]) == (2, 1, 1)
+
+
+def test_resolver_reads_each_tier_once_and_invalidation_hooks(monkeypatch):
+    cache = ResolverCache(max_entries=100, ttl_seconds=100, negative_ttl_seconds=100)
+    monkeypatch.setattr(ndc_cache, "_shared", cache)
+    index = CountingRepo({"00000000001": {"brand_name": "Indexed"}})
+    overrides = CountingRepo({})
+    resolver = NDCResolver(repo=index, overrides=overrides, cache=cache)
+
+    for _ in range(3):
+        assert resolver.resolve_with_fallback("00000000001", {})["brand_name"] == "Indexed"
+        assert resolver.resolve_with_fallback("00000000002", {"brand_name": "FDA"})["source"] == "openfda_fallback"
+    assert (overrides.reads, index.reads) == (2, 2)
+
+    overrides.docs["00000000001"] = {"brand_name": "Override"}
+    ndc_cache.invalidate_overrides(["00000000001"])
+    assert resolver.resolve_with_fallback("00000000001", {})["brand_name"] == "Override"
+    assert cache.stats()["overrides"]["invalidations"] == 1
+
+
+def test_resolve_many_batches_per_tier_and_keeps_input_order():
+    cache = ResolverCache(max_entries=100, ttl_seconds=100, negative_ttl_seconds=100)
+    index = CountingRepo({"00000000002": {"brand_name": "Indexed"}, "00000000003": {"brand_name": "Shadowed"}})
+    overrides = CountingRepo({"00000000003": {"brand_name": "Override"}})
+    resolver = NDCResolver(repo=index, overrides=overrides, cache=cache)
+
+    ndcs = ["3", "bad", "00000000001", "2", "00000000003"]
+    fallbacks = [{}, {}, {"brand_name": "FDA"}, {}, {}]
+    out = resolver.resolve_many(ndcs, fallbacks)
+    assert [r["brand_name"] for r in out] == ["Override", "", "FDA", "Indexed", "Override"]
+    assert [r["source"] for r in out[:3]] == ["override", "invalid_ndc", "openfda_fallback"]
+    # One round trip per tier; the index is not read for the overridden NDC.
+    assert (overrides.get_many_calls, index.get_many_calls, index.reads) == (1, 1, 2)
+
+    assert resolver.resolve_many(ndcs, fallbacks) == out
+    assert (overrides.get_many_calls, index.get_many_calls) == (1, 1)
@@ -0,0 +1,41 @@
+from ingest.spl_extract import extract_spl_records
+
+SPL = b"""<?xml version="1.0" encoding="UTF-8"?>
+<document xmlns="urn:hl7-org:v3">
+  <author><assignedEntity><representedOrganization>
+    <name>Acme Pharma Inc</name>
+    <assignedEntity><assignedOrganization><name>Acme Plant 2</name></assignedOrganization></assignedEntity>
+  </representedOrganization></assignedEntity></author>
+  <component><structuredBody>
+    <component><section>
+      <text><paragraph>Call 1-800-555-0199 or see lot 12345-678-9.</paragraph></text>
+      <subject><manufacturedProduct><manufacturedProduct>
+        <code code="12345-678" codeSystem="2.16.840.1.113883.6.69"/>
+        <name>Zentrix <suffix>XR</suffix></name>
+        <asEntityWithGeneric><genericMedicine><name>zentromycin</name></genericMedicine></asEntityWithGeneric>
+        <asContent><containerPackagedProduct>
+          <code code="12345-678-90" codeSystem="2.16.840.1.113883.6.69"/>
+          <asContent><containerPackagedProduct>
+            <code code="12345-678-91" codeSystem="2.16.840.1.113883.6.69"/>
+          </containerPackagedProduct></asContent>
+        </containerPackagedProduct></asContent>
+      </manufacturedProduct></manufacturedProduct></subject>
+    </section></component>
+  </structuredBody></component>
+</document>
+"""
+
+
+def test_extracts_package_ndcs_with_names():
+    recs = {r["ndc_digits"]: r for r in extract_spl_records(SPL)}
+    assert set(recs) == {"12345067890", "12345067891"}
+    assert recs["12345067890"] == {
+        "ndc_digits": "12345067890",
+        "brand_name": "Zentrix XR",
+        "generic_name": "zentromycin",
+        "manufacturer": "Acme Pharma Inc",
+    }
+
+
+def test_malformed_xml_yields_nothing():
+    assert extract_spl_records(b"<document><unclosed>") == []
@@ -0,0 +1,72 @@
+import asyncio
+
+import httpx
+import pytest
+
+import ingest.openfda_client as openfda_client
+from config.settings import settings
+from ingest.shortage_sweeper import ShortageSweepProcessor, _streaming_sweep_async
+
+
+def _feed(total, report_total=True):
+    def handler(request):
+        skip = int(request.url.params["skip"])
+        limit = int(request.url.params["limit"])
+        if skip >= total:
+            return httpx.Response(404)
+        results = [{"package_ndc": f"{i:011d}", "status": "Current"} for i in range(skip, min(skip + limit, total))]
+        meta = {"results": {"total": total}} if report_total else {}
+        return httpx.Response(200, json={"meta": meta, "results": results})
+    return handler
+
+
+class FakeProcessor:
+    prepare = staticmethod(ShortageSweepProcessor.prepare)
+
+    def __init__(self):
+        self.seen = []
+
+    def process(self, prepared):
+        self.seen.extend(ndc for ndc, _, _ in prepared)
+
+
+@pytest.fixture
+def stub_feed(monkeypatch):
+    def install(total, report_total=True):
+        monkeypatch.setattr(openfda_client, "new_async_client",
+                            lambda concurrency: httpx.AsyncClient(transport=httpx.MockTransport(_feed(total, report_total))))
+    monkeypatch.setattr(settings, "OPENFDA_LIMIT", 100)
+    return install
+
+
+def test_streaming_sweep_processes_every_page(stub_feed, monkeypatch):
+    stub_feed(1050)
+    monkeypatch.setattr(settings, "MAX_SWEEP_ITEMS", 5000)
+    proc = FakeProcessor()
+    meta, stage_ms = asyncio.run(_streaming_sweep_async(proc))
+    assert meta["total_fetched"] == 1050
+    assert meta["pages"] == 11
+    assert sorted(proc.seen) == [f"{i:011d}" for i in range(1050)]
+    assert set(stage_ms) == {"fetch", "normalize", "upsert", "total"}
+
+
+def test_streaming_sweep_fails_closed_before_processing(stub_feed, monkeypatch):
+    stub_feed(1050)
+    monkeypatch.setattr(settings, "MAX_SWEEP_ITEMS", 1000)
+    proc = FakeProcessor()
+    with pytest.raises(RuntimeError, match="max_sweep_items_exceeded"):
+        asyncio.run(_streaming_sweep_async(proc))
+    assert proc.seen == []
+
+
+def test_streaming_sweep_without_total_counts_before_processing(stub_feed, monkeypatch):
+    stub_feed(1050, report_total=False)
+    monkeypatch.setattr(settings, "MAX_SWEEP_ITEMS", 1000)
+    proc = FakeProcessor()
+    with pytest.raises(RuntimeError, match="max_sweep_items_exceeded"):
+        asyncio.run(_streaming_sweep_async(proc))
+    assert proc.seen == []
+
+    monkeypatch.setattr(settings, "MAX_SWEEP_ITEMS", 5000)
+    meta, _ = asyncio.run(_streaming_sweep_async(proc))
+    assert meta["total_fetched"] == 1050 and len(proc.seen) == 1050
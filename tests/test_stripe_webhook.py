@@ -0,0 +1,39 @@
+import asyncio
+
+import stripe
+
+import billing.stripe_webhook as webhook
+
+
+class FakeSubscriptions:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def find_user_by_stripe_subscription(self, stripe_subscription_id):
+        for user_id, doc in self.docs.items():
+            if doc.get("stripe_subscription_id") == stripe_subscription_id:
+                return user_id
+        return None
+
+    def upsert(self, user_id, data):
+        self.docs.setdefault(user_id, {}).update(data)
+
+
+class FakeRequest:
+    async def body(self):
+        return b"{}"
+
+
+def test_subscription_deleted_updates_status_and_resyncs_eligibility(monkeypatch):
+    subs = FakeSubscriptions({"u1": {"status": "active", "stripe_subscription_id": "sub_1"}})
+    synced = []
+    event = {"id": "evt_1", "type": "customer.subscription.deleted",
+             "data": {"object": {"id": "sub_1", "status": "canceled", "customer": "cus_1"}}}
+    monkeypatch.setattr(webhook, "SubscriptionRepository", lambda: subs)
+    monkeypatch.setattr(webhook, "sync_user_eligibility", lambda user_id, subs=None: synced.append(user_id))
+    monkeypatch.setattr(stripe.Webhook, "construct_event", lambda **kw: event)
+
+    asyncio.run(webhook.StripeWebhookHandler().handle(FakeRequest(), "sig"))
+
+    assert subs.docs["u1"]["status"] == "canceled"
+    assert synced == ["u1"]
@@ -0,0 +1,115 @@
+from config.settings import settings
+from ingest.delta_engine import snapshot_hash
+from ingest.hash_index import ShortageHashIndex
+from ingest.shortage_sweeper import ShortageSweepProcessor
+
+
+class FakeState:
+    def __init__(self):
+        self.state = {"baseline_completed": True}
+        self.metrics = {}
+
+    def get_state(self):
+        return dict(self.state)
+
+    def set_baseline_completed(self):
+        self.state["baseline_completed"] = True
+
+    def update_sweep_metrics(self, metrics):
+        self.metrics.update(metrics)
+
+    def update_delta_cursor(self, last_updated_hwm, full_sweep_at=None):
+        self.state["last_updated_hwm"] = last_updated_hwm
+        if full_sweep_at:
+            self.state["last_full_sweep_at"] = full_sweep_at
+
+
+class FakeShortages:
+    def __init__(self, docs=None):
+        self.docs = dict(docs or {})
+        self.get_many_calls = 0
+        self.commits = 0
+
+    def get_many(self, ndcs):
+        self.get_many_calls += 1
+        return {n: dict(self.docs[n]) for n in ndcs if n in self.docs}
+
+    def upsert_many(self, items):
+        for ndc, doc in items:
+            self.docs[ndc] = {**self.docs.get(ndc, {}), **doc}
+        self.commits += 1
+        return 1
+
+
+class FakeResolver:
+    def resolve_with_fallback(self, ndc, fallback):
+        return {"ndc_digits": ndc, "brand_name": fallback.get("brand_name", "")}
+
+    def resolve_many(self, ndcs, fallbacks):
+        return [self.resolve_with_fallback(n, f) for n, f in zip(ndcs, fallbacks)]
+
+
+def _rec(i, status="Current"):
+    return {"package_ndc": f"{i:011d}", "status": status, "last_updated": "2024-01-01"}
+
+
+def test_chunks_use_batched_reads_and_writes(monkeypatch):
+    monkeypatch.setattr(settings, "SWEEP_BATCH_SIZE", 100)
+    unchanged = _rec(1)
+    shortages = FakeShortages({"00000000001": {"snapshot_hash": snapshot_hash(unchanged)}})
+    state = FakeState()
+    proc = ShortageSweepProcessor("baseline", state_repo=state, shortage_repo=shortages, resolver=FakeResolver(), skip_unchanged=False)
+
+    proc.process(proc.prepare([_rec(i) for i in range(250)]))
+    result = proc.finish()
+
+    assert shortages.get_many_calls == 3
+    assert shortages.commits == 3
+    assert result["processed"] == 250
+    assert result["changed"] == 249
+    assert state.metrics["last_sweep_firestore_ops"]["shortage_read_rpcs"] == 3
+    assert state.metrics["last_sweep_firestore_ops"]["shortage_writes"] == 250
+    assert state.state["last_updated_hwm"] == "2024-01-01"
+    assert state.state["last_full_sweep_at"]
+
+
+def test_duplicate_ndc_in_chunk_diffs_against_earlier_record():
+    shortages = FakeShortages()
+    proc = ShortageSweepProcessor("baseline", state_repo=FakeState(), shortage_repo=shortages, resolver=FakeResolver(), skip_unchanged=False)
+    proc.process(proc.prepare([_rec(7), _rec(7), _rec(7, status="Resolved")]))
+    assert proc.changed == 2
+    assert shortages.docs["00000000007"]["status"] == "Resolved"
+
+
+def test_unchanged_records_skip_firestore_with_hash_index(monkeypatch):
+    import ingest.shortage_sweeper as sweeper
+    monkeypatch.setattr(sweeper, "save_hash_index", lambda idx: None)
+    recs = [_rec(i) for i in range(10)]
+    shortages = FakeShortages({r["package_ndc"]: {"snapshot_hash": snapshot_hash(r), "status": "Current"} for r in recs})
+    proc = ShortageSweepProcessor("delta", state_repo=FakeState(), shortage_repo=shortages, resolver=FakeResolver())
+    proc.hash_index = ShortageHashIndex({r["package_ndc"]: snapshot_hash(r) for r in recs}, 0.0, "test")
+    proc._fan_out = lambda *a: None
+
+    recs[3] = _rec(3, status="Resolved")
+    proc.process(proc.prepare(recs + [_rec(42)]))
+
+    assert proc.unchanged_skipped == 9
+    assert proc.changed == 2
+    assert proc.ops["shortage_reads"] == 2  # the changed NDCs only (an index miss may still have a doc)
+    assert proc.ops["name_resolutions"] == 2
+    assert proc.hash_index.get("00000000003") == snapshot_hash(recs[3])
+
+
+def test_index_miss_still_diffs_against_the_stored_doc(monkeypatch):
+    import ingest.shortage_sweeper as sweeper
+    monkeypatch.setattr(sweeper, "save_hash_index", lambda idx: None)
+    old = _rec(5)
+    shortages = FakeShortages({"00000000005": {"snapshot_hash": snapshot_hash(old), "status": "Current"}})
+    proc = ShortageSweepProcessor("delta", state_repo=FakeState(), shortage_repo=shortages, resolver=FakeResolver())
+    proc.hash_index = ShortageHashIndex({}, 0.0, "test")  # built before NDC 5 was stored
+    fanned = []
+    proc._fan_out = lambda ndc11, existing, doc: fanned.append((ndc11, (existing or {}).get("status"), doc["status"]))
+
+    proc.process(proc.prepare([old, _rec(5, status="Resolved")]))
+
+    assert fanned == [("00000000005", "Current", "Resolved")]
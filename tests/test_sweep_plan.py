@@ -0,0 +1,19 @@
+from datetime import datetime, timedelta, timezone
+
+from ingest.shortage_sweeper import SWEEP_FULL, SWEEP_INCREMENTAL, plan_sweep
+
+NOW = datetime(2024, 3, 1, 12, tzinfo=timezone.utc)
+
+
+def test_incremental_when_recent_full_sweep():
+    state = {"last_updated_hwm": "2024-02-28", "last_full_sweep_at": (NOW - timedelta(hours=2)).isoformat()}
+    kind, search = plan_sweep("delta", state, now=NOW)
+    assert kind == SWEEP_INCREMENTAL
+    assert search == "last_updated:[2024-02-28 TO *]"
+
+
+def test_full_when_reconciliation_due_or_no_mark():
+    stale = {"last_updated_hwm": "2024-02-28", "last_full_sweep_at": (NOW - timedelta(days=2)).isoformat()}
+    assert plan_sweep("delta", stale, now=NOW) == (SWEEP_FULL, None)
+    assert plan_sweep("delta", {}, now=NOW) == (SWEEP_FULL, None)
+    assert plan_sweep("baseline", {"last_updated_hwm": "2024-02-28", "last_full_sweep_at": NOW.isoformat()}, now=NOW) == (SWEEP_FULL, None)
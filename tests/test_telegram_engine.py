@@ -0,0 +1,95 @@
+import asyncio
+import json
+
+import httpx
+
+from config.settings import settings
+from messaging.telegram_engine import TelegramDeliveryEngine, TokenBucket
+
+
+class FakeTime:
+    def __init__(self):
+        self.now = 0.0
+
+    def clock(self):
+        return self.now
+
+    async def sleep(self, seconds):
+        self.now += seconds
+
+
+def test_token_bucket_reserves_ahead_and_honours_blocks():
+    t = FakeTime()
+    bucket = TokenBucket(rate=2.0, capacity=2.0, clock=t.clock)
+    assert [bucket.reserve() for _ in range(4)] == [0.0, 0.0, 0.5, 1.0]
+    t.now = 10.0
+    assert bucket.reserve() == 0.0
+    bucket.block(3.0)
+    assert bucket.reserve() == 3.0
+
+
+def _engine(handler, t, **kw):
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return TelegramDeliveryEngine(token="t", client=client, clock=t.clock, sleep=t.sleep, **kw)
+
+
+def test_per_chat_and_global_rates():
+    t = FakeTime()
+    sent = []
+
+    def handler(request):
+        sent.append((t.now, request.read()))
+        return httpx.Response(200, json={"ok": True})
+
+    async def go():
+        async with _engine(handler, t, global_rate=30.0, per_chat_rate=1.0) as engine:
+            await engine.send_many([("a", "x")] * 3 + [(str(i), "y") for i in range(60)])
+            return engine.stats
+
+    stats = asyncio.run(go())
+    assert stats["sent"] == 63
+    # Three messages to one chat take >= 2s; 63 messages at 30/s (30 burst) >= 1s.
+    assert t.now >= 2.0
+    assert max(ts for ts, _ in sent) >= 1.0
+
+
+def test_retry_after_is_honoured_inline_or_handed_back(monkeypatch):
+    monkeypatch.setattr(settings, "TELEGRAM_INLINE_RETRY_MAX_SECONDS", 5.0)
+    t = FakeTime()
+    calls = {"a": 0, "b": 0}
+
+    def handler(request):
+        chat = json.loads(request.content)["chat_id"]
+        calls[chat] += 1
+        if chat == "a" and calls["a"] == 1:
+            return httpx.Response(429, json={"ok": False, "error_code": 429, "parameters": {"retry_after": 3}})
+        if chat == "b":
+            return httpx.Response(429, json={"ok": False, "error_code": 429, "parameters": {"retry_after": 60}})
+        return httpx.Response(200, json={"ok": True})
+
+    async def go():
+        async with _engine(handler, t) as engine:
+            return await engine.send_many([("a", "x"), ("b", "y")]), engine.stats
+
+    (ok, flooded), stats = asyncio.run(go())
+    assert ok["ok"] and calls["a"] == 2 and t.now >= 3.0
+    assert not flooded["ok"] and flooded["parameters"]["retry_after"] == 60 and calls["b"] == 1
+    assert stats["throttled_429"] == 2 and stats["failed"] == 1
+
+
+def test_a_chat_waiting_on_its_limit_does_not_hold_a_concurrency_slot():
+    sent = []
+
+    def handler(request):
+        sent.append(json.loads(request.read())["chat_id"])
+        return httpx.Response(200, json={"ok": True})
+
+    async def go():
+        client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        async with TelegramDeliveryEngine(token="t", client=client, global_rate=100.0, per_chat_rate=20.0,
+                                          max_concurrency=1) as engine:
+            await engine.send_many([("a", "x")] * 3 + [("b", "y")])
+
+    asyncio.run(go())
+    # "b" goes out while "a" is still waiting for its second per-chat token.
+    assert sent.index("b") < 2
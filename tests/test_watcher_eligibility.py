@@ -0,0 +1,22 @@
+from ops.watcher_eligibility_repair import plan_repair
+
+
+def test_plan_repair_creates_missing_rewrites_stale_and_deletes_orphans():
+    users = {
+        "u1": {"telegram_chat_id": "c1", "activated_at": "2026-01-01"},
+        "u2": {"telegram_chat_id": "c2"},
+    }
+    subs = {"u1": {"status": "active"}, "u2": {"status": "active"}}
+    expected = {("00000000001", "u1"), ("00000000002", "u1"), ("00000000001", "u2")}
+    actual = {
+        ("00000000001", "u1"): {"user_id": "u1", "chat_id": "c1", "activated": True, "subscription_status": "active"},
+        ("00000000001", "u2"): {"user_id": "u2", "chat_id": "c2", "activated": True, "subscription_status": "active"},
+        ("00000000003", "u1"): {"user_id": "u1"},
+    }
+
+    plan = plan_repair(expected, actual, users, subs)
+
+    assert (plan["missing"], plan["stale"], plan["orphaned"]) == (1, 1, 1)
+    assert set(plan["write"]) == {("00000000002", "u1"), ("00000000001", "u2")}
+    assert plan["write"][("00000000001", "u2")]["activated"] is False
+    assert plan["delete"] == [("00000000003", "u1")]
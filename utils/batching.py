@@ -0,0 +1,50 @@
+from __future__ import annotations
+
+from typing import Any, Callable, Dict, Iterable, Iterator, List, TypeVar
+
+T = TypeVar("T")
+
+# Firestore caps a WriteBatch / commit at 500 writes.
+FIRESTORE_BATCH_LIMIT = 500
+
+
+def chunked(items: Iterable[T], size: int) -> Iterator[List[T]]:
+    size = max(1, size)
+    buf: List[T] = []
+    for it in items:
+        buf.append(it)
+        if len(buf) >= size:
+            yield buf
+            buf = []
+    if buf:
+        yield buf
+
+
+class WriteBatcher:
+    """WriteBatch wrapper that commits every FIRESTORE_BATCH_LIMIT ops (no-op when apply is False, for dry runs)."""
+
+    def __init__(self, db: Any, apply: bool = True):
+        self.db = db
+        self.apply = apply
+        self.batch = db.batch() if apply else None
+        self.ops = 0
+
+    def set(self, ref: Any, data: Dict[str, Any], merge: bool = False) -> None:
+        self._op(lambda b: b.set(ref, data, merge=merge))
+
+    def delete(self, ref: Any) -> None:
+        self._op(lambda b: b.delete(ref))
+
+    def _op(self, fn: Callable[[Any], Any]) -> None:
+        if not self.apply:
+            return
+        fn(self.batch)
+        self.ops += 1
+        if self.ops >= FIRESTORE_BATCH_LIMIT:
+            self.flush()
+
+    def flush(self) -> None:
+        if self.apply and self.ops:
+            self.batch.commit()
+            self.batch = self.db.batch()
+            self.ops = 0